@@ -0,0 +1,147 @@
+"""Compare the fast black screen detector with the pd_ai_agent_core one.
+
+"current" is pd_ai_agent_core's detect_black_screen, which thresholds the
+encoded bytes, "full_decode" thresholds every pixel of the full resolution
+frame (the accurate reference) and "fast" is analyse_black_screen, which the
+health checks use.
+
+Run with:
+    python -m benchmarks.black_screen_benchmark [--repeat N]
+"""
+
+from typing import Callable, Dict, List, Tuple
+import argparse
+import base64
+import io
+import time
+import numpy as np
+from PIL import Image, ImageDraw
+from pd_ai_agent_core.helpers.image import detect_black_screen
+from pd_ai_core_agents.common.image import analyse_black_screen
+
+BLACK_THRESHOLD = 30
+BLACK_PERCENTAGE = 0.9
+
+RESOLUTIONS = {
+    "1080p": (1920, 1080),
+    "retina": (2880, 1800),
+}
+
+
+def _encode(image: Image.Image, format: str) -> str:
+    output = io.BytesIO()
+    image.save(output, format=format)
+    return base64.b64encode(output.getvalue()).decode("utf-8")
+
+
+def _frames(size: Tuple[int, int]) -> Dict[str, Image.Image]:
+    width, height = size
+    rng = np.random.default_rng(42)
+    frames: Dict[str, Image.Image] = {}
+    frames["black"] = Image.new("RGB", size, (0, 0, 0))
+
+    boot = Image.new("RGB", size, (0, 0, 0))
+    draw = ImageDraw.Draw(boot)
+    for line in range(12):
+        draw.text((20, 20 + line * 18), "Loading kernel modules ...", fill=(200, 200, 200))
+    frames["black_console_text"] = boot
+
+    noise = rng.integers(0, 24, size=(height, width, 3), dtype=np.uint8)
+    frames["dark_noise"] = Image.fromarray(noise)
+
+    desktop = Image.new("RGB", size, (32, 86, 140))
+    draw = ImageDraw.Draw(desktop)
+    draw.rectangle((width // 8, height // 8, width // 2, height // 2), fill=(240, 240, 240))
+    draw.rectangle((0, height - 48, width, height), fill=(20, 20, 20))
+    frames["desktop"] = desktop
+
+    frames["white"] = Image.new("RGB", size, (255, 255, 255))
+
+    gradient = np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))
+    frames["gradient"] = Image.fromarray(np.stack([gradient] * 3, axis=-1))
+
+    half = np.zeros((height, width, 3), dtype=np.uint8)
+    half[:, width // 2 :] = 180
+    frames["half_black"] = Image.fromarray(half)
+    return frames
+
+
+def _ground_truth(image: Image.Image) -> bool:
+    gray = np.asarray(image.convert("L"))
+    return bool((gray < BLACK_THRESHOLD).mean() >= BLACK_PERCENTAGE)
+
+
+def _full_decode_detect_black_screen(image_data: str) -> bool:
+    image = Image.open(io.BytesIO(base64.b64decode(image_data)))
+    gray = np.asarray(image.convert("L"))
+    return bool((gray < BLACK_THRESHOLD).mean() >= BLACK_PERCENTAGE)
+
+
+def _time(detector: Callable[[str], bool], data: str, repeat: int) -> Tuple[bool, float]:
+    result = detector(data)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        detector(data)
+    return result, (time.perf_counter() - started) / repeat * 1000
+
+
+def run(repeat: int = 5) -> List[Dict[str, object]]:
+    detectors: Dict[str, Callable[[str], bool]] = {
+        "current": lambda data: detect_black_screen(
+            data, black_threshold=BLACK_THRESHOLD, black_percentage=BLACK_PERCENTAGE
+        ),
+        "full_decode": _full_decode_detect_black_screen,
+        "fast": lambda data: analyse_black_screen(
+            data, black_threshold=BLACK_THRESHOLD, black_percentage=BLACK_PERCENTAGE
+        )[0],
+    }
+    rows: List[Dict[str, object]] = []
+    for resolution, size in RESOLUTIONS.items():
+        for name, image in _frames(size).items():
+            expected = _ground_truth(image)
+            for format in ("PNG", "JPEG"):
+                data = _encode(image, format)
+                for detector_name, detector in detectors.items():
+                    result, elapsed_ms = _time(detector, data, repeat)
+                    rows.append(
+                        {
+                            "resolution": resolution,
+                            "frame": name,
+                            "format": format,
+                            "detector": detector_name,
+                            "expected": expected,
+                            "result": result,
+                            "ms": elapsed_ms,
+                        }
+                    )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = run(args.repeat)
+    print(
+        f"{'resolution':<10} {'frame':<20} {'format':<6} {'detector':<11} "
+        f"{'expected':<8} {'result':<6} {'ms':>8}"
+    )
+    for row in rows:
+        print(
+            f"{row['resolution']:<10} {row['frame']:<20} {row['format']:<6} {row['detector']:<11} "
+            f"{str(row['expected']):<8} {str(row['result']):<6} {row['ms']:>8.2f}"
+        )
+    print()
+    for detector_name in ("current", "full_decode", "fast"):
+        selected = [row for row in rows if row["detector"] == detector_name]
+        correct = sum(1 for row in selected if row["result"] == row["expected"])
+        mean_ms = sum(float(row["ms"]) for row in selected) / len(selected)
+        print(
+            f"{detector_name:<11} accuracy {correct}/{len(selected)} "
+            f"({correct / len(selected):.0%}), mean {mean_ms:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
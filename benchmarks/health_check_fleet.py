@@ -0,0 +1,523 @@
+"""Drive the VM health check agent against a simulated fleet.
+
+The Parallels Desktop side is replaced by stand-ins: an in memory
+VirtualMachineDataSource, execute_on_vm and get_vm_screenshot calls that sleep
+for a log-normal latency and fail at a configurable rate, and a
+NotificationService that only counts. The agent itself, its scheduler, tests,
+caches and executors are the real ones.
+
+Each cycle is one call to the agent's process(). With the default 1 ms
+--check-interval and the scheduler back-off turned off, every test of every VM
+is due on every cycle, which is the worst case full fleet cycle. A real
+interval with --backoff measures the scheduled steady state instead, with
+--tick seconds between cycles.
+
+The report has the cycle times, the probes per second, the event loop lag seen
+by a task that wakes up every few milliseconds, and the memory allocated per VM
+while the first cycle creates the health check state.
+
+With --shard-workers the probes run on that many worker processes, each with
+stand-ins of its own, and only the test state stays in the benchmark process.
+
+Run with:
+    python -m benchmarks.health_check_fleet [--vms N] [--cycles N]
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import argparse
+import asyncio
+import base64
+import io
+import json
+import logging
+import math
+import random
+import threading
+import time
+import tracemalloc
+from PIL import Image, ImageDraw
+from pd_ai_agent_core.common import NOTIFICATION_SERVICE_NAME
+from pd_ai_agent_core.parallels_desktop.datasource import VirtualMachineDataSource
+from pd_ai_agent_core.parallels_desktop.models.execute_vm_command_result import (
+    ExecuteVmCommandResult,
+)
+from pd_ai_agent_core.parallels_desktop.models.get_vm_screenshot_result import (
+    GetVmScreenshotResult,
+)
+from pd_ai_agent_core.services.log_service import LogService
+from pd_ai_agent_core.services.notification_service import NotificationService
+from pd_ai_agent_core.services.service_registry import ServiceRegistry
+from pd_ai_agent_core.messages import Message
+from pd_ai_core_agents.background_agents.health_check import guest_probe
+from pd_ai_core_agents.background_agents.health_check.guest_probe import (
+    GUEST_PROBE_COMMANDS,
+    GUEST_PROBE_MARKER,
+)
+from pd_ai_core_agents.background_agents.health_check.health_check_agent import (
+    VmHealthCheckAgent,
+)
+from pd_ai_core_agents.background_agents.health_check.health_checks import (
+    detect_guest_tools,
+    detect_internet_connection,
+)
+from pd_ai_core_agents.background_agents.health_check.host_connectivity import (
+    HostConnectivityProbe,
+)
+from pd_ai_core_agents.background_agents.health_check.sharding import (
+    ShardedHealthCheckEngine,
+)
+from pd_ai_core_agents.common import screenshot_cache
+
+SESSION_ID = "health-check-fleet-benchmark"
+DEFAULT_OS_MIX = "win-11,ubuntu,macosx"
+# how often the lag monitor wakes up
+LAG_SAMPLE_INTERVAL = 0.005
+
+# modules that hold their own reference to the functions being replaced
+EXECUTE_ON_VM_MODULES = [guest_probe, detect_guest_tools, detect_internet_connection]
+
+
+class Latency:
+    """Log-normal latency around a median, in seconds"""
+
+    def __init__(self, median_ms: float, sigma: float, rng: random.Random):
+        self.median = max(0.0, median_ms) / 1000
+        self.sigma = max(0.0, sigma)
+        self._rng = rng
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.median
+        return self._rng.lognormvariate(math.log(self.median), self.sigma)
+
+
+class FleetVm:
+    """The attributes of a VirtualMachine the health checks read"""
+
+    def __init__(self, id: str, name: str, os: str, state: str = "running"):
+        self.id = id
+        self.name = name
+        self.os = os
+        self.state = state
+
+
+class FleetDataSource(VirtualMachineDataSource):
+    """VirtualMachineDataSource holding a generated fleet"""
+
+    def __init__(self, vms: List[FleetVm]):
+        # the base constructor refuses to run once an instance is installed
+        self._vms: Dict[str, Any] = {vm.id: vm for vm in vms}
+        self._last_update = None
+
+
+class CountingNotificationService(NotificationService):
+    """NotificationService that counts the messages instead of sending them"""
+
+    def __init__(self, session_id: str):
+        self._session_id = session_id
+        self._lock = threading.Lock()
+        self.sent = 0
+
+    async def send(self, message: Message) -> bool:
+        self.send_sync(message)
+        return True
+
+    def send_sync(self, message: Message) -> None:
+        with self._lock:
+            self.sent += 1
+
+    def queue_notification(self, message: Message) -> None:
+        self.send_sync(message)
+
+    def unregister(self) -> None:
+        pass
+
+
+class FakeHostConnectivityProbe(HostConnectivityProbe):
+    """Host probe that always reports the host online, without any network I/O"""
+
+    def check(self) -> bool:
+        with self._lock:
+            self._online = True
+            self._checked_at = time.monotonic()
+        return True
+
+
+class FakeFleet:
+    """Generates the fleet and stands in for the prlctl exec and capture calls"""
+
+    def __init__(
+        self,
+        vms: int,
+        os_mix: List[str],
+        exec_latency: Latency,
+        screenshot_latency: Latency,
+        exec_failure_rate: float,
+        screenshot_failure_rate: float,
+        black_screen_rate: float,
+        screen_size: Tuple[int, int],
+        seed: int,
+    ):
+        self.vms = [
+            FleetVm(f"vm-{i:05d}", f"Fleet VM {i}", os_mix[i % len(os_mix)])
+            for i in range(vms)
+        ]
+        self.exec_latency = exec_latency
+        self.screenshot_latency = screenshot_latency
+        self.exec_failure_rate = exec_failure_rate
+        self.screenshot_failure_rate = screenshot_failure_rate
+        self.black_screen_rate = black_screen_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.exec_calls = 0
+        self.screenshot_calls = 0
+        self._desktop_frame, self._black_frame = _frames(screen_size)
+
+    def execute_on_vm(
+        self, vm_id: str, command: str, args: Optional[List[str]] = None
+    ) -> ExecuteVmCommandResult:
+        with self._lock:
+            self.exec_calls += 1
+        time.sleep(self.exec_latency.sample())
+        script = " ".join(args or [])
+        if GUEST_PROBE_MARKER in script:
+            # composite probe, every probe of the script fails on its own
+            lines = [
+                f"{GUEST_PROBE_MARKER}{probe_id}={int(self._chance(self.exec_failure_rate))}"
+                for probe_id in GUEST_PROBE_COMMANDS
+                if f"{GUEST_PROBE_MARKER}{probe_id}=" in script
+            ]
+            return ExecuteVmCommandResult(output="\n".join(lines), exit_code=0)
+        if self._chance(self.exec_failure_rate):
+            return ExecuteVmCommandResult(
+                output="", error="simulated exec failure", exit_code=1
+            )
+        return ExecuteVmCommandResult(output="hello", exit_code=0)
+
+    def get_vm_screenshot(self, vm_id: str) -> GetVmScreenshotResult:
+        with self._lock:
+            self.screenshot_calls += 1
+        time.sleep(self.screenshot_latency.sample())
+        if self._chance(self.screenshot_failure_rate):
+            return GetVmScreenshotResult(
+                success=False,
+                message="simulated capture failure",
+                raw_screenshot=None,
+                screenshot=None,
+                border_color=None,
+            )
+        frame = (
+            self._black_frame
+            if self._chance(self.black_screen_rate)
+            else self._desktop_frame
+        )
+        return GetVmScreenshotResult(
+            success=True,
+            message="",
+            raw_screenshot=None,
+            screenshot=frame,
+            border_color=None,
+        )
+
+    def _chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._rng_lock:
+            return self._rng.random() < rate
+
+
+def _frames(size: Tuple[int, int]) -> Tuple[str, str]:
+    width, height = size
+    desktop = Image.new("RGB", size, (32, 86, 140))
+    draw = ImageDraw.Draw(desktop)
+    draw.rectangle((width // 8, height // 8, width // 2, height // 2), fill=(240, 240, 240))
+    draw.rectangle((0, height - 48, width, height), fill=(20, 20, 20))
+    black = Image.new("RGB", size, (0, 0, 0))
+    return _encode(desktop), _encode(black)
+
+
+def _encode(image: Image.Image) -> str:
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return base64.b64encode(output.getvalue()).decode("utf-8")
+
+
+@contextmanager
+def installed(fleet: FakeFleet) -> Iterator[CountingNotificationService]:
+    """Install the stand-ins, restoring the real ones on exit"""
+    previous_datasource = VirtualMachineDataSource._instance
+    previous_screenshot = screenshot_cache.get_vm_screenshot
+    previous_execute = [module.execute_on_vm for module in EXECUTE_ON_VM_MODULES]
+    notifications = CountingNotificationService(SESSION_ID)
+    VirtualMachineDataSource._instance = FleetDataSource(fleet.vms)
+    screenshot_cache.get_vm_screenshot = fleet.get_vm_screenshot  # type: ignore
+    for module in EXECUTE_ON_VM_MODULES:
+        module.execute_on_vm = fleet.execute_on_vm  # type: ignore
+    ServiceRegistry.register(SESSION_ID, NOTIFICATION_SERVICE_NAME, notifications)
+    LogService(SESSION_ID)
+    try:
+        yield notifications
+    finally:
+        ServiceRegistry.unregister_service(SESSION_ID, NOTIFICATION_SERVICE_NAME)
+        for module, execute in zip(EXECUTE_ON_VM_MODULES, previous_execute):
+            module.execute_on_vm = execute  # type: ignore
+        screenshot_cache.get_vm_screenshot = previous_screenshot  # type: ignore
+        VirtualMachineDataSource._instance = previous_datasource
+
+
+def _install_shard_worker(args: argparse.Namespace) -> None:
+    """Install the stand-ins in a shard worker, with the fleet generated from the same arguments"""
+    fleet = _fleet(args)
+    screenshot_cache.get_vm_screenshot = fleet.get_vm_screenshot  # type: ignore
+    for module in EXECUTE_ON_VM_MODULES:
+        module.execute_on_vm = fleet.execute_on_vm  # type: ignore
+
+
+class _LagMonitor:
+    """Measures how late a periodic task wakes up, i.e. how long the loop was blocked"""
+
+    def __init__(self, interval: float = LAG_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def take(self) -> List[float]:
+        samples, self.samples = self.samples, []
+        return samples
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(
+                max(0.0, time.perf_counter() - started - self.interval)
+            )
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percentile / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _probes_since(agent: VmHealthCheckAgent, vm_ids: List[str], since: float) -> int:
+    """Count the probes the agent recorded after a wall clock time"""
+    history = agent.get_history()
+    probes = 0
+    for vm_id in vm_ids:
+        for test_name in history.get_test_names(vm_id):
+            series = history.get_series(vm_id, test_name)
+            if series is not None:
+                probes += sum(
+                    1 for timestamp, _, _ in series.samples() if timestamp >= since
+                )
+    return probes
+
+
+async def _run(args: argparse.Namespace, fleet: FakeFleet) -> Dict[str, Any]:
+    vm_ids = [vm.id for vm in fleet.vms]
+    with installed(fleet) as notifications:
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        agent = VmHealthCheckAgent(
+            SESSION_ID,
+            max_concurrency=args.concurrency,
+            cycle_timeout=args.cycle_timeout,
+            io_workers=args.io_workers,
+            cpu_workers=args.cpu_workers,
+            check_interval=args.check_interval,
+            failure_check_interval=args.check_interval,
+            composite_guest_probe=not args.no_composite_probe,
+        )
+        if not args.backoff:
+            agent._scheduler.backoff_factor = 1.0
+        agent._host_connectivity = FakeHostConnectivityProbe()
+        if args.shard_workers > 0:
+            # the workers are spawned, they install the stand-ins themselves
+            agent._shard_engine = ShardedHealthCheckEngine(
+                args.shard_workers,
+                composite_guest_probe=not args.no_composite_probe,
+                worker_initializer=_install_shard_worker,
+                worker_initargs=(args,),
+            )
+
+        memory_per_vm = 0.0
+        monitor = _LagMonitor()
+        monitor.start()
+        cycles: List[Dict[str, Any]] = []
+        try:
+            for cycle in range(args.warmup + args.cycles):
+                since = time.time()
+                started = time.perf_counter()
+                await agent.process()
+                duration = time.perf_counter() - started
+                lag = monitor.take()
+                if cycle == 0:
+                    # the first cycle creates the health check state of every VM
+                    current, _ = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    memory_per_vm = (current - baseline) / max(1, len(vm_ids))
+                if cycle >= args.warmup:
+                    probes = _probes_since(agent, vm_ids, since)
+                    cycles.append(
+                        {
+                            "cycle": cycle - args.warmup + 1,
+                            "duration": duration,
+                            "probes": probes,
+                            "probes_per_second": probes / duration if duration else 0.0,
+                            "lag_p99_ms": _percentile(lag, 99) * 1000,
+                            "lag_max_ms": max(lag, default=0.0) * 1000,
+                            "lag_samples": lag,
+                        }
+                    )
+                if args.tick > 0:
+                    await asyncio.sleep(args.tick)
+                    monitor.take()
+        finally:
+            await monitor.stop()
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            agent.shutdown()
+
+        history_bytes = agent.get_history().memory_usage() / max(1, len(vm_ids))
+        lag = [sample for row in cycles for sample in row.pop("lag_samples")]
+        durations = [row["duration"] for row in cycles]
+        total_probes = sum(row["probes"] for row in cycles)
+        return {
+            "vms": len(vm_ids),
+            "cycles": cycles,
+            "cycle_mean": sum(durations) / len(durations) if durations else 0.0,
+            "cycle_p95": _percentile(durations, 95),
+            "cycle_max": max(durations, default=0.0),
+            "probes_per_second": total_probes / sum(durations) if durations else 0.0,
+            "lag_p50_ms": _percentile(lag, 50) * 1000,
+            "lag_p99_ms": _percentile(lag, 99) * 1000,
+            "lag_max_ms": max(lag, default=0.0) * 1000,
+            "memory_per_vm_bytes": memory_per_vm,
+            "history_per_vm_bytes": history_bytes,
+            "exec_calls": fleet.exec_calls,
+            "screenshot_calls": fleet.screenshot_calls,
+            "notifications": notifications.sent,
+            "cycle_stats": agent.get_cycle_stats().to_dict(),
+        }
+
+
+def _parse_size(value: str) -> Tuple[int, int]:
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+def _fleet(args: argparse.Namespace) -> FakeFleet:
+    rng = random.Random(args.seed)
+    return FakeFleet(
+        vms=args.vms,
+        os_mix=[os.strip() for os in args.os_mix.split(",") if os.strip()],
+        exec_latency=Latency(args.exec_latency_ms, args.exec_latency_sigma, rng),
+        screenshot_latency=Latency(
+            args.screenshot_latency_ms, args.screenshot_latency_sigma, rng
+        ),
+        exec_failure_rate=args.exec_failure_rate,
+        screenshot_failure_rate=args.screenshot_failure_rate,
+        black_screen_rate=args.black_screen_rate,
+        screen_size=_parse_size(args.screen_size),
+        seed=args.seed,
+    )
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    return asyncio.run(_run(args, _fleet(args)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--vms", type=int, default=200)
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--os-mix", default=DEFAULT_OS_MIX)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cycle-timeout", type=float, default=600.0)
+    parser.add_argument("--io-workers", type=int, default=None)
+    parser.add_argument("--cpu-workers", type=int, default=None)
+    parser.add_argument("--check-interval", type=float, default=0.001)
+    parser.add_argument("--backoff", action="store_true")
+    parser.add_argument("--tick", type=float, default=0.0)
+    parser.add_argument("--no-composite-probe", action="store_true")
+    parser.add_argument(
+        "--shard-workers",
+        type=int,
+        default=0,
+        help="probe on this many worker processes, whose exec and capture calls are not counted",
+    )
+    parser.add_argument("--exec-latency-ms", type=float, default=150.0)
+    parser.add_argument("--exec-latency-sigma", type=float, default=0.5)
+    parser.add_argument("--screenshot-latency-ms", type=float, default=300.0)
+    parser.add_argument("--screenshot-latency-sigma", type=float, default=0.5)
+    parser.add_argument("--exec-failure-rate", type=float, default=0.02)
+    parser.add_argument("--screenshot-failure-rate", type=float, default=0.01)
+    parser.add_argument("--black-screen-rate", type=float, default=0.02)
+    parser.add_argument("--screen-size", default="1280x800")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--log-level",
+        default="CRITICAL",
+        help="log level of the agent, the simulated failures log at ERROR",
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    if args.check_interval <= 0:
+        parser.error("--check-interval must be positive")
+    logging.basicConfig(level=args.log_level.upper())
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(
+        f"{'cycle':>5} {'seconds':>8} {'probes':>7} {'probes/s':>9} "
+        f"{'lag p99 ms':>10} {'lag max ms':>10}"
+    )
+    for row in report["cycles"]:
+        print(
+            f"{row['cycle']:>5} {row['duration']:>8.2f} {row['probes']:>7} "
+            f"{row['probes_per_second']:>9.1f} {row['lag_p99_ms']:>10.2f} "
+            f"{row['lag_max_ms']:>10.2f}"
+        )
+    print()
+    print(
+        f"{report['vms']} VMs, cycle mean {report['cycle_mean']:.2f}s, "
+        f"p95 {report['cycle_p95']:.2f}s, max {report['cycle_max']:.2f}s"
+    )
+    print(f"probes/s {report['probes_per_second']:.1f}")
+    print(
+        f"event loop lag p50 {report['lag_p50_ms']:.2f} ms, "
+        f"p99 {report['lag_p99_ms']:.2f} ms, max {report['lag_max_ms']:.2f} ms"
+    )
+    print(
+        f"memory per VM {report['memory_per_vm_bytes'] / 1024:.1f} KiB "
+        f"(history {report['history_per_vm_bytes'] / 1024:.1f} KiB)"
+    )
+    print(
+        f"exec calls {report['exec_calls']}, captures {report['screenshot_calls']}, "
+        f"notifications {report['notifications']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
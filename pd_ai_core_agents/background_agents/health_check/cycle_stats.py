@@ -0,0 +1,58 @@
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HealthCheckCycleStats:
+    """Rolling statistics for the periodic health check cycles"""
+
+    def __init__(self, window: int = 20):
+        self._durations: Deque[float] = deque(maxlen=window)
+        self.cycles = 0
+        self.vms_checked = 0
+        self.vms_timed_out = 0
+        self.overruns = 0
+        self.last_duration: Optional[float] = None
+
+    def record(
+        self,
+        duration: float,
+        vm_count: int,
+        timed_out: int,
+        interval: Optional[float] = None,
+    ) -> None:
+        """Record the outcome of a finished cycle"""
+        self._durations.append(duration)
+        self.cycles += 1
+        self.vms_checked += vm_count - timed_out
+        self.vms_timed_out += timed_out
+        self.last_duration = duration
+        if interval is not None and duration > interval:
+            self.overruns += 1
+
+    @property
+    def average_duration(self) -> float:
+        """Average duration of the cycles in the window"""
+        if not self._durations:
+            return 0.0
+        return sum(self._durations) / len(self._durations)
+
+    @property
+    def max_duration(self) -> float:
+        """Longest cycle in the window"""
+        if not self._durations:
+            return 0.0
+        return max(self._durations)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "cycles": self.cycles,
+            "vms_checked": self.vms_checked,
+            "vms_timed_out": self.vms_timed_out,
+            "overruns": self.overruns,
+            "last_duration": self.last_duration,
+            "average_duration": self.average_duration,
+            "max_duration": self.max_duration,
+        }
@@ -1,32 +1,88 @@
-from typing import Dict, Optional
+from typing import Dict, Optional, Set
 import logging
+import threading
 from datetime import datetime, timedelta
 from pd_ai_core_agents.background_agents.health_check.vm_health_check import (
     VmHealthCheck,
 )
+from pd_ai_core_agents.background_agents.health_check.datasource.health_check_store import (
+    HealthCheckStore,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class HealthCheckDataSource:
-    def __init__(self):
+    """Health checks are kept in memory, an optional store makes them survive restarts.
+
+    Changes are only marked dirty and written to the store in one batch by
+    flush, usually once per health check cycle.
+    """
+
+    def __init__(self, store: Optional[HealthCheckStore] = None):
         self._vms: Dict[str, VmHealthCheck] = {}
         self._last_update: Optional[datetime] = None
         self._cache_duration: timedelta = timedelta(minutes=10)
+        self._store = store
+        self._lock = threading.RLock()
+        self._dirty: Set[str] = set()
+        self._deleted: Set[str] = set()
 
     def update_health_check(self, vm_id: str, health_check: VmHealthCheck) -> None:
         """Update the last update time for a VM"""
-        self._vms[vm_id] = health_check
+        with self._lock:
+            self._vms[vm_id] = health_check
+            if self._store is not None:
+                self._dirty.add(vm_id)
+                self._deleted.discard(vm_id)
+
+    def restore_health_check(self, health_check: VmHealthCheck) -> bool:
+        """Apply the persisted state of a VM to a freshly created health check.
+
+        The store is only read here, the first time a VM is seen after a restart.
+        """
+        if self._store is None:
+            return False
+        try:
+            state = self._store.load(health_check.vm_id)
+        except Exception as e:
+            logger.error(
+                f"Error loading health check state for VM {health_check.vm_id}: {e}"
+            )
+            return False
+        if state is None:
+            return False
+        health_check.restore(state)
+        return True
 
     def disable_health_check_test(self, vm_id: str, test_name: str) -> None:
         """Disable a health check test for a VM"""
-        if vm_id in self._vms:
-            self._vms[vm_id].disable_test(test_name)
+        with self._lock:
+            if vm_id in self._vms:
+                self._vms[vm_id].disable_test(test_name)
+                if self._store is not None:
+                    self._dirty.add(vm_id)
 
     def remove_health_check(self, vm_id: str) -> None:
         """Remove a health check for a VM"""
-        if vm_id in self._vms:
-            del self._vms[vm_id]
+        with self._lock:
+            if vm_id in self._vms:
+                del self._vms[vm_id]
+            if self._store is not None:
+                self._dirty.discard(vm_id)
+                self._deleted.add(vm_id)
+
+    def get_vm_ids(self) -> Set[str]:
+        """Get the ids of the VMs with a health check, in memory or in the store"""
+        with self._lock:
+            vm_ids = set(self._vms) | self._dirty
+            deleted = set(self._deleted)
+        if self._store is not None:
+            try:
+                vm_ids |= self._store.vm_ids()
+            except Exception as e:
+                logger.error(f"Error listing the saved health checks: {e}")
+        return vm_ids - deleted
 
     def get_health_check(self, vm_id: str) -> Optional[VmHealthCheck]:
         """Get the health check for a VM"""
@@ -35,7 +91,29 @@ class HealthCheckDataSource:
     def get_last_check(self, vm_id: str) -> Optional[VmHealthCheck]:
         """Get the last update time for a VM"""
         return self._vms.get(vm_id)
-        return self._vms.get(vm_id)
+
+    def flush(self) -> int:
+        """Write the pending changes to the store in a single batch"""
+        if self._store is None:
+            return 0
+        with self._lock:
+            states = {
+                vm_id: self._vms[vm_id].to_dict()
+                for vm_id in self._dirty
+                if vm_id in self._vms
+            }
+            deleted = set(self._deleted)
+            self._dirty.clear()
+            self._deleted.clear()
+        try:
+            self._store.save_many(states, deleted)
+        except Exception as e:
+            logger.error(f"Error saving health check state: {e}")
+            with self._lock:
+                self._dirty.update(vm_id for vm_id in states if vm_id in self._vms)
+                self._deleted.update(deleted)
+            return 0
+        return len(states) + len(deleted)
 
     def is_cache_valid(self) -> bool:
         """Check if the cache is still valid"""
@@ -45,5 +123,7 @@ class HealthCheckDataSource:
 
     def clear_cache(self) -> None:
         """Clear the cache"""
-        self._vms.clear()
-        self._last_update = None
+        with self._lock:
+            self._vms.clear()
+            self._dirty.clear()
+            self._last_update = None
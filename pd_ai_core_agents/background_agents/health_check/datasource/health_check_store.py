@@ -0,0 +1,110 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HealthCheckStore(ABC):
+    """Persistent backend for the health check state of each VM"""
+
+    @abstractmethod
+    def load(self, vm_id: str) -> Optional[Dict[str, Any]]:
+        """Load the saved state of a VM"""
+        pass
+
+    @abstractmethod
+    def save_many(
+        self, states: Dict[str, Dict[str, Any]], deleted: Iterable[str] = ()
+    ) -> None:
+        """Save and delete a batch of VM states in a single write"""
+        pass
+
+    @abstractmethod
+    def vm_ids(self) -> Set[str]:
+        """Get the ids of the VMs with a saved state"""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Delete every saved state"""
+        pass
+
+    def close(self) -> None:
+        """Release the backend resources"""
+        pass
+
+
+class SqliteHealthCheckStore(HealthCheckStore):
+    """SQLite store in WAL mode, one JSON row per VM"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS health_checks (
+                vm_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+
+    def load(self, vm_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT state FROM health_checks WHERE vm_id = ?", (vm_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(row[0])
+        except json.JSONDecodeError as e:
+            logger.error(f"Ignoring corrupted health check state for VM {vm_id}: {e}")
+            return None
+
+    def save_many(
+        self, states: Dict[str, Dict[str, Any]], deleted: Iterable[str] = ()
+    ) -> None:
+        now = time.time()
+        rows = [(vm_id, json.dumps(state), now) for vm_id, state in states.items()]
+        deleted_rows = [(vm_id,) for vm_id in deleted]
+        if not rows and not deleted_rows:
+            return
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN")
+                if rows:
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO health_checks (vm_id, state, updated_at) VALUES (?, ?, ?)",
+                        rows,
+                    )
+                if deleted_rows:
+                    self._connection.executemany(
+                        "DELETE FROM health_checks WHERE vm_id = ?", deleted_rows
+                    )
+
+    def vm_ids(self) -> Set[str]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT vm_id FROM health_checks"
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM health_checks")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,130 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, ClassVar, Optional, TypeVar
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_IO_WORKERS = 32
+DEFAULT_CPU_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+
+class HealthCheckExecutors:
+    """Process-wide executors for the blocking work done by the health check tests.
+
+    Subprocess bound calls (prlctl exec, prlctl capture) go to a thread pool and
+    image analysis goes to a process pool, so the background agents event loop
+    never waits on them. Setting cpu_workers to 0 runs image analysis on the
+    thread pool instead.
+    """
+
+    _instance: ClassVar[Optional["HealthCheckExecutors"]] = None
+    _instance_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(
+        self,
+        io_workers: int = DEFAULT_IO_WORKERS,
+        cpu_workers: int = DEFAULT_CPU_WORKERS,
+    ):
+        self._io_workers = max(1, io_workers)
+        self._cpu_workers = max(0, cpu_workers)
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        self._cpu_executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "HealthCheckExecutors":
+        """Get the shared executors, creating them with the defaults if needed"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def configure(
+        cls, io_workers: Optional[int] = None, cpu_workers: Optional[int] = None
+    ) -> "HealthCheckExecutors":
+        """Replace the shared executors with new pool sizes"""
+        with cls._instance_lock:
+            previous = cls._instance
+            cls._instance = cls(
+                io_workers=io_workers if io_workers is not None else DEFAULT_IO_WORKERS,
+                cpu_workers=(
+                    cpu_workers if cpu_workers is not None else DEFAULT_CPU_WORKERS
+                ),
+            )
+        if previous is not None:
+            previous.shutdown(wait=False)
+        return cls._instance
+
+    @property
+    def io_executor(self) -> Executor:
+        with self._lock:
+            if self._io_executor is None:
+                self._io_executor = ThreadPoolExecutor(
+                    max_workers=self._io_workers,
+                    thread_name_prefix="health-check-io",
+                )
+            return self._io_executor
+
+    @property
+    def cpu_executor(self) -> Executor:
+        if self._cpu_workers == 0:
+            return self.io_executor
+        with self._lock:
+            if self._cpu_executor is None:
+                # spawn, forking a process that runs several threads is unsafe
+                self._cpu_executor = ProcessPoolExecutor(
+                    max_workers=self._cpu_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._cpu_executor
+
+    async def run_io(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking I/O call on the thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.io_executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def run_cpu(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a CPU bound call on the process pool, func and args must be picklable"""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        try:
+            return await loop.run_in_executor(self.cpu_executor, call)
+        except BrokenProcessPool as e:
+            logger.error(
+                f"Health check process pool is broken, using the thread pool: {e}"
+            )
+            with self._lock:
+                self._cpu_executor = None
+                self._cpu_workers = 0
+            return await loop.run_in_executor(self.io_executor, call)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut the pools down, they are recreated on the next call"""
+        with self._lock:
+            io_executor, self._io_executor = self._io_executor, None
+            cpu_executor, self._cpu_executor = self._cpu_executor, None
+        if io_executor is not None:
+            io_executor.shutdown(wait=wait)
+        if cpu_executor is not None:
+            cpu_executor.shutdown(wait=wait)
+
+
+async def run_io(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking I/O call on the shared health check thread pool"""
+    return await HealthCheckExecutors.get_instance().run_io(func, *args, **kwargs)
+
+
+async def run_cpu(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a CPU bound call on the shared health check process pool"""
+    return await HealthCheckExecutors.get_instance().run_cpu(func, *args, **kwargs)
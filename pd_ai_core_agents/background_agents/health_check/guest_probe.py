@@ -0,0 +1,209 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+from pd_ai_agent_core.parallels_desktop import VirtualMachine
+from pd_ai_agent_core.parallels_desktop.execute_on_vm import execute_on_vm
+from pd_ai_agent_core.parallels_desktop.os import get_std_os
+from pd_ai_core_agents.background_agents.health_check.executors import run_io
+
+logger = logging.getLogger(__name__)
+
+GUEST_PROBE_GUEST_TOOLS = "guest_tools"
+GUEST_PROBE_INTERNET = "internet"
+
+GUEST_PROBE_MARKER = "pdprobe:"
+
+PREREQUISITE_FAILED_REASON = "skipped: prerequisite {} failed"
+
+# probe id -> (posix command, windows command)
+GUEST_PROBE_COMMANDS: Dict[str, Tuple[str, str]] = {
+    GUEST_PROBE_GUEST_TOOLS: ("echo hello", "echo hello"),
+    GUEST_PROBE_INTERNET: ("ping -c 1 google.com", "ping -n 1 google.com"),
+}
+
+
+class GuestProbeResult:
+    def __init__(
+        self,
+        probe_id: str,
+        exit_code: int,
+        error: str = "",
+        skip_reason: Optional[str] = None,
+    ):
+        self.probe_id = probe_id
+        self.exit_code = exit_code
+        self.error = error
+        # set when a prerequisite probe failed, the outcome is not meaningful
+        self.skip_reason = skip_reason
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0 and self.skip_reason is None
+
+
+def order_guest_probes(
+    probe_ids: Iterable[str], prerequisites: Optional[Dict[str, List[str]]] = None
+) -> List[str]:
+    """Order the probes so each one comes after the probes it depends on"""
+    pending = list(probe_ids)
+    prerequisites = prerequisites or {}
+    ordered: List[str] = []
+    while pending:
+        ready = [
+            probe_id
+            for probe_id in pending
+            if not any(
+                prerequisite in pending
+                for prerequisite in prerequisites.get(probe_id, ())
+            )
+        ]
+        # a circular dependency keeps the given order
+        ready = ready or pending
+        ordered.extend(ready)
+        pending = [probe_id for probe_id in pending if probe_id not in ready]
+    return ordered
+
+
+def build_guest_probe_command(
+    std_os: Optional[str], probe_ids: Iterable[str]
+) -> Optional[Tuple[str, List[str]]]:
+    """Build the single guest command that runs every probe and prints one marker line per probe.
+
+    Windows guests get a cmd script, every other guest (Linux, macOS) a sh script.
+    """
+    if std_os is None:
+        return None
+    probe_ids = [probe_id for probe_id in probe_ids if probe_id in GUEST_PROBE_COMMANDS]
+    if not probe_ids:
+        return None
+    if std_os == "windows":
+        steps = [
+            f"({GUEST_PROBE_COMMANDS[probe_id][1]} >nul 2>&1 "
+            f"&& echo {GUEST_PROBE_MARKER}{probe_id}=0 "
+            f"|| echo {GUEST_PROBE_MARKER}{probe_id}=1)"
+            for probe_id in probe_ids
+        ]
+        return "cmd", ["/c", " & ".join(steps)]
+    steps = [
+        f"{GUEST_PROBE_COMMANDS[probe_id][0]} >/dev/null 2>&1; "
+        f"echo {GUEST_PROBE_MARKER}{probe_id}=$?"
+        for probe_id in probe_ids
+    ]
+    return "sh", ["-c", "; ".join(steps)]
+
+
+def parse_guest_probe_output(
+    output: str,
+    probe_ids: Iterable[str],
+    error: str = "",
+    prerequisites: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, GuestProbeResult]:
+    """Parse the marker lines, probes without a marker are reported as failed.
+
+    A probe whose prerequisite failed is reported as skipped.
+    """
+    exit_codes: Dict[str, int] = {}
+    for line in output.splitlines():
+        line = line.strip()
+        if not line.startswith(GUEST_PROBE_MARKER):
+            continue
+        probe_id, _, exit_code = line[len(GUEST_PROBE_MARKER) :].partition("=")
+        try:
+            exit_codes[probe_id] = int(exit_code)
+        except ValueError:
+            continue
+    results: Dict[str, GuestProbeResult] = {}
+    for probe_id in order_guest_probes(probe_ids, prerequisites):
+        failed_prerequisite = next(
+            (
+                prerequisite
+                for prerequisite in (prerequisites or {}).get(probe_id, ())
+                if prerequisite in results and not results[prerequisite].ok
+            ),
+            None,
+        )
+        if failed_prerequisite is not None:
+            results[probe_id] = GuestProbeResult(
+                probe_id,
+                exit_codes.get(probe_id, 1),
+                skip_reason=PREREQUISITE_FAILED_REASON.format(failed_prerequisite),
+            )
+        elif probe_id in exit_codes:
+            exit_code = exit_codes[probe_id]
+            results[probe_id] = GuestProbeResult(
+                probe_id,
+                exit_code,
+                f"Exited with code {exit_code}" if exit_code != 0 else "",
+            )
+        else:
+            results[probe_id] = GuestProbeResult(
+                probe_id, 1, error or "No result returned by the guest"
+            )
+    return results
+
+
+class CompositeGuestProbe:
+    """Runs every guest side probe of a VM in a single guest exec.
+
+    The exec starts when the first test asks for its result, the other tests
+    wait for the same exec, and it runs at most once per health check run.
+    prerequisites maps a probe to the probes it depends on, those run first
+    and the probe is reported as skipped when one of them fails.
+    """
+
+    def __init__(
+        self,
+        vm: VirtualMachine,
+        probe_ids: Iterable[str],
+        prerequisites: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.vm = vm
+        self.prerequisites = prerequisites or {}
+        self.probe_ids = order_guest_probes(
+            [probe_id for probe_id in probe_ids if probe_id in GUEST_PROBE_COMMANDS],
+            self.prerequisites,
+        )
+        self._command = build_guest_probe_command(get_std_os(vm.os), self.probe_ids)
+        self._task: Optional[asyncio.Task] = None
+
+    def supports(self, probe_id: Optional[str]) -> bool:
+        return (
+            self._command is not None
+            and probe_id is not None
+            and probe_id in self.probe_ids
+        )
+
+    async def get(self, probe_id: str) -> GuestProbeResult:
+        """Get the result of a probe, running the composite exec if needed"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        # shielded, a test timing out must not cancel the exec the others wait on
+        results = await asyncio.shield(self._task)
+        return results[probe_id]
+
+    def skip_reason(self, probe_id: str) -> Optional[str]:
+        """Why the probe was skipped by the finished exec, None if it was not"""
+        if self._task is None or not self._task.done() or self._task.cancelled():
+            return None
+        if self._task.exception() is not None:
+            return None
+        result = self._task.result().get(probe_id)
+        return result.skip_reason if result is not None else None
+
+    async def _run(self) -> Dict[str, GuestProbeResult]:
+        if self._command is None:
+            return parse_guest_probe_output(
+                "", self.probe_ids, "Unsupported guest OS", self.prerequisites
+            )
+        cmd, args = self._command
+        execution_result = await run_io(execute_on_vm, self.vm.id, cmd, args)
+        if execution_result.exit_code != 0:
+            logger.error(
+                f"Error running the guest probes for VM {self.vm.id}: {execution_result.error}"
+            )
+        return parse_guest_probe_output(
+            execution_result.output,
+            self.probe_ids,
+            execution_result.error,
+            self.prerequisites,
+        )
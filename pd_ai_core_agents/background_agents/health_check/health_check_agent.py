@@ -1,4 +1,8 @@
+import asyncio
 import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
 from pd_ai_agent_core.helpers.image import detect_black_screen
 from pd_ai_agent_core.parallels_desktop.get_vm_screenshot import get_vm_screenshot
 from pd_ai_agent_core.messages import (
@@ -8,6 +12,7 @@ from pd_ai_agent_core.messages import (
 from pd_ai_agent_core.core_types.background_agent import BackgroundAgent
 from pd_ai_agent_core.messages import BackgroundMessage
 from pd_ai_agent_core.parallels_desktop.datasource import VirtualMachineDataSource
+from pd_ai_agent_core.parallels_desktop import VirtualMachine
 from pd_ai_agent_core.services.notification_service import NotificationService
 from pd_ai_agent_core.common import (
     NOTIFICATION_SERVICE_NAME,
@@ -22,35 +27,189 @@ from pd_ai_agent_core.services.log_service import LogService
 from pd_ai_core_agents.background_agents.health_check.datasource.health_check_datasource import (
     HealthCheckDataSource,
 )
+from pd_ai_core_agents.background_agents.health_check.datasource.health_check_store import (
+    SqliteHealthCheckStore,
+)
 from pd_ai_core_agents.background_agents.health_check.vm_health_check import (
     VmHealthCheck,
 )
+from pd_ai_core_agents.background_agents.health_check.vm_health_check_test import (
+    VMHealthCheckTestResult,
+)
+from pd_ai_core_agents.background_agents.health_check.cycle_stats import (
+    HealthCheckCycleStats,
+)
+from pd_ai_core_agents.background_agents.health_check.executors import (
+    HealthCheckExecutors,
+)
+from pd_ai_core_agents.background_agents.health_check.history import (
+    HealthCheckHistory,
+)
+from pd_ai_core_agents.background_agents.health_check.run_coalescer import (
+    HealthCheckRunCoalescer,
+)
+from pd_ai_core_agents.background_agents.health_check.scheduler import (
+    HealthCheckScheduler,
+    DEFAULT_CHECK_INTERVAL,
+    DEFAULT_FAILURE_CHECK_INTERVAL,
+)
+from pd_ai_core_agents.background_agents.health_check.host_connectivity import (
+    HostConnectivityProbe,
+)
+from pd_ai_core_agents.background_agents.health_check.running_vm_index import (
+    RunningVmIndex,
+)
+from pd_ai_core_agents.background_agents.health_check.sharding import (
+    ShardedHealthCheckEngine,
+)
+from pd_ai_core_agents.background_agents.health_check.metrics import (
+    HealthCheckMetrics,
+    EventLoopLagSampler,
+    SKIP_REASON_DEADLINE,
+    SKIP_REASON_IN_FLIGHT,
+)
+from pd_ai_core_agents.background_agents.health_check.notifications import (
+    HealthCheckDigest,
+    HealthCheckFailureDigest,
+)
 from pd_ai_agent_core.messages import (
+    Message,
+    create_event_message,
+    create_error_notification_message,
     create_success_notification_message,
     VM_STATE_STARTED,
+    VM_STATE_STOPPED,
+    VM_STATE_SUSPENDED,
+    VM_STATE_PAUSED,
+    VM_STATE_RESUMED,
+    VM_STATE_CHANGED,
 )
+from pd_ai_core_agents.common.screenshot_cache import ScreenshotCache
+from pd_ai_core_agents.common.screen_analysis_cache import ScreenAnalysisCache
+from pd_ai_core_agents.common.constants import HEALTH_CHECK_HOST_CHANNEL
+from pd_ai_core_agents.common.icons import ICON_MANIFEST_EVENT, IconRegistry
+from pd_ai_core_agents.common.metrics import MetricsServer
 
 
 logger = logging.getLogger(__name__)
 
+# state changes that make a cached screenshot or screen analysis of the VM stale
+VM_STATE_CHANGE_MESSAGES = [
+    VM_STATE_STARTED,
+    VM_STATE_STOPPED,
+    VM_STATE_SUSPENDED,
+    VM_STATE_PAUSED,
+    VM_STATE_RESUMED,
+    VM_STATE_CHANGED,
+]
+
+DEFAULT_MAX_CONCURRENCY = 8
+# how often the agent wakes up to run the tests that are due
+DEFAULT_TICK_INTERVAL = 10
+# how often the health checks of deleted VMs are looked for
+DEFAULT_PRUNE_INTERVAL = 300.0
+
 
 class VmHealthCheckAgent(BackgroundAgent):
-    def __init__(self, session_id: str):
+    def __init__(
+        self,
+        session_id: str,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        cycle_timeout: Optional[float] = None,
+        io_workers: Optional[int] = None,
+        cpu_workers: Optional[int] = None,
+        check_interval: float = DEFAULT_CHECK_INTERVAL,
+        failure_check_interval: float = DEFAULT_FAILURE_CHECK_INTERVAL,
+        persistence_path: Optional[str] = None,
+        composite_guest_probe: bool = True,
+        shard_workers: int = 0,
+        metrics_port: Optional[int] = None,
+        metrics_path: Optional[str] = None,
+    ):
         super().__init__(
             session_id=session_id,
             agent_type="vm_health_check_agent",
-            interval=30,
+            interval=DEFAULT_TICK_INTERVAL,
         )
         self.subscribe_to(VM_HEALTH_CHECK)
-        self.subscribe_to(VM_STATE_STARTED)
+        for message_type in VM_STATE_CHANGE_MESSAGES:
+            self.subscribe_to(message_type)
         self.subscribe_to(VM_DISABLE_HEALTH_CHECK_TEST)
         self._vm_datasource = VirtualMachineDataSource.get_instance()
-        self._health_check_datasource = HealthCheckDataSource()
+        # ticks iterate this index instead of scanning the datasource
+        self._running_vms = RunningVmIndex(self._vm_datasource)
+        # in memory unless a path is given for the SQLite store
+        self._health_check_datasource = HealthCheckDataSource(
+            store=(
+                SqliteHealthCheckStore(persistence_path)
+                if persistence_path
+                else None
+            )
+        )
         self._notifications_service = ServiceRegistry.get(
             session_id, NOTIFICATION_SERVICE_NAME, NotificationService
         )
+        # failing tests reported in the digest message, until they recover
+        self._failure_digest = HealthCheckFailureDigest()
         self._logger = ServiceRegistry.get(session_id, LOGGER_SERVICE_NAME, LogService)
         self._time_delta_checks = timedelta(minutes=5)
+        # max_concurrency=1 keeps the old one-VM-at-a-time behaviour
+        self._max_concurrency = max(1, max_concurrency)
+        self._cycle_timeout = (
+            cycle_timeout if cycle_timeout is not None else check_interval
+        )
+        self._cycle_stats = HealthCheckCycleStats()
+        self._scheduler = HealthCheckScheduler(
+            base_interval=check_interval,
+            max_interval=self._time_delta_checks.total_seconds(),
+            failure_interval=failure_check_interval,
+        )
+        self._run_coalescer = HealthCheckRunCoalescer()
+        self._history = HealthCheckHistory()
+        # running VMs of the last tick, the shard workers forget the ones that leave
+        self._monitored_vm_ids: Set[str] = set()
+        self._pruned_at: Optional[float] = None
+        self._composite_guest_probe = composite_guest_probe
+        self._host_connectivity = HostConnectivityProbe(max_age=self.interval)
+        self._host_online = True
+        self._host_state_lock = threading.Lock()
+        # probes run on worker processes when sharded, the state stays here
+        self._shard_engine = (
+            ShardedHealthCheckEngine(
+                shard_workers, composite_guest_probe=composite_guest_probe
+            )
+            if shard_workers > 0
+            else None
+        )
+        self._metrics = HealthCheckMetrics.get_instance()
+        # notification actions reference icons by id, the UI resolves them with
+        # this, sent directly as it is not a health check notification
+        try:
+            self._notifications_service.send_sync(
+                create_event_message(
+                    session_id,
+                    None,
+                    ICON_MANIFEST_EVENT,
+                    "icon_manifest",
+                    IconRegistry.get_instance().manifest(),
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error sending the icon manifest: {e}")
+        # Prometheus text format, scraped from localhost or read from a file
+        self._metrics_path = metrics_path
+        self._metrics_server: Optional[MetricsServer] = None
+        if metrics_port is not None:
+            self._metrics_server = MetricsServer(self._metrics.registry, metrics_port)
+            try:
+                self._metrics_server.start()
+            except OSError as e:
+                logger.error(f"Error serving health check metrics on port {metrics_port}: {e}")
+                self._metrics_server = None
+        if io_workers is not None or cpu_workers is not None:
+            HealthCheckExecutors.configure(
+                io_workers=io_workers, cpu_workers=cpu_workers
+            )
 
     @property
     def session_id(self) -> str:
@@ -62,26 +221,173 @@ class VmHealthCheckAgent(BackgroundAgent):
         """Set the session ID for this agent"""
         self._session_id = value
 
+    def get_shard_engine(self) -> Optional[ShardedHealthCheckEngine]:
+        """Get the sharded probe engine, None unless shard_workers was set"""
+        return self._shard_engine
+
+    def shutdown(self) -> None:
+        """Stop the shard workers and the metrics server"""
+        if self._shard_engine is not None:
+            self._shard_engine.stop()
+        self._health_check_datasource.flush()
+        self._write_metrics()
+        if self._metrics_server is not None:
+            self._metrics_server.stop()
+            self._metrics_server = None
+
+    def get_cycle_stats(self) -> HealthCheckCycleStats:
+        """Get the duration statistics of the periodic health check cycles"""
+        return self._cycle_stats
+
+    def get_history(self) -> HealthCheckHistory:
+        """Get the probe history of every VM and test"""
+        return self._history
+
+    def get_metrics(self) -> HealthCheckMetrics:
+        """Get the health check metrics"""
+        return self._metrics
+
+    def _write_metrics(self) -> None:
+        if not self._metrics_path:
+            return
+        try:
+            self._metrics.registry.write_to_file(self._metrics_path)
+        except Exception as e:
+            logger.error(f"Error writing health check metrics to {self._metrics_path}: {e}")
+
     async def process(self) -> None:
         """Periodic check of VM states"""
         try:
-            vms = self._vm_datasource.get_vms_by_state("running")
+            vms = self._running_vms.vms()
+            running_vm_ids = {vm.id for vm in vms}
+            self._scheduler.retain(running_vm_ids)
+            self._forget_stopped_vms(running_vm_ids)
+            self._prune_deleted_vms()
             for vm in vms:
-                logger.info(f"Checking health of VM1 {vm.name}")
-                await self._process_health_check(vm.id)
+                self._schedule_health_check(self._get_or_create_health_check(vm))
+            due = self._scheduler.pop_due()
+            self._metrics.running_vms.set(len(vms))
+            self._metrics.scheduled_tests.set(self._scheduler.length())
+            self._metrics.due_tests.set(sum(len(names) for names in due.values()))
+            if due:
+                # one host side probe per cycle, before any guest probe
+                await self._check_host_connectivity(refresh=True)
+            digest = HealthCheckDigest()
+            await self._run_cycle(due, digest)
+            self._send_digest(digest)
         except Exception as e:
             logger.error(f"Error in VM monitor periodic check: {e}")
+        finally:
+            self._health_check_datasource.flush()
+            self._write_metrics()
+
+    def _forget_stopped_vms(self, running_vm_ids: Set[str]) -> None:
+        """Drop the worker state of the VMs that are no longer running.
+
+        Their probe history is kept, within the history limits, until they run
+        again or are deleted.
+        """
+        self._history.retain_running(running_vm_ids)
+        if self._shard_engine is not None:
+            for vm_id in self._monitored_vm_ids - running_vm_ids:
+                self._shard_engine.invalidate(vm_id)
+        self._monitored_vm_ids = set(running_vm_ids)
+
+    def _prune_deleted_vms(self) -> None:
+        """Remove the health checks, persisted ones included, of the VMs that no longer exist"""
+        now = time.monotonic()
+        if self._pruned_at is not None and now - self._pruned_at < DEFAULT_PRUNE_INTERVAL:
+            return
+        # an empty datasource has not loaded the VMs yet, nothing is known to be deleted
+        if self._vm_datasource.length() == 0:
+            return
+        self._pruned_at = now
+        for vm_id in self._health_check_datasource.get_vm_ids():
+            if self._vm_datasource.get_vm(vm_id) is None:
+                logger.info(f"VM {vm_id} no longer exists, removing its health check")
+                self._health_check_datasource.remove_health_check(vm_id)
+                self._scheduler.unregister(vm_id)
+                self._history.remove_vm(vm_id)
+                for msg in self._failure_digest.remove(self.session_id, vm_id):
+                    self._send_notification(msg)
+
+    async def _run_cycle(
+        self, due: Dict[str, List[str]], digest: Optional[HealthCheckDigest] = None
+    ) -> None:
+        """Run the due tests of each VM in parallel, bounded by the concurrency cap and the cycle deadline"""
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def check(vm_id: str, test_names: List[str]) -> None:
+            async with semaphore:
+                await self._process_health_check(vm_id, test_names, digest=digest)
+
+        tasks = [
+            asyncio.create_task(check(vm_id, test_names))
+            for vm_id, test_names in due.items()
+        ]
+        pending = set()
+        lag_sampler = EventLoopLagSampler(self._metrics)
+        lag_sampler.start()
+        try:
+            if tasks:
+                done, pending = await asyncio.wait(tasks, timeout=self._cycle_timeout)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+                for task in done:
+                    if task.exception() is not None:
+                        logger.error(f"Error checking VM health: {task.exception()}")
+        finally:
+            await lag_sampler.stop()
+
+        duration = time.monotonic() - started
+        self._cycle_stats.record(
+            duration=duration,
+            vm_count=len(tasks),
+            timed_out=len(pending),
+            interval=self.interval,
+        )
+        self._metrics.cycles.inc()
+        self._metrics.cycle_duration.observe(duration)
+        if self.interval is not None and duration > self.interval:
+            self._metrics.cycle_overruns.inc()
+        self._metrics.vms_checked.inc(len(tasks) - len(pending))
+        if pending:
+            self._metrics.vms_skipped.inc(len(pending), reason=SKIP_REASON_DEADLINE)
+        self._metrics.last_cycle_timestamp.set(time.time())
+        if pending:
+            logger.warning(
+                f"Health check cycle deadline of {self._cycle_timeout}s reached, {len(pending)} of {len(tasks)} VMs not checked"
+            )
+        logger.info(
+            f"Health check cycle finished in {duration:.2f}s for {len(tasks)} VMs "
+            f"(avg {self._cycle_stats.average_duration:.2f}s, max {self._cycle_stats.max_duration:.2f}s)"
+        )
 
     async def process_message(self, message: BackgroundMessage) -> None:
         """Handle VM state change events"""
         try:
+            if message.message_type in VM_STATE_CHANGE_MESSAGES:
+                vm_id = message.data.get("vm_id") if message.data else None
+                ScreenshotCache.get_instance().invalidate(vm_id)
+                ScreenAnalysisCache.get_instance().invalidate(vm_id)
+                if self._shard_engine is not None:
+                    self._shard_engine.invalidate(vm_id)
+                if vm_id:
+                    self._running_vms.on_state_change(vm_id, message.message_type)
             if (
                 message.message_type == VM_HEALTH_CHECK
                 or message.message_type == VM_STATE_STARTED
             ):
                 vm_id = message.data.get("vm_id")
                 if vm_id:
-                    await self._process_health_check(vm_id)
+                    digest = HealthCheckDigest()
+                    await self._process_health_check(
+                        vm_id, follow_up=True, digest=digest
+                    )
+                    self._send_digest(digest)
             elif message.message_type == VM_DISABLE_HEALTH_CHECK_TEST:
                 vm_id = message.data.get("vm_id")
                 test_name = message.data.get("test_name")
@@ -89,6 +395,8 @@ class VmHealthCheckAgent(BackgroundAgent):
                     await self._process_disable_health_check_test(vm_id, test_name)
         except Exception as e:
             logger.error(f"Error processing security checks: {e}")
+        finally:
+            self._health_check_datasource.flush()
 
     async def _process_disable_health_check_test(
         self, vm_id: str, test_name: str
@@ -100,32 +408,180 @@ class VmHealthCheckAgent(BackgroundAgent):
         self._health_check_datasource.disable_health_check_test(
             vm_id=vm_id, test_name=test_name
         )
+        self._scheduler.unregister(vm_id, test_name)
+        for msg in self._failure_digest.remove(self.session_id, vm_id, test_name):
+            self._send_notification(msg)
         msg = create_success_notification_message(
             session_id=self.session_id,
             channel=vm_id,
             message=f"Health check test {test_name} disabled",
             details=f"The health check test {test_name} has been disabled for VM {vm.name}",
         )
-        await self._notifications_service.send(msg)
+        self._send_notification(msg)
+
+    def _send_notification(self, msg: Message) -> None:
+        """Hand a notification to the notification service, which queues it without blocking"""
+        started = time.perf_counter()
+        try:
+            self._notifications_service.send_sync(msg)
+            self._metrics.notifications.inc()
+        except Exception as e:
+            logger.error(f"Error sending health check notification: {e}")
+        self._metrics.notification_send_duration.observe(time.perf_counter() - started)
+
+    def _send_digest(self, digest: HealthCheckDigest) -> None:
+        """Send the notifications for the transitions collected during a run"""
+        for msg in self._failure_digest.update(self.session_id, digest):
+            self._send_notification(msg)
+
+    async def _check_host_connectivity(self, refresh: bool = False) -> bool:
+        """Probe the host connectivity, notifying the user once when it changes"""
+        online = await self._host_connectivity.is_online(refresh=refresh)
+        with self._host_state_lock:
+            changed = online != self._host_online
+            self._host_online = online
+        if changed:
+            await self._notify_host_connectivity(online)
+        return online
+
+    async def _notify_host_connectivity(self, online: bool) -> None:
+        if online:
+            logger.info("Host is back online, resuming the VM internet checks")
+            msg = create_success_notification_message(
+                session_id=self.session_id,
+                channel=HEALTH_CHECK_HOST_CHANNEL,
+                message="Host is back online",
+                details="The host can reach the internet again. We will keep monitoring the VMs.",
+                data={},
+                replace=True,
+            )
+        else:
+            logger.warning("Host is offline, skipping the VM internet checks")
+            msg = create_error_notification_message(
+                session_id=self.session_id,
+                channel=HEALTH_CHECK_HOST_CHANNEL,
+                message="Host is offline",
+                details="The host cannot reach the internet, the VM internet checks are skipped until it is back online.",
+                data={},
+                replace=True,
+            )
+        self._send_notification(msg)
+
+    def _get_or_create_health_check(self, vm: VirtualMachine) -> VmHealthCheck:
+        health_check = self._health_check_datasource.get_health_check(vm.id)
+        if not health_check:
+            health_check = VmHealthCheck(
+                vm_id=vm.id,
+                last_update=datetime.now(),
+                composite_guest_probe=self._composite_guest_probe,
+            )
+            health_check.register_default_tests(
+                self.session_id, vm, self._notifications_service
+            )
+            self._health_check_datasource.restore_health_check(health_check)
+            self._health_check_datasource.update_health_check(
+                vm_id=vm.id, health_check=health_check
+            )
+        return health_check
+
+    def _schedule_health_check(self, health_check: VmHealthCheck) -> None:
+        self._scheduler.register(
+            health_check.vm_id,
+            [test.name for test in health_check.get_tests() if not test.is_disabled()],
+        )
 
-    async def _process_health_check(self, vm_id: str) -> None:
+    async def _process_health_check(
+        self,
+        vm_id: str,
+        test_names: Optional[Iterable[str]] = None,
+        follow_up: bool = False,
+        digest: Optional[HealthCheckDigest] = None,
+    ) -> None:
+        """Run the health check tests of a VM, all of them unless test_names is given.
+
+        Only one run per VM is in flight. Other triggers queue a single extra run,
+        of every test for the ones asking for a follow-up, of their due tests for
+        the periodic ones, so a due test is never dropped.
+        """
         if not vm_id:
             logger.error("VM ID is not set")
             return
-        vm = self._vm_datasource.get_vm(vm_id)
+        if test_names is not None:
+            test_names = list(test_names)
+        if not self._run_coalescer.begin(
+            vm_id, follow_up=follow_up, test_names=test_names
+        ):
+            if not follow_up:
+                self._metrics.vms_skipped.inc(reason=SKIP_REASON_IN_FLIGHT)
+            logger.info(
+                f"Health check of VM {vm_id} already running, "
+                f"{'follow-up' if follow_up else 'due tests'} queued"
+            )
+            return
+        run_again = True
+        try:
+            while run_again:
+                await self._run_health_check(vm_id, test_names, digest)
+                run_again, test_names = self._run_coalescer.finish(vm_id)
+        finally:
+            if run_again:
+                self._run_coalescer.release(vm_id)
+
+    async def _run_health_check(
+        self,
+        vm_id: str,
+        test_names: Optional[Iterable[str]] = None,
+        digest: Optional[HealthCheckDigest] = None,
+    ) -> None:
+        vm = self._running_vms.get(vm_id)
+        if vm is None:
+            # not indexed, e.g. a health check requested for a VM we have no event for
+            vm = self._vm_datasource.get_vm(vm_id)
+            if vm and vm.state == "running":
+                self._running_vms.add(vm)
         if vm and vm.state == "running":
-            logger.info(f"Checking health of VM2 {vm.name}")
-            health_check = self._health_check_datasource.get_health_check(vm_id)
-            if not health_check:
-                health_check = VmHealthCheck(vm_id=vm_id, last_update=datetime.now())
-                health_check.register_default_tests(self.session_id, vm)
-                self._health_check_datasource.update_health_check(
-                    vm_id=vm_id, health_check=health_check
+            logger.info(f"Checking health of VM {vm.name}")
+            health_check = self._get_or_create_health_check(vm)
+            self._schedule_health_check(health_check)
+            host_online = await self._check_host_connectivity()
+            if self._shard_engine is not None:
+                results = await self._shard_engine.probe(
+                    self.session_id,
+                    vm,
+                    health_check.enabled_test_names(test_names),
+                    host_online=host_online,
+                    failed_tests=health_check.failed_test_names(test_names),
+                )
+                await health_check.apply_results(results, digest=digest)
+            else:
+                results = await health_check.run_tests(
+                    test_names, host_online=host_online, digest=digest
+                )
+            for test_name, result in results.items():
+                self._record_probe_metrics(test_name, result)
+                self._scheduler.record(
+                    vm_id, test_name, result.is_healthy, skipped=result.skipped
+                )
+                self._history.record(
+                    vm_id,
+                    test_name,
+                    result.is_healthy,
+                    result.latency,
+                    skipped=result.skipped,
                 )
-            await health_check.run_tests()
             if not health_check.is_healthy():
                 logger.error(f"VM {vm_id} is not healthy: {health_check.get_reason()}")
-                return
             self._health_check_datasource.update_health_check(
                 vm_id=vm_id, health_check=health_check
             )
+
+    def _record_probe_metrics(
+        self, test_name: str, result: VMHealthCheckTestResult
+    ) -> None:
+        if result.skipped:
+            self._metrics.probes.inc(test=test_name, outcome="skipped")
+            return
+        self._metrics.probe_duration.observe(result.latency, test=test_name)
+        self._metrics.probes.inc(
+            test=test_name, outcome="healthy" if result.is_healthy else "unhealthy"
+        )
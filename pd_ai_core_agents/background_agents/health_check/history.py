@@ -0,0 +1,328 @@
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+OUTCOME_FAILURE = 0
+OUTCOME_SUCCESS = 1
+OUTCOME_SKIPPED = 2
+
+DEFAULT_RAW_CAPACITY = 64
+DEFAULT_ROLLUP_CAPACITY = 72
+DEFAULT_ROLLUP_PERIOD = 300.0
+DEFAULT_MAX_SERIES_PER_VM = 16
+DEFAULT_PERCENTILES = (50, 95, 99)
+# stopped VMs whose history is kept, and for how long, until they run again
+DEFAULT_MAX_STOPPED_VMS = 256
+DEFAULT_STOPPED_RETENTION = 7 * 24 * 3600.0
+
+
+class HealthCheckSeries:
+    """Time series of one (VM, test) pair kept in fixed size array ring buffers.
+
+    The latest raw_capacity probes are kept as they are. Probes that fall out of
+    the raw ring are folded, RRD style, into rollup buckets of rollup_period
+    seconds holding the probe count, failure count and latency sum and max.
+    """
+
+    __slots__ = (
+        "_raw_capacity",
+        "_raw_timestamps",
+        "_raw_outcomes",
+        "_raw_latencies",
+        "_raw_head",
+        "_raw_count",
+        "_rollup_capacity",
+        "_rollup_period",
+        "_rollup_starts",
+        "_rollup_counts",
+        "_rollup_failures",
+        "_rollup_latency_sums",
+        "_rollup_latency_maxes",
+        "_rollup_head",
+        "_rollup_count",
+    )
+
+    def __init__(
+        self,
+        raw_capacity: int = DEFAULT_RAW_CAPACITY,
+        rollup_capacity: int = DEFAULT_ROLLUP_CAPACITY,
+        rollup_period: float = DEFAULT_ROLLUP_PERIOD,
+    ):
+        self._raw_capacity = max(1, raw_capacity)
+        self._raw_timestamps = array("d", [0.0]) * self._raw_capacity
+        self._raw_outcomes = array("b", [0]) * self._raw_capacity
+        self._raw_latencies = array("f", [0.0]) * self._raw_capacity
+        self._raw_head = 0
+        self._raw_count = 0
+        self._rollup_capacity = max(1, rollup_capacity)
+        self._rollup_period = rollup_period
+        self._rollup_starts = array("d", [0.0]) * self._rollup_capacity
+        self._rollup_counts = array("I", [0]) * self._rollup_capacity
+        self._rollup_failures = array("I", [0]) * self._rollup_capacity
+        self._rollup_latency_sums = array("f", [0.0]) * self._rollup_capacity
+        self._rollup_latency_maxes = array("f", [0.0]) * self._rollup_capacity
+        self._rollup_head = 0
+        self._rollup_count = 0
+
+    def append(self, timestamp: float, outcome: int, latency: float) -> None:
+        """Add a probe, evicting the oldest raw probe into the rollups when full"""
+        index = self._raw_head
+        if self._raw_count == self._raw_capacity:
+            self._fold(
+                self._raw_timestamps[index],
+                self._raw_outcomes[index],
+                self._raw_latencies[index],
+            )
+        else:
+            self._raw_count += 1
+        self._raw_timestamps[index] = timestamp
+        self._raw_outcomes[index] = outcome
+        self._raw_latencies[index] = latency
+        self._raw_head = (index + 1) % self._raw_capacity
+
+    def failure_rate(self, since: Optional[float] = None) -> Optional[float]:
+        """Failed probes over run probes, skipped probes are not counted"""
+        total = 0
+        failures = 0
+        for timestamp, outcome, _ in self._raw_samples():
+            if since is not None and timestamp < since:
+                continue
+            if outcome == OUTCOME_SKIPPED:
+                continue
+            total += 1
+            if outcome == OUTCOME_FAILURE:
+                failures += 1
+        for start, count, failed, _, _ in self._rollups():
+            if since is not None and start + self._rollup_period <= since:
+                continue
+            total += count
+            failures += failed
+        if total == 0:
+            return None
+        return failures / total
+
+    def latency_percentiles(
+        self,
+        percentiles: Iterable[float] = DEFAULT_PERCENTILES,
+        since: Optional[float] = None,
+    ) -> Dict[float, float]:
+        """Nearest rank latency percentiles over the raw probes"""
+        latencies = sorted(
+            latency
+            for timestamp, outcome, latency in self._raw_samples()
+            if outcome != OUTCOME_SKIPPED and (since is None or timestamp >= since)
+        )
+        if not latencies:
+            return {}
+        result: Dict[float, float] = {}
+        for percentile in percentiles:
+            rank = max(1, math.ceil(percentile / 100 * len(latencies)))
+            result[percentile] = latencies[min(rank, len(latencies)) - 1]
+        return result
+
+    def samples(self) -> List[Tuple[float, int, float]]:
+        """Get the raw probes, oldest first"""
+        return list(self._raw_samples())
+
+    def size(self) -> int:
+        """Get the number of raw probes held"""
+        return self._raw_count
+
+    def memory_usage(self) -> int:
+        """Bytes used by the ring buffers"""
+        return sum(
+            buffer.itemsize * len(buffer)
+            for buffer in (
+                self._raw_timestamps,
+                self._raw_outcomes,
+                self._raw_latencies,
+                self._rollup_starts,
+                self._rollup_counts,
+                self._rollup_failures,
+                self._rollup_latency_sums,
+                self._rollup_latency_maxes,
+            )
+        )
+
+    def _fold(self, timestamp: float, outcome: int, latency: float) -> None:
+        if outcome == OUTCOME_SKIPPED:
+            return
+        start = timestamp - timestamp % self._rollup_period
+        last = (self._rollup_head - 1) % self._rollup_capacity
+        if self._rollup_count == 0 or self._rollup_starts[last] != start:
+            last = self._rollup_head
+            self._rollup_starts[last] = start
+            self._rollup_counts[last] = 0
+            self._rollup_failures[last] = 0
+            self._rollup_latency_sums[last] = 0.0
+            self._rollup_latency_maxes[last] = 0.0
+            self._rollup_head = (last + 1) % self._rollup_capacity
+            self._rollup_count = min(self._rollup_count + 1, self._rollup_capacity)
+        self._rollup_counts[last] += 1
+        if outcome == OUTCOME_FAILURE:
+            self._rollup_failures[last] += 1
+        self._rollup_latency_sums[last] += latency
+        self._rollup_latency_maxes[last] = max(
+            self._rollup_latency_maxes[last], latency
+        )
+
+    def _raw_samples(self) -> Iterable[Tuple[float, int, float]]:
+        first = (self._raw_head - self._raw_count) % self._raw_capacity
+        for offset in range(self._raw_count):
+            index = (first + offset) % self._raw_capacity
+            yield (
+                self._raw_timestamps[index],
+                self._raw_outcomes[index],
+                self._raw_latencies[index],
+            )
+
+    def _rollups(self) -> Iterable[Tuple[float, int, int, float, float]]:
+        first = (self._rollup_head - self._rollup_count) % self._rollup_capacity
+        for offset in range(self._rollup_count):
+            index = (first + offset) % self._rollup_capacity
+            yield (
+                self._rollup_starts[index],
+                self._rollup_counts[index],
+                self._rollup_failures[index],
+                self._rollup_latency_sums[index],
+                self._rollup_latency_maxes[index],
+            )
+
+
+class HealthCheckHistory:
+    """Probe history of every (VM, test) pair with failure rate and latency queries.
+
+    Every series has a fixed size, and at most max_series_per_vm series are kept
+    per VM, so the memory used per VM is bounded. The history of a stopped VM is
+    kept for when it runs again, for at most max_stopped_vms VMs and
+    stopped_retention seconds.
+    """
+
+    def __init__(
+        self,
+        raw_capacity: int = DEFAULT_RAW_CAPACITY,
+        rollup_capacity: int = DEFAULT_ROLLUP_CAPACITY,
+        rollup_period: float = DEFAULT_ROLLUP_PERIOD,
+        max_series_per_vm: int = DEFAULT_MAX_SERIES_PER_VM,
+        max_stopped_vms: int = DEFAULT_MAX_STOPPED_VMS,
+        stopped_retention: float = DEFAULT_STOPPED_RETENTION,
+    ):
+        self._raw_capacity = raw_capacity
+        self._rollup_capacity = rollup_capacity
+        self._rollup_period = rollup_period
+        self._max_series_per_vm = max_series_per_vm
+        self.max_stopped_vms = max_stopped_vms
+        self.stopped_retention = stopped_retention
+        self._series: Dict[str, Dict[str, HealthCheckSeries]] = {}
+        # VMs with a history that are not running, oldest stop first
+        self._stopped: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        vm_id: str,
+        test_name: str,
+        is_healthy: bool,
+        latency: float,
+        skipped: bool = False,
+        timestamp: Optional[float] = None,
+    ) -> None:
+        """Record the outcome and latency of a probe"""
+        timestamp = time.time() if timestamp is None else timestamp
+        if skipped:
+            outcome = OUTCOME_SKIPPED
+        else:
+            outcome = OUTCOME_SUCCESS if is_healthy else OUTCOME_FAILURE
+        with self._lock:
+            vm_series = self._series.setdefault(vm_id, {})
+            series = vm_series.get(test_name)
+            if series is None:
+                if len(vm_series) >= self._max_series_per_vm:
+                    logger.warning(
+                        f"Health check history for VM {vm_id} is full, not recording {test_name}"
+                    )
+                    return
+                series = HealthCheckSeries(
+                    self._raw_capacity, self._rollup_capacity, self._rollup_period
+                )
+                vm_series[test_name] = series
+            series.append(timestamp, outcome, latency)
+
+    def failure_rate(
+        self, vm_id: str, test_name: str, window: Optional[float] = None
+    ) -> Optional[float]:
+        """Failure rate of a test, over the last window seconds when given"""
+        since = time.time() - window if window is not None else None
+        with self._lock:
+            series = self._get_series(vm_id, test_name)
+            return series.failure_rate(since) if series is not None else None
+
+    def latency_percentiles(
+        self,
+        vm_id: str,
+        test_name: str,
+        percentiles: Iterable[float] = DEFAULT_PERCENTILES,
+        window: Optional[float] = None,
+    ) -> Dict[float, float]:
+        """Probe latency percentiles of a test, p50/p95/p99 by default"""
+        since = time.time() - window if window is not None else None
+        with self._lock:
+            series = self._get_series(vm_id, test_name)
+            if series is None:
+                return {}
+            return series.latency_percentiles(percentiles, since)
+
+    def get_series(self, vm_id: str, test_name: str) -> Optional[HealthCheckSeries]:
+        with self._lock:
+            return self._get_series(vm_id, test_name)
+
+    def get_test_names(self, vm_id: str) -> List[str]:
+        with self._lock:
+            return list(self._series.get(vm_id, {}).keys())
+
+    def retain_running(
+        self, running_vm_ids: Set[str], now: Optional[float] = None
+    ) -> None:
+        """Track the stopped VMs, dropping the oldest histories past the limits"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for vm_id in running_vm_ids:
+                self._stopped.pop(vm_id, None)
+            for vm_id in self._series:
+                if vm_id not in running_vm_ids and vm_id not in self._stopped:
+                    self._stopped[vm_id] = now
+            while self._stopped:
+                vm_id, stopped_at = next(iter(self._stopped.items()))
+                if (
+                    len(self._stopped) <= self.max_stopped_vms
+                    and now - stopped_at <= self.stopped_retention
+                ):
+                    break
+                logger.debug(f"Dropping the health check history of stopped VM {vm_id}")
+                del self._stopped[vm_id]
+                self._series.pop(vm_id, None)
+
+    def remove_vm(self, vm_id: str) -> None:
+        """Drop the history of a VM"""
+        with self._lock:
+            self._series.pop(vm_id, None)
+            self._stopped.pop(vm_id, None)
+
+    def memory_usage(self, vm_id: Optional[str] = None) -> int:
+        """Bytes held by the ring buffers of a VM, or of every VM"""
+        with self._lock:
+            vms = [vm_id] if vm_id is not None else list(self._series.keys())
+            return sum(
+                series.memory_usage()
+                for vm in vms
+                for series in self._series.get(vm, {}).values()
+            )
+
+    def _get_series(self, vm_id: str, test_name: str) -> Optional[HealthCheckSeries]:
+        return self._series.get(vm_id, {}).get(test_name)
@@ -0,0 +1,75 @@
+from typing import List, Optional, Tuple
+import logging
+import socket
+import threading
+import time
+from pd_ai_core_agents.background_agents.health_check.executors import run_io
+from pd_ai_core_agents.common.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# the host is online if it can open a TCP connection to any of these
+DEFAULT_HOST_PROBE_TARGETS: List[Tuple[str, int]] = [
+    ("google.com", 443),
+    ("1.1.1.1", 53),
+    ("8.8.8.8", 53),
+]
+DEFAULT_HOST_PROBE_TIMEOUT = 2.0
+# a probe result is reused for this many seconds
+DEFAULT_HOST_PROBE_MAX_AGE = 10.0
+
+
+class HostConnectivityProbe:
+    """Checks that the host itself can reach the internet.
+
+    The result is cached for max_age seconds and concurrent checks share a single
+    probe, so a health check cycle probes the host once whatever the number of VMs.
+    """
+
+    def __init__(
+        self,
+        targets: Optional[List[Tuple[str, int]]] = None,
+        timeout: float = DEFAULT_HOST_PROBE_TIMEOUT,
+        max_age: float = DEFAULT_HOST_PROBE_MAX_AGE,
+    ):
+        self.targets = targets if targets is not None else DEFAULT_HOST_PROBE_TARGETS
+        self.timeout = timeout
+        self.max_age = max_age
+        self._online: Optional[bool] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._single_flight: SingleFlight[bool] = SingleFlight()
+
+    def check(self) -> bool:
+        """Probe the targets in order, blocking, and cache the result"""
+        online = False
+        for host, port in self.targets:
+            try:
+                with socket.create_connection((host, port), timeout=self.timeout):
+                    online = True
+                    break
+            except OSError as e:
+                logger.debug(f"Host connectivity probe to {host}:{port} failed: {e}")
+        with self._lock:
+            self._online = online
+            self._checked_at = time.monotonic()
+        if not online:
+            logger.warning("Host connectivity probe failed, the host looks offline")
+        return online
+
+    async def is_online(self, refresh: bool = False) -> bool:
+        """Get the host connectivity, probing again if the cached result is stale"""
+        with self._lock:
+            if (
+                not refresh
+                and self._online is not None
+                and time.monotonic() - self._checked_at <= self.max_age
+            ):
+                return self._online
+        return await run_io(self._single_flight.do, "host", self.check)
+
+    @property
+    def last_result(self) -> Optional[bool]:
+        """Get the result of the last probe, None if the host was never probed"""
+        with self._lock:
+            return self._online
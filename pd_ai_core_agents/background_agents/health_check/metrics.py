@@ -0,0 +1,123 @@
+from typing import ClassVar, Optional
+import asyncio
+import logging
+import threading
+import time
+from pd_ai_core_agents.common.metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+CYCLE_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# how often the event loop lag is sampled while a cycle runs
+DEFAULT_LAG_SAMPLE_INTERVAL = 0.1
+
+SKIP_REASON_DEADLINE = "deadline"
+SKIP_REASON_IN_FLIGHT = "in_flight"
+
+
+class HealthCheckMetrics:
+    """Counters and histograms of the health check subsystem.
+
+    One registry per process, rendered in the Prometheus text format by the agent,
+    either on a local HTTP endpoint or into a file.
+    """
+
+    _instance: ClassVar[Optional["HealthCheckMetrics"]] = None
+    _instance_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self.probe_duration = self.registry.histogram(
+            "health_check_probe_duration_seconds",
+            "Duration of a health check test probe",
+            labels=("test",),
+        )
+        self.probes = self.registry.counter(
+            "health_check_probes_total",
+            "Health check test probes by outcome (healthy, unhealthy, skipped)",
+            labels=("test", "outcome"),
+        )
+        self.cycle_duration = self.registry.histogram(
+            "health_check_cycle_duration_seconds",
+            "Duration of a periodic health check cycle",
+            buckets=CYCLE_BUCKETS,
+        )
+        self.cycles = self.registry.counter(
+            "health_check_cycles_total", "Periodic health check cycles run"
+        )
+        self.cycle_overruns = self.registry.counter(
+            "health_check_cycle_overruns_total",
+            "Cycles that took longer than the agent interval",
+        )
+        self.last_cycle_timestamp = self.registry.gauge(
+            "health_check_last_cycle_timestamp_seconds",
+            "Unix time the last periodic health check cycle finished",
+        )
+        self.vms_checked = self.registry.counter(
+            "health_check_vms_checked_total", "VMs whose due tests were run"
+        )
+        self.vms_skipped = self.registry.counter(
+            "health_check_vms_skipped_total",
+            "VMs whose due tests did not run in their cycle, by reason (deadline, in_flight)",
+            labels=("reason",),
+        )
+        self.due_tests = self.registry.gauge(
+            "health_check_due_tests", "Tests that were due in the last cycle"
+        )
+        self.scheduled_tests = self.registry.gauge(
+            "health_check_scheduled_tests", "Tests in the schedule"
+        )
+        self.running_vms = self.registry.gauge(
+            "health_check_running_vms", "Running VMs being monitored"
+        )
+        self.notification_send_duration = self.registry.histogram(
+            "health_check_notification_send_duration_seconds",
+            "Time taken to hand a notification to the notification service",
+        )
+        self.notifications = self.registry.counter(
+            "health_check_notifications_total", "Notifications sent"
+        )
+        self.event_loop_lag = self.registry.histogram(
+            "health_check_event_loop_lag_seconds",
+            "How late a task sleeping on the agent event loop wakes up during a cycle",
+            buckets=LAG_BUCKETS,
+        )
+
+    @classmethod
+    def get_instance(cls) -> "HealthCheckMetrics":
+        """Get the shared health check metrics"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+
+class EventLoopLagSampler:
+    """Observes the event loop lag while running, i.e. while a cycle is in progress"""
+
+    def __init__(
+        self,
+        metrics: HealthCheckMetrics,
+        interval: float = DEFAULT_LAG_SAMPLE_INTERVAL,
+    ):
+        self._metrics = metrics
+        self.interval = interval
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            self._metrics.event_loop_lag.observe(max(0.0, lag))
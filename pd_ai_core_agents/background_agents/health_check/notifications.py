@@ -0,0 +1,196 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import json
+import logging
+import threading
+from pd_ai_agent_core.messages import (
+    Message,
+    NotificationAction,
+    NotificationActionType,
+    create_error_notification_message,
+    create_success_notification_message,
+)
+from pd_ai_core_agents.common.constants import HEALTH_CHECK_DIGEST_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+
+class HealthCheckTransition:
+    """A test going from healthy to unhealthy or back, with the message it would send"""
+
+    def __init__(
+        self,
+        vm_id: str,
+        vm_name: str,
+        test_name: str,
+        is_healthy: bool,
+        reason: str,
+        message: Message,
+    ):
+        self.vm_id = vm_id
+        self.vm_name = vm_name
+        self.test_name = test_name
+        self.is_healthy = is_healthy
+        self.reason = reason
+        self.message = message
+
+
+class HealthCheckDigest:
+    """Collects the transitions of a health check cycle across every VM"""
+
+    def __init__(self):
+        self._transitions: List[HealthCheckTransition] = []
+        self._lock = threading.Lock()
+
+    def add(self, transition: HealthCheckTransition) -> None:
+        with self._lock:
+            self._transitions.append(transition)
+
+    def take(self) -> List[HealthCheckTransition]:
+        """Get the collected transitions and reset the digest"""
+        with self._lock:
+            transitions, self._transitions = self._transitions, []
+        return transitions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._transitions)
+
+
+class HealthCheckFailureDigest:
+    """The failing tests reported in the digest message, kept until they recover.
+
+    A single failure in a cycle is sent as the test's own message, and so is
+    its recovery. When several tests fail in the same cycle they are added to
+    the digest instead. The digest message replaces the previous one on the
+    digest channel, so it lists every test of the digest, whatever cycle it
+    failed in, with the actions of their own messages. A test leaves the digest
+    when it recovers, and the message turns into a recovery once it is empty.
+    """
+
+    def __init__(self):
+        # (vm_id, test_name) -> failure, oldest first
+        self._failing: "OrderedDict[Tuple[str, str], HealthCheckTransition]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def update(self, session_id: str, digest: HealthCheckDigest) -> List[Message]:
+        """Get the messages to send for the transitions of a cycle"""
+        transitions = digest.take()
+        failures = [t for t in transitions if not t.is_healthy]
+        messages: List[Message] = []
+        recovered: List[HealthCheckTransition] = []
+        with self._lock:
+            for transition in transitions:
+                if not transition.is_healthy:
+                    continue
+                if self._failing.pop(_key(transition), None) is not None:
+                    recovered.append(transition)
+                else:
+                    messages.append(transition.message)
+            if len(failures) == 1 and _key(failures[0]) not in self._failing:
+                messages.append(failures[0].message)
+            elif failures:
+                for transition in failures:
+                    self._failing[_key(transition)] = transition
+            if recovered or len(failures) > 1:
+                messages.append(self._build_message(session_id, recovered))
+        return messages
+
+    def remove(
+        self, session_id: str, vm_id: str, test_name: Optional[str] = None
+    ) -> List[Message]:
+        """Drop the tests of a VM that will not recover, e.g. disabled or deleted.
+
+        Returns the updated digest message, if the digest changed.
+        """
+        with self._lock:
+            removed = [
+                key
+                for key in self._failing
+                if key[0] == vm_id and (test_name is None or key[1] == test_name)
+            ]
+            if not removed:
+                return []
+            for key in removed:
+                del self._failing[key]
+            return [self._build_message(session_id, [])]
+
+    def failing(self) -> List[Tuple[str, str]]:
+        """Get the (vm_id, test_name) of the tests in the digest"""
+        with self._lock:
+            return list(self._failing)
+
+    def _build_message(
+        self, session_id: str, recovered: List[HealthCheckTransition]
+    ) -> Message:
+        failing = list(self._failing.values())
+        if not failing:
+            return create_success_notification_message(
+                session_id=session_id,
+                channel=HEALTH_CHECK_DIGEST_CHANNEL,
+                message="The failed health check tests recovered",
+                details="\n".join(f"{t.vm_name}: {t.test_name}" for t in recovered),
+                data={
+                    "vm_ids": sorted({t.vm_id for t in recovered}),
+                    "tests": [
+                        {"vm_id": t.vm_id, "test_name": t.test_name}
+                        for t in recovered
+                    ],
+                },
+                replace=True,
+            )
+        details = [f"{t.vm_name}: {t.reason or t.test_name}" for t in failing]
+        if recovered:
+            details.append(
+                "Recovered: "
+                + ", ".join(f"{t.vm_name}: {t.test_name}" for t in recovered)
+            )
+        return create_error_notification_message(
+            session_id=session_id,
+            channel=HEALTH_CHECK_DIGEST_CHANNEL,
+            message=f"{len(failing)} health check tests failing",
+            details="\n".join(details),
+            data={
+                "vm_ids": sorted({t.vm_id for t in failing}),
+                "tests": [
+                    {"vm_id": t.vm_id, "test_name": t.test_name} for t in failing
+                ],
+            },
+            actions=_digest_actions(failing),
+            replace=True,
+        )
+
+
+def _key(transition: HealthCheckTransition) -> Tuple[str, str]:
+    return transition.vm_id, transition.test_name
+
+
+def _digest_actions(failing: List[HealthCheckTransition]) -> List[NotificationAction]:
+    """The actions of the failure messages, once each, labelled with what they act on"""
+    actions: List[NotificationAction] = []
+    seen = set()
+    for transition in failing:
+        body = transition.message.body
+        if not hasattr(body, "to_dict"):
+            continue
+        for action in body.to_dict().get("actions") or []:
+            data = action.get("data") or {}
+            key = (action["value"], json.dumps(data, sort_keys=True, default=str))
+            if key in seen:
+                continue
+            seen.add(key)
+            target = transition.vm_name
+            if "test_name" in data:
+                target = f"{target}, {transition.reason or transition.test_name}"
+            actions.append(
+                NotificationAction(
+                    label=f"{action['label']} ({target})",
+                    value=action["value"],
+                    icon=action["icon"],
+                    kind=NotificationActionType(action["kind"]),
+                    data=data,
+                )
+            )
+    return actions
@@ -0,0 +1,64 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class HealthCheckRunCoalescer:
+    """Single-flight guard for the health check runs of each VM.
+
+    Only one run per VM id is in flight at a time. A trigger that arrives while a
+    run is in flight queues exactly one extra run, however many such triggers
+    arrive: a follow-up trigger asks for every test, a trigger with test names
+    (the periodic due tests) for those tests, and the queued run covers the union.
+    A trigger with neither joins the run in flight. Runs are started from
+    different threads and event loops, so the state is guarded by a threading lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Set[str] = set()
+        # vm id -> tests of the queued run, None for every test
+        self._follow_ups: Dict[str, Optional[Set[str]]] = {}
+
+    def begin(
+        self,
+        vm_id: str,
+        follow_up: bool = False,
+        test_names: Optional[Iterable[str]] = None,
+    ) -> bool:
+        """Try to start a run, returns False when the trigger was coalesced"""
+        with self._lock:
+            if vm_id not in self._in_flight:
+                self._in_flight.add(vm_id)
+                return True
+            if follow_up:
+                self._follow_ups[vm_id] = None
+            elif test_names is not None:
+                if vm_id not in self._follow_ups:
+                    self._follow_ups[vm_id] = set(test_names)
+                else:
+                    queued = self._follow_ups[vm_id]
+                    if queued is not None:
+                        queued.update(test_names)
+            return False
+
+    def finish(self, vm_id: str) -> Tuple[bool, Optional[List[str]]]:
+        """Finish a run, returns whether a queued run must start now and its tests, None for every test"""
+        with self._lock:
+            if vm_id in self._follow_ups:
+                queued = self._follow_ups.pop(vm_id)
+                return True, sorted(queued) if queued is not None else None
+            self._in_flight.discard(vm_id)
+            return False, None
+
+    def release(self, vm_id: str) -> None:
+        """Drop the in-flight run of a VM and any queued follow-up"""
+        with self._lock:
+            self._in_flight.discard(vm_id)
+            self._follow_ups.pop(vm_id, None)
+
+    def is_running(self, vm_id: str) -> bool:
+        with self._lock:
+            return vm_id in self._in_flight
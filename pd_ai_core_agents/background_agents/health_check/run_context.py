@@ -0,0 +1,24 @@
+from typing import Iterable, Optional, Set
+from pd_ai_core_agents.background_agents.health_check.guest_probe import (
+    CompositeGuestProbe,
+)
+from pd_ai_core_agents.background_agents.health_check.notifications import (
+    HealthCheckDigest,
+)
+
+
+class HealthCheckRunContext:
+    """State shared by the tests of a VM during a single health check run"""
+
+    def __init__(
+        self,
+        guest_probe: Optional[CompositeGuestProbe] = None,
+        host_online: bool = True,
+        digest: Optional[HealthCheckDigest] = None,
+        failed_tests: Optional[Iterable[str]] = None,
+    ):
+        self.guest_probe = guest_probe
+        self.host_online = host_online
+        self.digest = digest
+        # tests whose latest probe failed, their dependents are skipped
+        self.failed_tests: Set[str] = set(failed_tests or ())
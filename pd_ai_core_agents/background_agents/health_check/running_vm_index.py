@@ -0,0 +1,97 @@
+from typing import Dict, List, Optional
+import logging
+import threading
+import time
+from pd_ai_agent_core.parallels_desktop import VirtualMachine
+from pd_ai_agent_core.parallels_desktop.datasource import VirtualMachineDataSource
+from pd_ai_agent_core.messages import (
+    VM_STATE_STARTED,
+    VM_STATE_STOPPED,
+    VM_STATE_SUSPENDED,
+    VM_STATE_PAUSED,
+    VM_STATE_RESUMED,
+)
+
+logger = logging.getLogger(__name__)
+
+# how often the index is checked against a full datasource scan
+DEFAULT_RECONCILE_INTERVAL = 300.0
+
+_RUNNING_MESSAGES = (VM_STATE_STARTED, VM_STATE_RESUMED)
+_NOT_RUNNING_MESSAGES = (VM_STATE_STOPPED, VM_STATE_SUSPENDED, VM_STATE_PAUSED)
+
+
+class RunningVmIndex:
+    """In memory index of the running VMs, kept up to date from state change messages.
+
+    Only a VM that starts or changes state is looked up in the datasource. The
+    full get_vms_by_state scan runs once per reconcile interval, to catch changes
+    that did not come with a message.
+    """
+
+    def __init__(
+        self,
+        datasource: VirtualMachineDataSource,
+        reconcile_interval: float = DEFAULT_RECONCILE_INTERVAL,
+    ):
+        self._datasource = datasource
+        self.reconcile_interval = reconcile_interval
+        self._vms: Dict[str, VirtualMachine] = {}
+        self._reconciled_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def vms(self) -> List[VirtualMachine]:
+        """Get the running VMs, reconciling first if the index is due for it"""
+        with self._lock:
+            due = (
+                self._reconciled_at is None
+                or time.monotonic() - self._reconciled_at >= self.reconcile_interval
+            )
+        if due:
+            self.reconcile()
+        with self._lock:
+            return list(self._vms.values())
+
+    def get(self, vm_id: str) -> Optional[VirtualMachine]:
+        """Get a running VM from the index"""
+        with self._lock:
+            return self._vms.get(vm_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._vms)
+
+    def reconcile(self) -> None:
+        """Rebuild the index from a full datasource scan"""
+        vms = self._datasource.get_vms_by_state("running")
+        with self._lock:
+            first = self._reconciled_at is None
+            added = {vm.id for vm in vms} - set(self._vms)
+            removed = set(self._vms) - {vm.id for vm in vms}
+            self._vms = {vm.id: vm for vm in vms}
+            self._reconciled_at = time.monotonic()
+        if not first and (added or removed):
+            logger.info(
+                f"Running VM index reconciled, {len(added)} added, {len(removed)} removed"
+            )
+
+    def on_state_change(self, vm_id: str, message_type: str) -> None:
+        """Update the index from a VM state change message"""
+        if message_type in _NOT_RUNNING_MESSAGES:
+            self.remove(vm_id)
+            return
+        vm = self._datasource.get_vm(vm_id)
+        if vm is not None and (
+            message_type in _RUNNING_MESSAGES or vm.state == "running"
+        ):
+            self.add(vm)
+        else:
+            self.remove(vm_id)
+
+    def add(self, vm: VirtualMachine) -> None:
+        with self._lock:
+            self._vms[vm.id] = vm
+
+    def remove(self, vm_id: str) -> None:
+        with self._lock:
+            self._vms.pop(vm_id, None)
@@ -0,0 +1,169 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECK_INTERVAL = 30.0
+DEFAULT_MAX_CHECK_INTERVAL = 300.0
+DEFAULT_FAILURE_CHECK_INTERVAL = 10.0
+DEFAULT_BACKOFF_FACTOR = 2.0
+DEFAULT_JITTER = 0.1
+
+
+class _ScheduleEntry:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.due = 0.0
+        self.version = 0
+        self.healthy_streak = 0
+
+
+class HealthCheckScheduler:
+    """Priority queue scheduler that gives every (VM, test) pair its own next run time.
+
+    Tests that keep passing back off exponentially up to max_interval, a failing
+    test is rechecked after failure_interval so it reaches count_for_failure
+    quickly, and new pairs are spread over the base interval so the work does not
+    all land on the same tick.
+    """
+
+    def __init__(
+        self,
+        base_interval: float = DEFAULT_CHECK_INTERVAL,
+        max_interval: float = DEFAULT_MAX_CHECK_INTERVAL,
+        failure_interval: float = DEFAULT_FAILURE_CHECK_INTERVAL,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        jitter: float = DEFAULT_JITTER,
+    ):
+        self.base_interval = base_interval
+        self.max_interval = max(base_interval, max_interval)
+        self.failure_interval = failure_interval
+        self.backoff_factor = max(1.0, backoff_factor)
+        self.jitter = jitter
+        self._entries: Dict[Tuple[str, str], _ScheduleEntry] = {}
+        self._heap: List[Tuple[float, int, str, str]] = []
+        # scheduler wide, a re-registered pair must not match the heap items of
+        # its previous entry
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def register(
+        self, vm_id: str, test_names: Iterable[str], now: Optional[float] = None
+    ) -> None:
+        """Add the tests of a VM, pairs that are already scheduled keep their next run"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for test_name in test_names:
+                key = (vm_id, test_name)
+                if key in self._entries:
+                    continue
+                entry = _ScheduleEntry(self.base_interval)
+                self._entries[key] = entry
+                self._push(key, entry, now + self._spread_offset(key))
+
+    def unregister(self, vm_id: str, test_name: Optional[str] = None) -> None:
+        """Remove a VM, or a single test of a VM, from the schedule"""
+        with self._lock:
+            if test_name is not None:
+                self._entries.pop((vm_id, test_name), None)
+                return
+            for key in [key for key in self._entries if key[0] == vm_id]:
+                del self._entries[key]
+
+    def retain(self, vm_ids: Set[str]) -> None:
+        """Drop every VM that is not in vm_ids"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] not in vm_ids]:
+                del self._entries[key]
+
+    def pop_due(self, now: Optional[float] = None) -> Dict[str, List[str]]:
+        """Pop every pair that is due, grouped by VM id.
+
+        Popped pairs are provisionally rescheduled at their current interval, so a
+        run that never reports back (timeout, cancellation) is still retried.
+        """
+        now = time.monotonic() if now is None else now
+        due: Dict[str, List[str]] = {}
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, version, vm_id, test_name = heapq.heappop(self._heap)
+                key = (vm_id, test_name)
+                entry = self._entries.get(key)
+                if entry is None or entry.version != version:
+                    continue
+                due.setdefault(vm_id, []).append(test_name)
+                self._push(key, entry, now + self._jittered(entry.interval))
+        return due
+
+    def record(
+        self,
+        vm_id: str,
+        test_name: str,
+        is_healthy: bool,
+        now: Optional[float] = None,
+        skipped: bool = False,
+    ) -> float:
+        """Reschedule a pair from the outcome of its last run, returns the new interval
+
+        A skipped run keeps the current streak and comes back after the base interval.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            key = (vm_id, test_name)
+            entry = self._entries.get(key)
+            if entry is None:
+                return 0.0
+            if skipped:
+                self._push(key, entry, now + self._jittered(self.base_interval))
+                return self.base_interval
+            if is_healthy:
+                if entry.healthy_streak == 0:
+                    entry.interval = self.base_interval
+                else:
+                    entry.interval = min(
+                        entry.interval * self.backoff_factor, self.max_interval
+                    )
+                entry.healthy_streak += 1
+            else:
+                entry.healthy_streak = 0
+                entry.interval = self.failure_interval
+            self._push(key, entry, now + self._jittered(entry.interval))
+            return entry.interval
+
+    def next_due(self, vm_id: str, test_name: str) -> Optional[float]:
+        """Get the monotonic time a pair is next due"""
+        with self._lock:
+            entry = self._entries.get((vm_id, test_name))
+            return entry.due if entry is not None else None
+
+    def length(self) -> int:
+        """Get the number of scheduled pairs"""
+        with self._lock:
+            return len(self._entries)
+
+    def _push(self, key: Tuple[str, str], entry: _ScheduleEntry, due: float) -> None:
+        entry.version = next(self._versions)
+        entry.due = due
+        heapq.heappush(self._heap, (due, entry.version, key[0], key[1]))
+        # stale heap items are skipped lazily, compact once they dominate
+        if len(self._heap) > 4 * max(len(self._entries), 16):
+            self._heap = [
+                (e.due, e.version, k[0], k[1]) for k, e in self._entries.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def _spread_offset(self, key: Tuple[str, str]) -> float:
+        # stable per pair, so a fleet is spread evenly over the base interval
+        bucket = zlib.crc32(f"{key[0]}:{key[1]}".encode("utf-8")) % 1000
+        return self.base_interval * bucket / 1000
+
+    def _jittered(self, interval: float) -> float:
+        if self.jitter <= 0:
+            return interval
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
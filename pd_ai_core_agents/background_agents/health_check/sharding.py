@@ -0,0 +1,520 @@
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import bisect
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+from pd_ai_agent_core.parallels_desktop import VirtualMachine
+from pd_ai_agent_core.parallels_desktop.datasource import VirtualMachineDataSource
+from pd_ai_core_agents.background_agents.health_check.vm_health_check_test import (
+    VMHealthCheckTestResult,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RING_REPLICAS = 64
+DEFAULT_JOB_TIMEOUT = 120.0
+# probes a worker runs at the same time
+DEFAULT_WORKER_CONCURRENCY = 16
+# VMs whose test objects a worker keeps between jobs
+DEFAULT_WORKER_CACHE_SIZE = 2048
+# how often the parent checks that the workers are alive
+_MONITOR_INTERVAL = 1.0
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class ConsistentHashRing:
+    """Consistent hash ring of worker ids, each with a number of virtual nodes.
+
+    Adding or removing a worker only moves the VMs that hash next to its nodes.
+    """
+
+    def __init__(
+        self, nodes: Iterable[int] = (), replicas: int = DEFAULT_RING_REPLICAS
+    ):
+        self.replicas = replicas
+        self._hashes: List[int] = []
+        self._owners: Dict[int, int] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: int) -> None:
+        for replica in range(self.replicas):
+            node_hash = _ring_hash(f"{node}:{replica}")
+            if node_hash in self._owners:
+                continue
+            bisect.insort(self._hashes, node_hash)
+            self._owners[node_hash] = node
+
+    def remove(self, node: int) -> None:
+        kept = [h for h in self._hashes if self._owners[h] != node]
+        self._owners = {h: self._owners[h] for h in kept}
+        self._hashes = kept
+
+    def get(self, key: str) -> Optional[int]:
+        """Get the node that owns the key, None if the ring is empty"""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _ring_hash(key)) % len(self._hashes)
+        return self._owners[self._hashes[index]]
+
+    @property
+    def nodes(self) -> List[int]:
+        return sorted(set(self._owners.values()))
+
+
+class ShardVm(VirtualMachine):
+    """The part of a VirtualMachine the tests need, small enough to send to a worker"""
+
+    def __init__(self, id: str, name: str, os: str, state: str = "running"):
+        # the base constructor takes every prlctl setting of the VM
+        self.id = id
+        self.name = name
+        self.os = os
+        self.state = state
+
+    @classmethod
+    def from_vm(cls, vm: Any) -> "ShardVm":
+        return cls(vm.id, vm.name, vm.os, getattr(vm, "state", "running"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "name": self.name, "os": self.os, "state": self.state}
+
+
+class ShardVmDataSource(VirtualMachineDataSource):
+    """VirtualMachineDataSource of a worker, holding the VMs of the jobs it received.
+
+    The guest execs look the VM up in the datasource, which a worker process
+    does not share with the parent. Every job carries the current VM, so the
+    worker never lists the VMs with prlctl.
+    """
+
+    def __init__(self):
+        # the base constructor lists the VMs with prlctl
+        self._vms: Dict[str, VirtualMachine] = {}
+        self._last_update = None
+
+
+class _ProbeJob:
+    def __init__(
+        self,
+        job_id: int,
+        session_id: str,
+        vm: ShardVm,
+        test_names: Optional[List[str]],
+        host_online: bool,
+        failed_tests: List[str],
+    ):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.vm = vm
+        self.test_names = test_names
+        self.host_online = host_online
+        # from the tests of the parent, the worker tests never get a result applied
+        self.failed_tests = failed_tests
+
+
+class _InvalidateVm:
+    """Makes a worker drop what it keeps of a VM, or of every VM when vm_id is None"""
+
+    def __init__(self, vm_id: Optional[str]):
+        self.vm_id = vm_id
+
+
+def _worker_main(
+    worker_id: int,
+    jobs: "multiprocessing.Queue[Any]",
+    results: "multiprocessing.Queue[Tuple[int, int, Any, str]]",
+    concurrency: int,
+    cache_size: int,
+    composite_guest_probe: bool = True,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Tuple[Any, ...] = (),
+) -> None:
+    """Entry point of a worker process, runs the probes of the jobs it receives.
+
+    Workers only probe, the test state and the notifications stay in the parent.
+    """
+    from pd_ai_core_agents.background_agents.health_check.executors import (
+        HealthCheckExecutors,
+    )
+
+    # image analysis runs inline, the worker already is a separate process
+    HealthCheckExecutors.configure(cpu_workers=0)
+    VirtualMachineDataSource._instance = ShardVmDataSource()
+    if initializer is not None:
+        initializer(*initargs)
+    asyncio.run(
+        _worker_loop(
+            worker_id, jobs, results, concurrency, cache_size, composite_guest_probe
+        )
+    )
+
+
+async def _worker_loop(
+    worker_id: int,
+    jobs: "multiprocessing.Queue[Any]",
+    results: "multiprocessing.Queue[Tuple[int, int, Any, str]]",
+    concurrency: int,
+    cache_size: int,
+    composite_guest_probe: bool = True,
+) -> None:
+    from datetime import datetime
+    from pd_ai_core_agents.background_agents.health_check.vm_health_check import (
+        VmHealthCheck,
+    )
+    from pd_ai_core_agents.common.screen_analysis_cache import ScreenAnalysisCache
+    from pd_ai_core_agents.common.screenshot_cache import ScreenshotCache
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    datasource = VirtualMachineDataSource.get_instance()
+    health_checks: "OrderedDict[str, VmHealthCheck]" = OrderedDict()
+    running = set()
+
+    def forget(vm_id: Optional[str]) -> None:
+        ScreenshotCache.get_instance().invalidate(vm_id)
+        ScreenAnalysisCache.get_instance().invalidate(vm_id)
+        if vm_id is None:
+            datasource.clear_cache()
+            health_checks.clear()
+        else:
+            datasource.remove_vm(vm_id)
+            health_checks.pop(vm_id, None)
+
+    def get_health_check(job: _ProbeJob) -> VmHealthCheck:
+        # the VM of the job is the current one, the tests and the execs use it
+        datasource.update_vm(job.vm)
+        health_check = health_checks.get(job.vm.id)
+        if health_check is None:
+            health_check = VmHealthCheck(
+                job.vm.id,
+                datetime.now(),
+                composite_guest_probe=composite_guest_probe,
+            )
+            health_check.register_default_tests(job.session_id, job.vm)
+            health_checks[job.vm.id] = health_check
+            while len(health_checks) > cache_size:
+                health_checks.popitem(last=False)
+        else:
+            health_checks.move_to_end(job.vm.id)
+            for test in health_check.get_tests():
+                test.vm = job.vm
+        return health_check
+
+    async def run_job(job: _ProbeJob) -> None:
+        async with semaphore:
+            try:
+                health_check = get_health_check(job)
+                outcome = await health_check.probe_tests(
+                    job.test_names,
+                    host_online=job.host_online,
+                    failed_tests=job.failed_tests,
+                )
+                results.put((job.job_id, worker_id, outcome, ""))
+            except Exception as e:
+                results.put((job.job_id, worker_id, None, str(e)))
+
+    while True:
+        job = await loop.run_in_executor(None, jobs.get)
+        if job is None:
+            break
+        if isinstance(job, _InvalidateVm):
+            forget(job.vm_id)
+            continue
+        task = asyncio.create_task(run_job(job))
+        running.add(task)
+        task.add_done_callback(running.discard)
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+class _Worker:
+    def __init__(self, worker_id: int, process: Any, jobs: Any):
+        self.worker_id = worker_id
+        self.process = process
+        self.jobs = jobs
+
+
+def _settle(
+    future: "Future[Any]", result: Any = None, error: Optional[BaseException] = None
+) -> None:
+    """Set the outcome of a job, unless the caller timed out and cancelled it"""
+    if future.done():
+        return
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        # cancelled between the check and the set
+        pass
+
+
+class _PendingJob:
+    def __init__(self, job: _ProbeJob, worker_id: int):
+        self.job = job
+        self.worker_id = worker_id
+        self.future: "Future[Dict[str, VMHealthCheckTestResult]]" = Future()
+
+
+class ShardedHealthCheckEngine:
+    """Runs the health check probes of a large fleet on several worker processes.
+
+    VM ids are assigned to workers by consistent hashing, so a VM is always probed
+    by the same worker. Results come back over a multiprocessing queue and are
+    applied by the caller, in the parent process. Each job carries the current VM,
+    and invalidate() passes the VM state changes seen by the parent on to the
+    workers. When a worker dies its in flight jobs are resubmitted, and its VMs go
+    to a replacement worker, or to the remaining workers when respawn is off.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        replicas: int = DEFAULT_RING_REPLICAS,
+        job_timeout: float = DEFAULT_JOB_TIMEOUT,
+        worker_concurrency: int = DEFAULT_WORKER_CONCURRENCY,
+        worker_cache_size: int = DEFAULT_WORKER_CACHE_SIZE,
+        respawn: bool = True,
+        composite_guest_probe: bool = True,
+        worker_initializer: Optional[Callable[..., None]] = None,
+        worker_initargs: Tuple[Any, ...] = (),
+    ):
+        self.worker_count = max(1, workers)
+        self.job_timeout = job_timeout
+        self.worker_concurrency = worker_concurrency
+        self.worker_cache_size = worker_cache_size
+        self.respawn = respawn
+        self.composite_guest_probe = composite_guest_probe
+        # called in each worker before its first job, like a multiprocessing.Pool initializer
+        self.worker_initializer = worker_initializer
+        self.worker_initargs = worker_initargs
+        # spawn, forking a process that runs several threads is unsafe
+        self._context = multiprocessing.get_context("spawn")
+        self._ring = ConsistentHashRing(replicas=replicas)
+        self._workers: Dict[int, _Worker] = {}
+        self._pending: Dict[int, _PendingJob] = {}
+        self._results: Any = None
+        self._job_ids = itertools.count(1)
+        self._worker_ids = itertools.count()
+        self._lock = threading.RLock()
+        self._stopping = threading.Event()
+        self._collector: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the worker processes and the result collector"""
+        with self._lock:
+            if self._collector is not None:
+                return
+            self._stopping.clear()
+            self._results = self._context.Queue()
+            for _ in range(self.worker_count):
+                self._start_worker()
+            self._collector = threading.Thread(
+                target=self._collect, name="health-check-shards", daemon=True
+            )
+            self._collector.start()
+        logger.info(f"Started {self.worker_count} health check shard workers")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the workers, failing the jobs still in flight"""
+        with self._lock:
+            self._stopping.set()
+            workers = list(self._workers.values())
+            self._workers.clear()
+            for worker in workers:
+                self._ring.remove(worker.worker_id)
+                try:
+                    worker.jobs.put(None)
+                except Exception:
+                    pass
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for worker in workers:
+            worker.process.join(timeout=timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        for job in pending:
+            _settle(job.future, error=RuntimeError("Shard engine stopped"))
+        if self._collector is not None:
+            self._collector.join(timeout=timeout)
+            self._collector = None
+
+    def owner(self, vm_id: str) -> Optional[int]:
+        """Get the worker a VM is assigned to"""
+        with self._lock:
+            return self._ring.get(vm_id)
+
+    def assignments(self, vm_ids: Iterable[str]) -> Dict[int, List[str]]:
+        """Get the VMs assigned to each worker"""
+        assigned: Dict[int, List[str]] = {}
+        with self._lock:
+            for vm_id in vm_ids:
+                worker_id = self._ring.get(vm_id)
+                if worker_id is not None:
+                    assigned.setdefault(worker_id, []).append(vm_id)
+        return assigned
+
+    def worker_ids(self) -> List[int]:
+        with self._lock:
+            return sorted(self._workers)
+
+    async def probe(
+        self,
+        session_id: str,
+        vm: Any,
+        test_names: Optional[Iterable[str]] = None,
+        host_online: bool = True,
+        failed_tests: Optional[Iterable[str]] = None,
+    ) -> Dict[str, VMHealthCheckTestResult]:
+        """Run the probes of a VM on the worker that owns it.
+
+        failed_tests are the tests outside the run whose latest probe failed,
+        see VmHealthCheck.failed_test_names().
+        """
+        if self._collector is None:
+            self.start()
+        job = _ProbeJob(
+            next(self._job_ids),
+            session_id,
+            ShardVm.from_vm(vm),
+            list(test_names) if test_names is not None else None,
+            host_online,
+            list(failed_tests or ()),
+        )
+        pending = self._submit(job)
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(pending.future), timeout=self.job_timeout
+            )
+        finally:
+            with self._lock:
+                self._pending.pop(job.job_id, None)
+
+    def invalidate(self, vm_id: Optional[str] = None) -> None:
+        """Make the owning worker drop its screenshots, analyses and tests of a VM,
+        every worker when vm_id is None
+        """
+        with self._lock:
+            if vm_id is None:
+                workers = list(self._workers.values())
+            else:
+                worker_id = self._ring.get(vm_id)
+                workers = [self._workers[worker_id]] if worker_id is not None else []
+            for worker in workers:
+                try:
+                    worker.jobs.put(_InvalidateVm(vm_id))
+                except Exception as e:
+                    logger.error(
+                        f"Error invalidating VM {vm_id} on shard worker {worker.worker_id}: {e}"
+                    )
+
+    def _submit(self, job: _ProbeJob) -> _PendingJob:
+        with self._lock:
+            worker_id = self._ring.get(job.vm.id)
+            if worker_id is None:
+                raise RuntimeError("No health check shard worker available")
+            pending = self._pending.get(job.job_id)
+            if pending is None:
+                pending = _PendingJob(job, worker_id)
+                self._pending[job.job_id] = pending
+            pending.worker_id = worker_id
+            self._workers[worker_id].jobs.put(job)
+            return pending
+
+    def _start_worker(self, worker_id: Optional[int] = None) -> None:
+        if worker_id is None:
+            worker_id = next(self._worker_ids)
+        jobs = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                worker_id,
+                jobs,
+                self._results,
+                self.worker_concurrency,
+                self.worker_cache_size,
+                self.composite_guest_probe,
+                self.worker_initializer,
+                self.worker_initargs,
+            ),
+            name=f"health-check-shard-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._workers[worker_id] = _Worker(worker_id, process, jobs)
+        self._ring.add(worker_id)
+
+    def _collect(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                item = self._results.get(timeout=_MONITOR_INTERVAL)
+            except queue.Empty:
+                item = None
+            except (EOFError, OSError):
+                break
+            except Exception as e:
+                # e.g. a result that cannot be unpickled
+                logger.error(f"Error reading a health check shard result: {e}")
+                continue
+            # one bad result must not stop the collector, every job would time out
+            try:
+                if item is not None:
+                    self._deliver(*item)
+                self._check_workers()
+            except Exception as e:
+                logger.error(f"Error collecting the health check shard results: {e}")
+
+    def _deliver(self, job_id: int, worker_id: int, outcome: Any, error: str) -> None:
+        with self._lock:
+            pending = self._pending.get(job_id)
+        if pending is None:
+            return
+        if error:
+            _settle(
+                pending.future,
+                error=RuntimeError(f"Shard worker {worker_id} failed: {error}"),
+            )
+        else:
+            _settle(pending.future, outcome)
+
+    def _check_workers(self) -> None:
+        """Reassign the VMs and jobs of workers that died"""
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            dead = [
+                worker
+                for worker in self._workers.values()
+                if not worker.process.is_alive()
+            ]
+            for worker in dead:
+                logger.error(
+                    f"Health check shard worker {worker.worker_id} died "
+                    f"(exit code {worker.process.exitcode}), reassigning its VMs"
+                )
+                del self._workers[worker.worker_id]
+                self._ring.remove(worker.worker_id)
+                if self.respawn:
+                    # same id, the replacement takes back exactly the same VMs
+                    self._start_worker(worker.worker_id)
+            if not dead:
+                return
+            dead_ids = {worker.worker_id for worker in dead}
+            for pending in list(self._pending.values()):
+                if pending.worker_id not in dead_ids or pending.future.done():
+                    continue
+                try:
+                    self._submit(pending.job)
+                except RuntimeError as e:
+                    _settle(pending.future, error=e)
@@ -0,0 +1,178 @@
+from typing import ClassVar, Dict, FrozenSet, Iterable, List, Optional, Type
+import importlib
+import logging
+import threading
+from pd_ai_agent_core.parallels_desktop import VirtualMachine
+from pd_ai_agent_core.parallels_desktop.os import get_std_os
+from pd_ai_agent_core.services.notification_service import NotificationService
+from pd_ai_core_agents.background_agents.health_check.vm_health_check_test import (
+    VMHealthCheckTest,
+)
+from pd_ai_core_agents.common.messages import (
+    HEALTH_CHECK_TEST_DETECT_BLACK_SCREEN,
+    HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS,
+    HEALTH_CHECK_TEST_DETECT_INTERNET_CONNECTION,
+)
+
+logger = logging.getLogger(__name__)
+
+OS_FAMILY_WINDOWS = "windows"
+OS_FAMILY_MACOS = "macos"
+OS_FAMILY_LINUX = "linux"
+OS_FAMILY_OTHER = "other"
+
+LINUX_OS_NAMES = frozenset(
+    [
+        "ubuntu",
+        "debian",
+        "fedora",
+        "fedora-core",
+        "centos",
+        "redhat",
+        "rhel",
+        "opensuse",
+        "suse",
+        "kali",
+        "mint",
+        "linux",
+        "other-linux",
+    ]
+)
+
+# guests where prlctl exec works, i.e. the ones Parallels Tools support
+EXEC_OS_FAMILIES = frozenset([OS_FAMILY_WINDOWS, OS_FAMILY_MACOS, OS_FAMILY_LINUX])
+
+
+def get_os_family(os: Optional[str]) -> str:
+    """Map the guest OS of a VM to windows, macos, linux or other"""
+    if not os:
+        return OS_FAMILY_OTHER
+    std_os = get_std_os(os).lower()
+    if std_os in (OS_FAMILY_WINDOWS, OS_FAMILY_MACOS):
+        return std_os
+    if std_os.startswith("win"):
+        return OS_FAMILY_WINDOWS
+    if std_os in LINUX_OS_NAMES or "linux" in std_os:
+        return OS_FAMILY_LINUX
+    return OS_FAMILY_OTHER
+
+
+class HealthCheckTestSpec:
+    """Describes a health check test without importing it.
+
+    The test module is imported the first time a VM it applies to is registered.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        module_path: str,
+        class_name: str,
+        os_families: Optional[Iterable[str]] = None,
+    ):
+        self.name = name
+        self.module_path = module_path
+        self.class_name = class_name
+        # None applies the test to every guest OS
+        self.os_families: Optional[FrozenSet[str]] = (
+            frozenset(os_families) if os_families is not None else None
+        )
+        self._test_class: Optional[Type[VMHealthCheckTest]] = None
+
+    def applies_to(self, os_family: str) -> bool:
+        return self.os_families is None or os_family in self.os_families
+
+    def load(self) -> Type[VMHealthCheckTest]:
+        """Import the test class"""
+        if self._test_class is None:
+            module = importlib.import_module(self.module_path)
+            self._test_class = getattr(module, self.class_name)
+            logger.debug(f"Loaded health check test {self.name} from {self.module_path}")
+        return self._test_class  # type: ignore
+
+
+DEFAULT_TEST_SPECS = [
+    HealthCheckTestSpec(
+        name=HEALTH_CHECK_TEST_DETECT_BLACK_SCREEN,
+        module_path="pd_ai_core_agents.background_agents.health_check.health_checks.detect_black_screen",
+        class_name="DetectBlackScreenHealthCheckTest",
+    ),
+    HealthCheckTestSpec(
+        name=HEALTH_CHECK_TEST_DETECT_INTERNET_CONNECTION,
+        module_path="pd_ai_core_agents.background_agents.health_check.health_checks.detect_internet_connection",
+        class_name="DetectInternetConnectionHealthCheckTest",
+        os_families=EXEC_OS_FAMILIES,
+    ),
+    HealthCheckTestSpec(
+        name=HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS,
+        module_path="pd_ai_core_agents.background_agents.health_check.health_checks.detect_guest_tools",
+        class_name="DetectGuestToolsHealthCheckTest",
+        os_families=EXEC_OS_FAMILIES,
+    ),
+]
+
+
+class HealthCheckTestRegistry:
+    """Maps guest OS families to the health check tests that apply to them"""
+
+    _instance: ClassVar[Optional["HealthCheckTestRegistry"]] = None
+    _instance_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, specs: Optional[Iterable[HealthCheckTestSpec]] = None):
+        self._specs: Dict[str, HealthCheckTestSpec] = {}
+        self._by_family: Dict[str, List[HealthCheckTestSpec]] = {}
+        self._lock = threading.Lock()
+        for spec in specs if specs is not None else DEFAULT_TEST_SPECS:
+            self.register(spec)
+
+    @classmethod
+    def get_instance(cls) -> "HealthCheckTestRegistry":
+        """Get the shared test registry, with the default tests registered"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def register(self, spec: HealthCheckTestSpec) -> None:
+        with self._lock:
+            self._specs[spec.name] = spec
+            self._by_family.clear()
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._specs.pop(name, None)
+            self._by_family.clear()
+
+    def specs_for(self, os_family: str) -> List[HealthCheckTestSpec]:
+        """Get the tests that apply to an OS family"""
+        with self._lock:
+            specs = self._by_family.get(os_family)
+            if specs is None:
+                specs = [
+                    spec for spec in self._specs.values() if spec.applies_to(os_family)
+                ]
+                self._by_family[os_family] = specs
+            return specs
+
+    def create_tests(
+        self,
+        session_id: str,
+        vm: VirtualMachine,
+        notifications_service: Optional[NotificationService] = None,
+    ) -> List[VMHealthCheckTest]:
+        """Instantiate the tests that apply to the VM, sharing the service handles"""
+        tests: List[VMHealthCheckTest] = []
+        for spec in self.specs_for(get_os_family(vm.os)):
+            try:
+                test_class = spec.load()
+            except (ImportError, AttributeError) as e:
+                logger.error(f"Error loading health check test {spec.name}: {e}")
+                continue
+            tests.append(
+                test_class(
+                    session_id=session_id,
+                    vm=vm,
+                    notifications_service=notifications_service,
+                )
+            )
+        return tests
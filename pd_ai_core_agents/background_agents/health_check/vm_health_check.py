@@ -1,27 +1,47 @@
+import asyncio
+import time
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, Iterable, List, Optional
 from .vm_health_check_test import (
     VMHealthCheckTest,
+    VMGuestProbeHealthCheckTest,
+    VMHealthCheckTestResult,
 )
-from .health_checks.detect_black_screen import (
-    DetectBlackScreenHealthCheckTest,
+from .test_registry import (
+    HealthCheckTestRegistry,
 )
-from .health_checks.detect_guest_tools import (
-    DetectGuestToolsHealthCheckTest,
+from .guest_probe import (
+    CompositeGuestProbe,
 )
-from .health_checks.detect_internet_connection import (
-    DetectInternetConnectionHealthCheckTest,
+from .run_context import (
+    HealthCheckRunContext,
+)
+from .notifications import (
+    HealthCheckDigest,
 )
 from pd_ai_agent_core.parallels_desktop import VirtualMachine
+from pd_ai_agent_core.services.notification_service import NotificationService
+from pd_ai_core_agents.common.messages import HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS
 import logging
 
 logger = logging.getLogger(__name__)
 
+# test names used by earlier versions, mapped to the current ones
+LEGACY_TEST_NAMES = {
+    "Detect Guest Tools": HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS,
+}
+
 
 class VmHealthCheck:
-    def __init__(self, vm_id: str, last_update: datetime):
+    def __init__(
+        self,
+        vm_id: str,
+        last_update: datetime,
+        composite_guest_probe: bool = True,
+    ):
         self.vm_id = vm_id
         self.last_update = last_update
+        self.composite_guest_probe = composite_guest_probe
         self._is_healthy = True
         self._reason = ""
         self.tests: List[VMHealthCheckTest] = []
@@ -29,24 +49,205 @@ class VmHealthCheck:
     def register_test(self, test: VMHealthCheckTest) -> None:
         self.tests.append(test)
 
-    def register_default_tests(self, session_id: str, vm: VirtualMachine) -> None:
-        self.register_test(
-            DetectBlackScreenHealthCheckTest(session_id=session_id, vm=vm)
+    def register_default_tests(
+        self,
+        session_id: str,
+        vm: VirtualMachine,
+        notifications_service: Optional[NotificationService] = None,
+    ) -> None:
+        """Register the tests that apply to the guest OS of the VM"""
+        for test in HealthCheckTestRegistry.get_instance().create_tests(
+            session_id, vm, notifications_service
+        ):
+            self.register_test(test)
+
+    async def run_tests(
+        self,
+        test_names: Optional[Iterable[str]] = None,
+        host_online: bool = True,
+        digest: Optional[HealthCheckDigest] = None,
+    ) -> Dict[str, VMHealthCheckTestResult]:
+        """Run the enabled tests and update their state from the outcomes.
+
+        When test_names is given only those tests are run. Notifications go to
+        the digest when given.
+        """
+        results = await self.probe_tests(
+            test_names,
+            host_online=host_online,
+            failed_tests=self.failed_test_names(test_names),
         )
-        self.register_test(
-            DetectInternetConnectionHealthCheckTest(session_id=session_id, vm=vm)
+        await self.apply_results(results, digest=digest)
+        return results
+
+    def enabled_test_names(
+        self, test_names: Optional[Iterable[str]] = None
+    ) -> List[str]:
+        """Get the names of the enabled tests, limited to test_names when given"""
+        selected = set(test_names) if test_names is not None else None
+        return [
+            test.name
+            for test in self.tests
+            if not test.is_disabled() and (selected is None or test.name in selected)
+        ]
+
+    def failed_test_names(
+        self, test_names: Optional[Iterable[str]] = None
+    ) -> List[str]:
+        """Get the enabled tests outside test_names whose latest probe failed"""
+        running = set(self.enabled_test_names(test_names))
+        return [
+            test.name
+            for test in self.tests
+            if test.name not in running
+            and not test.is_disabled()
+            and test.last_probe_failed()
+        ]
+
+    async def probe_tests(
+        self,
+        test_names: Optional[Iterable[str]] = None,
+        host_online: bool = True,
+        failed_tests: Optional[Iterable[str]] = None,
+    ) -> Dict[str, VMHealthCheckTestResult]:
+        """Run the checks of the enabled tests concurrently, each bounded by its own
+        timeout, without touching the state of the tests.
+
+        Tests that cannot run in this context (e.g. internet tests while the host
+        is offline) are reported as skipped without running. Tests run after the
+        tests they depend on, and are skipped when one of those failed in this
+        run or is listed in failed_tests, see failed_test_names().
+        """
+        selected = set(test_names) if test_names is not None else None
+        tests = [
+            test
+            for test in self.tests
+            if not test.is_disabled()
+            and (selected is None or test.name in selected)
+        ]
+        context = HealthCheckRunContext(
+            host_online=host_online, failed_tests=failed_tests
         )
-        self.register_test(
-            DetectGuestToolsHealthCheckTest(session_id=session_id, vm=vm)
+        results: Dict[str, VMHealthCheckTestResult] = {}
+        waves = self._dependency_waves(self._skip_tests(tests, context, results))
+        # one exec for the whole run, the script runs the prerequisite probes first
+        context.guest_probe = self._create_guest_probe(
+            [test for wave in waves for test in wave]
         )
+        for wave in waves:
+            ready = self._skip_tests(wave, context, results)
+            outcomes = await asyncio.gather(
+                *(self._probe_test(test, context) for test in ready),
+                return_exceptions=True,
+            )
+            for test, outcome in zip(ready, outcomes):
+                if isinstance(outcome, BaseException):
+                    logger.error(f"Test {test.name} failed with error: {outcome}")
+                    context.failed_tests.add(test.name)
+                    continue
+                results[test.name] = outcome
+                if not outcome.is_healthy:
+                    context.failed_tests.add(test.name)
+        return results
+
+    def _dependency_waves(
+        self, tests: List[VMHealthCheckTest]
+    ) -> List[List[VMHealthCheckTest]]:
+        """Group the tests so each wave only depends on the tests of earlier waves"""
+        waves: List[List[VMHealthCheckTest]] = []
+        pending = tests
+        while pending:
+            pending_names = {test.name for test in pending}
+            ready = [
+                test
+                for test in pending
+                if not any(name in pending_names for name in test.depends_on)
+            ]
+            if not ready:
+                logger.warning(
+                    f"Circular dependency between the tests {sorted(pending_names)} of VM {self.vm_id}"
+                )
+                ready = pending
+            waves.append(ready)
+            pending = [test for test in pending if test not in ready]
+        return waves
 
-    async def run_tests(self) -> None:
+    def _skip_tests(
+        self,
+        tests: List[VMHealthCheckTest],
+        context: HealthCheckRunContext,
+        results: Dict[str, VMHealthCheckTestResult],
+    ) -> List[VMHealthCheckTest]:
+        """Report the tests that cannot run in the context as skipped, returns the others"""
+        runnable: List[VMHealthCheckTest] = []
+        for test in tests:
+            skip_reason = test.skip_reason(context)
+            if skip_reason is not None:
+                logger.info(f"Skipping test {test.name}: {skip_reason}")
+                results[test.name] = VMHealthCheckTestResult(
+                    True, skip_reason, skipped=True
+                )
+                continue
+            runnable.append(test)
+        return runnable
+
+    async def apply_results(
+        self,
+        results: Dict[str, VMHealthCheckTestResult],
+        digest: Optional[HealthCheckDigest] = None,
+    ) -> None:
+        """Update the tests from probe outcomes, skipped outcomes leave them unchanged"""
+        context = HealthCheckRunContext(digest=digest)
         for test in self.tests:
-            if test.is_disabled():
+            result = results.get(test.name)
+            if result is None or result.skipped or test.is_disabled():
                 continue
-            logger.info(f"Running test {test.name}")
-            result, _ = await test.run()
-            logger.info(f"Test {test.name} finished with result {result}")
+            await test.apply_result(result.is_healthy, result.reason, context)
+        self.last_update = datetime.now()
+
+    def _create_guest_probe(
+        self, tests: List[VMHealthCheckTest]
+    ) -> Optional[CompositeGuestProbe]:
+        """One guest exec for the guest side tests of a run, when more than one of them runs"""
+        if not self.composite_guest_probe:
+            return None
+        probe_tests = [
+            test for test in tests if isinstance(test, VMGuestProbeHealthCheckTest)
+        ]
+        if len(probe_tests) < 2:
+            return None
+        probe_ids = {test.name: test.guest_probe for test in probe_tests}
+        prerequisites = {
+            test.guest_probe: [
+                probe_ids[name] for name in test.depends_on if name in probe_ids
+            ]
+            for test in probe_tests
+        }
+        return CompositeGuestProbe(
+            probe_tests[0].vm,
+            [test.guest_probe for test in probe_tests],
+            prerequisites,
+        )
+
+    async def _probe_test(
+        self, test: VMHealthCheckTest, context: HealthCheckRunContext
+    ) -> VMHealthCheckTestResult:
+        logger.info(f"Running test {test.name}")
+        started = time.monotonic()
+        result, reason = await test.probe(context)
+        latency = time.monotonic() - started
+        if (
+            isinstance(test, VMGuestProbeHealthCheckTest)
+            and context.guest_probe is not None
+        ):
+            skip_reason = context.guest_probe.skip_reason(test.guest_probe)
+            if skip_reason is not None:
+                logger.info(f"Skipping test {test.name}: {skip_reason}")
+                return VMHealthCheckTestResult(
+                    True, skip_reason, latency, skipped=True
+                )
+        logger.info(f"Test {test.name} finished with result {result}")
+        return VMHealthCheckTestResult(result, reason, latency)
 
     def is_healthy(self) -> bool:
         for test in self.tests:
@@ -64,6 +265,27 @@ class VmHealthCheck:
     def get_tests(self) -> List[VMHealthCheckTest]:
         return self.tests
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the persistable state of the health check and its tests"""
+        return {
+            "vm_id": self.vm_id,
+            "last_update": self.last_update.isoformat(),
+            "tests": {test.name: test.to_dict() for test in self.tests},
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Restore the state saved by to_dict onto the registered tests"""
+        last_update = state.get("last_update")
+        if last_update:
+            self.last_update = datetime.fromisoformat(last_update)
+        tests_state = {
+            LEGACY_TEST_NAMES.get(name, name): test_state
+            for name, test_state in state.get("tests", {}).items()
+        }
+        for test in self.tests:
+            if test.name in tests_state:
+                test.restore(tests_state[test.name])
+
     def disable_test(self, test_name: str) -> None:
         for test in self.tests:
             if test.name.lower() == test_name.lower():
@@ -1,5 +1,6 @@
-from typing import Tuple
+from typing import Any, Dict, Optional, Tuple
 from abc import ABC, abstractmethod
+import asyncio
 import logging
 from pd_ai_agent_core.parallels_desktop import VirtualMachine
 from pd_ai_agent_core.services.service_registry import ServiceRegistry
@@ -9,34 +10,79 @@ from pd_ai_agent_core.common import (
     NOTIFICATION_SERVICE_NAME,
 )
 from pd_ai_agent_core.messages import Message
+from pd_ai_core_agents.background_agents.health_check.guest_probe import (
+    GuestProbeResult,
+    PREREQUISITE_FAILED_REASON,
+)
+from pd_ai_core_agents.background_agents.health_check.run_context import (
+    HealthCheckRunContext,
+)
+from pd_ai_core_agents.background_agents.health_check.notifications import (
+    HealthCheckTransition,
+)
 
 logger = logging.getLogger(__name__)
 
 FAILURE_MESSAGE = "Health check test failed"
 RECOVERY_MESSAGE = "Health check test recovered"
+TIMEOUT_REASON = "Health check test timed out"
+HOST_OFFLINE_REASON = "skipped: host offline"
+
+DEFAULT_TEST_TIMEOUT = 20.0
 
 
 class VMHealthCheckTestResult:
-    def __init__(self, is_healthy: bool, reason: str):
+    def __init__(
+        self,
+        is_healthy: bool,
+        reason: str,
+        latency: float = 0.0,
+        skipped: bool = False,
+    ):
         self.is_healthy = is_healthy
 
         self.reason = reason
+        self.latency = latency
+        self.skipped = skipped
 
 
 class VMHealthCheckTest(ABC):
+    # the test is skipped, without counting a failure, while the host is offline
+    requires_host_network: bool = False
+    # names of the tests that must pass for this one to be meaningful, the test
+    # is skipped when one of them failed its latest probe
+    depends_on: Tuple[str, ...] = ()
+
     def __init__(
-        self, session_id: str, vm: VirtualMachine, name: str, count_for_failure: int
+        self,
+        session_id: str,
+        vm: VirtualMachine,
+        name: str,
+        count_for_failure: int,
+        timeout: float = DEFAULT_TEST_TIMEOUT,
+        notifications_service: Optional[NotificationService] = None,
     ):
         self.session_id = session_id
         self.vm = vm
         self.name = name
         self.count_for_failure = count_for_failure
+        self.timeout = timeout
         self._ignore_test = False
         self._count = 0
+        # whether the user was told the test is failing, notifications are only
+        # sent on healthy <-> unhealthy transitions
+        self._notified = False
         self.reason = ""
-        self.notifications_service = ServiceRegistry.get(
-            session_id, NOTIFICATION_SERVICE_NAME, NotificationService
-        )
+        # shared by the agent, or looked up on first use
+        self._notifications_service = notifications_service
+
+    @property
+    def notifications_service(self) -> NotificationService:
+        if self._notifications_service is None:
+            self._notifications_service = ServiceRegistry.get(
+                self.session_id, NOTIFICATION_SERVICE_NAME, NotificationService
+            )
+        return self._notifications_service
 
     @abstractmethod
     async def _check_function(self) -> Tuple[bool, str]:
@@ -50,36 +96,152 @@ class VMHealthCheckTest(ABC):
     def _recovery_message(self) -> Message:
         pass
 
+    def skip_reason(self, context: Optional[HealthCheckRunContext]) -> Optional[str]:
+        """Get why the test should not run in this context, None if it should"""
+        if context is None:
+            return None
+        if self.requires_host_network and not context.host_online:
+            return HOST_OFFLINE_REASON
+        for prerequisite in self.depends_on:
+            if prerequisite in context.failed_tests:
+                return PREREQUISITE_FAILED_REASON.format(prerequisite)
+        return None
+
+    async def _probe(
+        self, context: Optional[HealthCheckRunContext] = None
+    ) -> Tuple[bool, str]:
+        return await self._check_function()
+
+    async def _timed_check(
+        self, context: Optional[HealthCheckRunContext] = None
+    ) -> Tuple[bool, str]:
+        """Run the check, a timeout counts as a failed probe"""
+        try:
+            return await asyncio.wait_for(self._probe(context), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Test {self.name} for VM {self.vm.id} timed out after {self.timeout}s"
+            )
+            return False, TIMEOUT_REASON
+
+    async def probe(
+        self, context: Optional[HealthCheckRunContext] = None
+    ) -> Tuple[bool, str]:
+        """Run the check without updating the state of the test"""
+        return await self._timed_check(context)
+
     async def check(self) -> VMHealthCheckTestResult:
-        is_healthy, reason = await self._check_function()
+        is_healthy, reason = await self._timed_check()
         return VMHealthCheckTestResult(is_healthy, reason)
 
-    async def run(self) -> Tuple[bool, str]:
-        is_healthy, reason = await self._check_function()
+    async def run(
+        self, context: Optional[HealthCheckRunContext] = None
+    ) -> Tuple[bool, str]:
+        is_healthy, reason = await self._timed_check(context)
+        return await self.apply_result(is_healthy, reason, context)
+
+    async def apply_result(
+        self,
+        is_healthy: bool,
+        reason: str,
+        context: Optional[HealthCheckRunContext] = None,
+    ) -> Tuple[bool, str]:
+        """Update the failure count and notify transitions from a check outcome"""
         self.reason = reason
         if is_healthy:
-            if self._count > 0:
-                msg = self._recovery_message()
-                logger.info(f"Sending recovery message: {msg}")
-                await self.notifications_service.send(msg)
             self._count = 0
+            if self._notified:
+                self._notified = False
+                await self._notify(self._recovery_message(), True, reason, context)
             return True, ""
         self._count += 1
-        if self._count >= self.count_for_failure:
-            msg = self._failure_message()
-            logger.info(f"Sending failure message: {msg}")
-            await self.notifications_service.send(msg)
+        if self._count >= self.count_for_failure and not self._notified:
+            self._notified = True
+            await self._notify(self._failure_message(), False, reason, context)
         return False, reason
 
+    async def _notify(
+        self,
+        msg: Message,
+        is_healthy: bool,
+        reason: str,
+        context: Optional[HealthCheckRunContext] = None,
+    ) -> None:
+        """Hand the transition to the run digest, or send it right away without one"""
+        if context is not None and context.digest is not None:
+            context.digest.add(
+                HealthCheckTransition(
+                    vm_id=self.vm.id,
+                    vm_name=self.vm.name,
+                    test_name=self.name,
+                    is_healthy=is_healthy,
+                    reason=reason,
+                    message=msg,
+                )
+            )
+            return
+        logger.info(
+            f"Sending {'recovery' if is_healthy else 'failure'} message: {msg}"
+        )
+        await self.notifications_service.send(msg)
+
     def increment_failure(self) -> None:
         self._count += 1
 
     def disable(self) -> None:
         self._ignore_test = True
         self._count = 0
+        self._notified = False
 
     def is_disabled(self) -> bool:
         return self._ignore_test
 
     def is_healthy(self) -> bool:
         return self._count < self.count_for_failure
+
+    def last_probe_failed(self) -> bool:
+        """Whether the latest applied probe failed, even if not failing enough to be unhealthy"""
+        return self._count > 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the persistable state of the test"""
+        return {
+            "count": self._count,
+            "reason": self.reason,
+            "disabled": self._ignore_test,
+            "notified": self._notified,
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Restore the state saved by to_dict"""
+        self._count = int(state.get("count", 0))
+        self.reason = state.get("reason", "")
+        self._ignore_test = bool(state.get("disabled", False))
+        # states saved before transitions were tracked notified on every failing run
+        self._notified = bool(
+            state.get("notified", self._count >= self.count_for_failure)
+        )
+
+
+class VMGuestProbeHealthCheckTest(VMHealthCheckTest):
+    """A test whose guest side check can be folded into the composite guest probe of a run"""
+
+    # id of the composite guest probe this test takes its result from
+    guest_probe: str
+
+    @abstractmethod
+    def _check_from_probe(self, result: GuestProbeResult) -> Tuple[bool, str]:
+        """Turn the composite guest probe result into the test outcome"""
+        pass
+
+    async def _probe(
+        self, context: Optional[HealthCheckRunContext] = None
+    ) -> Tuple[bool, str]:
+        if (
+            context is not None
+            and context.guest_probe is not None
+            and context.guest_probe.supports(self.guest_probe)
+        ):
+            result = await context.guest_probe.get(self.guest_probe)
+            return self._check_from_probe(result)
+        return await self._check_function()
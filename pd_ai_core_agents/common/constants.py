@@ -1 +1,3 @@
 HEALTH_CHECK_SERVICE_NAME = "health_check.service"
+HEALTH_CHECK_HOST_CHANNEL = "health_check.host"
+HEALTH_CHECK_DIGEST_CHANNEL = "health_check.digest"
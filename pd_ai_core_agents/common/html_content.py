@@ -0,0 +1,355 @@
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+import logging
+import re
+
+try:
+    import tiktoken
+
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# tokens of page content sent to the LLM
+DEFAULT_MAX_TOKENS = 12000
+# characters per token when tiktoken is not installed, about right for English
+CHARS_PER_TOKEN = 4
+TRUNCATED_MARKER = "[... content truncated ...]"
+
+# elements whose content is never part of the main content
+_SKIPPED_TAGS = {
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "canvas",
+    "iframe",
+    "object",
+    "head",
+    "nav",
+    "aside",
+    "dialog",
+    # form controls, the content of the form itself is kept
+    "button",
+    "select",
+    "textarea",
+}
+# page chrome outside the main content, inside <main> or <article> they hold its title
+_CHROME_TAGS = {"header", "footer"}
+_SKIPPED_ROLES = {
+    "navigation",
+    "banner",
+    "contentinfo",
+    "complementary",
+    "search",
+    "dialog",
+    "menu",
+    "menubar",
+}
+_MAIN_TAGS = {"main", "article"}
+# elements that start a new block of text
+_BLOCK_TAGS = {
+    "p",
+    "div",
+    "section",
+    "li",
+    "dt",
+    "dd",
+    "ul",
+    "ol",
+    "dl",
+    "table",
+    "tr",
+    "blockquote",
+    "figure",
+    "figcaption",
+    "br",
+    "hr",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "main",
+    "article",
+    "details",
+    "summary",
+}
+_VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+_HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+_WHITESPACE = re.compile(r"\s+")
+_LANGUAGE_CLASS = re.compile(r"(?:language|lang)-([\w+#.-]+)")
+
+
+@dataclass
+class _Block:
+    text: str
+    is_code: bool = False
+    in_main: bool = False
+
+
+class _MainContentParser(HTMLParser):
+    """Splits a page into text and code blocks, leaving out scripts, styles and page chrome"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[_Block] = []
+        self.has_main = False
+        self._text: List[str] = []
+        self._prefix = ""
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+        self._main_tag: Optional[str] = None
+        self._main_depth = 0
+        self._pre_depth = 0
+        self._code: List[str] = []
+        self._code_language = ""
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        attributes: Dict[str, str] = {name: value or "" for name, value in attrs}
+        if tag not in _VOID_TAGS and self._is_skipped(tag, attributes):
+            self._skip_tag = tag
+            self._skip_depth = 1
+            return
+        if self._pre_depth:
+            if tag == "pre":
+                self._pre_depth += 1
+            elif tag == "br":
+                self._code.append("\n")
+            elif tag == "code" and not self._code_language:
+                self._code_language = self._language(attributes)
+            return
+        if tag == "pre":
+            self._flush()
+            self._pre_depth = 1
+            self._code = []
+            self._code_language = self._language(attributes)
+            return
+        if self._main_tag is None and (
+            tag in _MAIN_TAGS or attributes.get("role") == "main"
+        ):
+            self._flush()
+            self._main_tag = tag
+            self._main_depth = 1
+            self.has_main = True
+        elif tag == self._main_tag:
+            self._main_depth += 1
+        if tag in _BLOCK_TAGS:
+            self._flush()
+            if tag in _HEADINGS:
+                self._prefix = "#" * _HEADINGS[tag] + " "
+            elif tag == "li":
+                self._prefix = "- "
+        elif tag == "code":
+            self._text.append(" `")
+        elif tag in ("td", "th"):
+            self._text.append(" | ")
+        elif tag == "img" and attributes.get("alt"):
+            self._text.append(f" {attributes['alt']} ")
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        # a self-closed element never opens a skipped region, e.g. <svg/>
+        if self._skip_tag is None and tag not in _VOID_TAGS and self._is_skipped(
+            tag, {name: value or "" for name, value in attrs}
+        ):
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if self._skip_depth == 0:
+                    self._skip_tag = None
+            return
+        if self._pre_depth:
+            if tag == "pre":
+                self._pre_depth -= 1
+                if self._pre_depth == 0:
+                    self._flush_code()
+            return
+        if tag == "code":
+            self._text.append("` ")
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+        if tag == self._main_tag:
+            self._main_depth -= 1
+            if self._main_depth == 0:
+                self._flush()
+                self._main_tag = None
+
+    def handle_data(self, data: str) -> None:
+        if self._skip_tag is not None:
+            return
+        if self._pre_depth:
+            self._code.append(data)
+        else:
+            self._text.append(data)
+
+    def close(self) -> None:
+        super().close()
+        if self._pre_depth:
+            self._flush_code()
+        self._flush()
+
+    def _is_skipped(self, tag: str, attributes: Dict[str, str]) -> bool:
+        if tag in _SKIPPED_TAGS:
+            return True
+        if tag in _CHROME_TAGS and self._main_tag is None:
+            return True
+        if attributes.get("role") in _SKIPPED_ROLES:
+            return True
+        return "hidden" in attributes or attributes.get("aria-hidden") == "true"
+
+    def _language(self, attributes: Dict[str, str]) -> str:
+        match = _LANGUAGE_CLASS.search(attributes.get("class", ""))
+        return match.group(1) if match else ""
+
+    def _flush(self) -> None:
+        text = _WHITESPACE.sub(" ", "".join(self._text)).strip()
+        self._text = []
+        prefix, self._prefix = self._prefix, ""
+        if text and text != "``":
+            self.blocks.append(
+                _Block(prefix + text, in_main=self._main_tag is not None)
+            )
+
+    def _flush_code(self) -> None:
+        code = "".join(self._code).strip("\n").rstrip()
+        self._code = []
+        self._pre_depth = 0
+        language, self._code_language = self._code_language, ""
+        if code.strip():
+            self.blocks.append(
+                _Block(
+                    f"```{language}\n{code}\n```",
+                    is_code=True,
+                    in_main=self._main_tag is not None,
+                )
+            )
+
+
+@dataclass
+class PageContent:
+    """The main content of a page, with the token counts of the page before and after the reduction"""
+
+    text: str
+    tokens_before: int
+    tokens_after: int
+    truncated: bool = False
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Count the tokens of a text, estimated from its length without tiktoken"""
+    if TIKTOKEN_AVAILABLE:
+        return len(_encoding(model).encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    if max_tokens <= 0:
+        return ""
+    if TIKTOKEN_AVAILABLE:
+        encoding = _encoding(model)
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    return text[: max_tokens * CHARS_PER_TOKEN]
+
+
+def extract_main_content(
+    html: str,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    model: str = "gpt-4o",
+) -> PageContent:
+    """Reduce a page to its main text and code blocks, within a token budget.
+
+    Scripts, styles, navigation, form controls, hidden elements and the page
+    header and footer are left out. When the page marks its main content with <main>, <article> or
+    role="main" only that is kept. Text blocks repeated on the page, like
+    "Copy" buttons or "Back to top" links, are kept once. Blocks are then
+    added in page order until the budget is used.
+    """
+    parser = _MainContentParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        # html.parser is lenient, but keep what was parsed if it gives up
+        logger.warning(f"Failed to parse the page, using the content parsed so far: {e}")
+
+    blocks = parser.blocks
+    if parser.has_main:
+        blocks = [block for block in blocks if block.in_main]
+
+    seen = set()
+    unique: List[_Block] = []
+    for block in blocks:
+        key = block.text if block.is_code else block.text.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(block)
+
+    marker_tokens = count_tokens(TRUNCATED_MARKER, model)
+    kept: List[str] = []
+    used = 0
+    truncated = False
+    for block in unique:
+        tokens = count_tokens(block.text, model)
+        # separators are counted as a token each
+        if used + tokens + 1 <= max_tokens:
+            kept.append(block.text)
+            used += tokens + 1
+            continue
+        remaining = max_tokens - used - marker_tokens - 4
+        if remaining > 0:
+            partial = _truncate_to_tokens(block.text, remaining, model)
+            if block.is_code:
+                partial = partial.rstrip() + "\n```"
+            kept.append(partial)
+        kept.append(TRUNCATED_MARKER)
+        truncated = True
+        break
+
+    text = "\n\n".join(kept)
+    return PageContent(
+        text=text,
+        tokens_before=count_tokens(html, model),
+        tokens_after=count_tokens(text, model),
+        truncated=truncated,
+    )
@@ -0,0 +1,229 @@
+from typing import NamedTuple, Optional, Tuple
+import base64
+import io
+import logging
+import numpy as np
+from pd_ai_agent_core.helpers.image import detect_black_screen
+
+logger = logging.getLogger(__name__)
+
+# Try to import PIL - without it we fall back to the pd_ai_agent_core detector
+try:
+    from PIL import Image
+
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+    logger.warning("PIL not available, fast black screen detection is disabled")
+
+DEFAULT_MAX_SAMPLE_SIZE = 256
+DEFAULT_HASH_SIZE = 8
+# frames whose hashes differ in at most this many bits are considered the same screen
+DEFAULT_MAX_HASH_DISTANCE = 4
+# dHash only looks at gradients, a uniform black and a uniform white frame share the
+# same hash, so the mean luminance has to match too
+DEFAULT_MAX_LUMINANCE_DELTA = 8.0
+# rows are scanned interleaved in this many passes so early passes are representative
+_SCAN_PASSES = 8
+# modes Image.reduce supports, others (P, 1, I;16, ...) are converted before reducing
+_REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "I", "F")
+
+
+def load_grayscale_sample(
+    image_data: str, max_size: int = DEFAULT_MAX_SAMPLE_SIZE
+) -> np.ndarray:
+    """
+    Decode an image into a small 8 bit luminance array.
+
+    JPEG images are decoded at reduced scale (draft mode), other formats are box
+    reduced right after decoding, so the returned array is at most about
+    max_size pixels on its longest side.
+
+    Args:
+        image_data (str): Base64 encoded image data
+        max_size (int): Longest side of the sample in pixels
+
+    Returns:
+        np.ndarray: 2D uint8 luminance array
+    """
+    image = Image.open(io.BytesIO(base64.b64decode(image_data)))
+    image.draft("L", (max_size, max_size))
+    if image.mode not in _REDUCIBLE_MODES:
+        image = image.convert("L")
+    factor = max(image.size) // max_size
+    if factor > 1:
+        image = image.reduce(factor)
+    return np.asarray(image.convert("L"))
+
+
+def black_pixel_ratio(
+    image_data: str,
+    black_threshold: int = 30,
+    max_size: int = DEFAULT_MAX_SAMPLE_SIZE,
+) -> float:
+    """
+    Get the share of pixels darker than black_threshold in a downsampled image.
+    """
+    gray = load_grayscale_sample(image_data, max_size)
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    return float(histogram[:black_threshold].sum() / gray.size)
+
+
+def is_mostly_black(
+    gray: np.ndarray,
+    black_threshold: int = 30,
+    black_percentage: float = 0.9,
+    debug: bool = False,
+) -> bool:
+    """
+    Detect if a luminance array from load_grayscale_sample is mostly black.
+
+    The luminance histogram is built pass by pass over interleaved rows, and the
+    scan stops as soon as enough non black pixels were seen to rule out a black
+    screen.
+
+    Args:
+        gray (np.ndarray): 2D uint8 luminance array
+        black_threshold (int): Pixel values below this are considered black (0-255).
+        black_percentage (float): Percentage threshold to classify as mostly black (0.0 - 1.0).
+
+    Returns:
+        bool: True if the image is mostly black, False otherwise.
+    """
+    total_pixels = gray.size
+    if total_pixels == 0:
+        return False
+    allowed_bright_pixels = total_pixels * (1 - black_percentage)
+    histogram = np.zeros(256, dtype=np.int64)
+    for offset in range(min(_SCAN_PASSES, gray.shape[0])):
+        histogram += np.bincount(gray[offset::_SCAN_PASSES].ravel(), minlength=256)
+        bright_pixels = histogram[black_threshold:].sum()
+        if bright_pixels > allowed_bright_pixels:
+            if debug:
+                logger.info(
+                    f"Not a black screen after {offset + 1}/{_SCAN_PASSES} passes, Bright Pixels: {bright_pixels}"
+                )
+            return False
+
+    black_ratio = histogram[:black_threshold].sum() / total_pixels
+    if debug:
+        logger.info(
+            f"Black Pixels: {histogram[:black_threshold].sum()}, Total Pixels: {total_pixels}, Black Ratio: {black_ratio:.2%}"
+        )
+    return bool(black_ratio >= black_percentage)
+
+
+class ImageFingerprint(NamedTuple):
+    """Perceptual fingerprint of a frame, a difference hash and its mean luminance"""
+
+    dhash: int
+    mean_luminance: float
+
+    def distance(self, other: "ImageFingerprint") -> int:
+        return bin(self.dhash ^ other.dhash).count("1")
+
+    def is_similar(
+        self,
+        other: "ImageFingerprint",
+        max_distance: int = DEFAULT_MAX_HASH_DISTANCE,
+        max_luminance_delta: float = DEFAULT_MAX_LUMINANCE_DELTA,
+    ) -> bool:
+        return (
+            self.distance(other) <= max_distance
+            and abs(self.mean_luminance - other.mean_luminance) <= max_luminance_delta
+        )
+
+
+def fingerprint_sample(
+    gray: np.ndarray, hash_size: int = DEFAULT_HASH_SIZE
+) -> ImageFingerprint:
+    """Get the fingerprint of a luminance array from load_grayscale_sample"""
+    small = np.asarray(
+        Image.fromarray(gray).resize((hash_size + 1, hash_size), Image.BILINEAR),
+        dtype=np.int16,
+    )
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    dhash = 0
+    for bit in bits:
+        dhash = (dhash << 1) | int(bit)
+    mean_luminance = float(gray.mean()) if gray.size else 0.0
+    return ImageFingerprint(dhash, mean_luminance)
+
+
+def image_fingerprint(
+    image_data: str, hash_size: int = DEFAULT_HASH_SIZE
+) -> Optional[ImageFingerprint]:
+    """
+    Get the perceptual fingerprint of an image, None if PIL is not available.
+
+    Args:
+        image_data (str): Base64 encoded image data
+        hash_size (int): Width and height of the difference hash in bits
+
+    Returns:
+        Optional[ImageFingerprint]: The fingerprint of the image
+    """
+    if not PILLOW_AVAILABLE:
+        return None
+    return fingerprint_sample(load_grayscale_sample(image_data), hash_size)
+
+
+class ImageSample(NamedTuple):
+    """A frame decoded once, its luminance array and its fingerprint"""
+
+    gray: np.ndarray
+    fingerprint: ImageFingerprint
+
+
+def sample_image(
+    image_data: str, max_size: int = DEFAULT_MAX_SAMPLE_SIZE
+) -> Optional[ImageSample]:
+    """
+    Decode an image into the sample the screen analyses work on, None if PIL is not available.
+
+    Args:
+        image_data (str): Base64 encoded image data
+        max_size (int): Longest side of the sample in pixels
+
+    Returns:
+        Optional[ImageSample]: The luminance array of the image and its fingerprint
+    """
+    if not PILLOW_AVAILABLE:
+        return None
+    gray = load_grayscale_sample(image_data, max_size)
+    return ImageSample(gray, fingerprint_sample(gray))
+
+
+def analyse_black_screen(
+    image_data: str,
+    black_threshold: int = 30,
+    black_percentage: float = 0.9,
+    max_size: int = DEFAULT_MAX_SAMPLE_SIZE,
+    sample: Optional[ImageSample] = None,
+) -> Tuple[bool, Optional[ImageFingerprint]]:
+    """
+    Detect if an image is mostly black and fingerprint it, decoding the image once.
+
+    Args:
+        sample (Optional[ImageSample]): The sample_image of the image, decoded
+            here when not given
+
+    Returns:
+        Tuple[bool, Optional[ImageFingerprint]]: Whether the image is mostly black
+        and its fingerprint, None if PIL is not available
+    """
+    if sample is None:
+        sample = sample_image(image_data, max_size)
+    if sample is None:
+        return (
+            detect_black_screen(
+                image_data,
+                black_threshold=black_threshold,
+                black_percentage=black_percentage,
+            ),
+            None,
+        )
+    if sample.gray.size == 0:
+        return False, None
+    is_black = is_mostly_black(sample.gray, black_threshold, black_percentage)
+    return is_black, sample.fingerprint
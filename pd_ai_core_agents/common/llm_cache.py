@@ -0,0 +1,266 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pd_ai_core_agents.common.llm_client import (
+    get_openai_client,
+    stream_chat_completion,
+)
+from pd_ai_core_agents.common.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 512
+# seconds a response is reused for
+DEFAULT_TTL = 6 * 60 * 60
+
+_TRAILING_SPACES = re.compile(r"[ \t]+\n")
+
+
+def _normalize_content(content: Any) -> Any:
+    if isinstance(content, str):
+        content = content.replace("\r\n", "\n")
+        return _TRAILING_SPACES.sub("\n", content).strip()
+    if isinstance(content, list):
+        return [_normalize_content(part) for part in content]
+    if isinstance(content, dict):
+        return {key: _normalize_content(value) for key, value in content.items()}
+    return content
+
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Normalize the whitespace of the messages, so cosmetic differences share a cache entry"""
+    return [_normalize_content(message) for message in messages]
+
+
+def llm_cache_key(
+    model: str, messages: List[Dict[str, Any]], **params: Any
+) -> str:
+    """Get the cache key of a chat completion request"""
+    payload = json.dumps(
+        {"model": model, "messages": normalize_messages(messages), "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _SqliteResponseStore:
+    """SQLite persistence of the cached responses, in WAL mode"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )"""
+        )
+
+    def load(self, limit: int) -> List[Tuple[str, str, float]]:
+        """Load the most recent unexpired responses, oldest first"""
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM llm_responses WHERE expires_at <= ?", (time.time(),)
+            )
+            rows = self._connection.execute(
+                "SELECT key, response, expires_at FROM llm_responses ORDER BY expires_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return list(reversed(rows))
+
+    def save(self, key: str, response: str, expires_at: float) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response, expires_at),
+            )
+
+    def delete(self, keys: List[str]) -> None:
+        if not keys:
+            return
+        with self._lock:
+            self._connection.executemany(
+                "DELETE FROM llm_responses WHERE key = ?", [(key,) for key in keys]
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM llm_responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class LlmResponseCache:
+    """LRU cache of LLM responses with a TTL, keyed on the model and the normalized messages.
+
+    Concurrent identical requests share a single upstream call. With a path the
+    responses are also kept in SQLite, so they survive a restart.
+    """
+
+    _instance: ClassVar[Optional["LlmResponseCache"]] = None
+    _instance_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        path: Optional[str | Path] = None,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        # key -> (response, wall clock expiry), oldest use first
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._single_flight: SingleFlight[Optional[str]] = SingleFlight()
+        self._store = _SqliteResponseStore(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        if self._store is not None:
+            for key, response, expires_at in self._store.load(self.max_entries):
+                self._entries[key] = (response, expires_at)
+
+    @classmethod
+    def get_instance(cls) -> "LlmResponseCache":
+        """Get the shared response cache, in memory unless configured with a path"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def configure(cls, **kwargs: Any) -> "LlmResponseCache":
+        """Replace the shared response cache with new settings"""
+        with cls._instance_lock:
+            previous = cls._instance
+            cls._instance = cls(**kwargs)
+        if previous is not None:
+            previous.close()
+        return cls._instance
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response, None if missing or expired"""
+        expired = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                del self._entries[key]
+                expired = True
+        if expired and self._store is not None:
+            self._store.delete([key])
+        return None
+
+    def put(self, key: str, response: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._entries[key] = (response, expires_at)
+            self._entries.move_to_end(key)
+            evicted: List[str] = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+        if self._store is not None:
+            self._store.save(key, response, expires_at)
+            self._store.delete(evicted)
+
+    def get_or_create(
+        self,
+        key: str,
+        create: Callable[[], Optional[str]],
+        ttl: Optional[float] = None,
+    ) -> Optional[str]:
+        """Get the cached response, or create it once for every concurrent caller.
+
+        A None response (a failed call) is returned but not cached.
+        """
+        response = self.get(key)
+        if response is not None:
+            with self._lock:
+                self.hits += 1
+            return response
+
+        def create_and_store() -> Optional[str]:
+            # a call that finished just before this one may have stored it
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            with self._lock:
+                self.misses += 1
+            created = create()
+            if created is not None:
+                self.put(key, created, ttl)
+            return created
+
+        return self._single_flight.do(key, create_and_store)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop a cached response, or every response when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        if self._store is not None:
+            if key is None:
+                self._store.clear()
+            else:
+                self._store.delete([key])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def close(self) -> None:
+        if self._store is not None:
+            self._store.close()
+
+
+def cached_chat_completion(
+    model: str,
+    messages: List[Dict[str, Any]],
+    ttl: Optional[float] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> Optional[str]:
+    """Get the content of a chat completion, reusing the cached response of an identical request.
+
+    With on_delta the completion is streamed and on_delta gets each piece as it
+    arrives. A cached response, or one streamed for another caller, is passed
+    to on_delta whole.
+    """
+    streamed = False
+
+    def create() -> Optional[str]:
+        nonlocal streamed
+        if on_delta is not None:
+            streamed = True
+            return stream_chat_completion(model, messages, on_delta)
+        response = get_openai_client().chat.completions.create(
+            model=model, messages=messages  # type: ignore
+        )
+        return response.choices[0].message.content
+
+    response = LlmResponseCache.get_instance().get_or_create(
+        llm_cache_key(model, messages), create, ttl
+    )
+    if on_delta is not None and not streamed and response is not None:
+        on_delta(response)
+    return response
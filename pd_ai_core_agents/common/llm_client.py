@@ -0,0 +1,170 @@
+from types import ModuleType
+from typing import Any, Callable, ClassVar, Dict, List, Optional
+import importlib
+import logging
+import threading
+import openai
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 16
+# idle connections are kept open this many seconds
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_MAX_RETRIES = 2
+# HTTP libraries the OpenAI SDK has been built on, newest first
+_HTTP_LIBRARIES = ("httpx2", "httpx")
+
+
+class LlmClientProvider:
+    """Process-wide OpenAI client, so every LLM call reuses the same connection pool.
+
+    The client is shared by every thread. configure() replaces it, e.g. to
+    point it at a local stand-in server with base_url.
+    """
+
+    _instance: ClassVar[Optional["LlmClientProvider"]] = None
+    _instance_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+    ):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.max_retries = max_retries
+        self._client: Optional[openai.OpenAI] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "LlmClientProvider":
+        """Get the shared client provider, with the default settings if not configured"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def configure(cls, **kwargs: Any) -> "LlmClientProvider":
+        """Replace the shared provider with new settings, closing the previous client"""
+        with cls._instance_lock:
+            previous = cls._instance
+            cls._instance = cls(**kwargs)
+        if previous is not None:
+            previous.close()
+        return cls._instance
+
+    def client(self) -> openai.OpenAI:
+        """Get the shared client"""
+        with self._lock:
+            if self._client is None:
+                self._client = openai.OpenAI(
+                    http_client=self._http_client(),  # type: ignore
+                    **self._client_kwargs(),
+                )
+            return self._client
+
+    def close(self) -> None:
+        """Close the shared client"""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            try:
+                client.close()
+            except Exception as e:
+                logger.error(f"Error closing the OpenAI client: {e}")
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {
+            "timeout": openai.Timeout(self.timeout, connect=self.connect_timeout),
+            "max_retries": self.max_retries,
+        }
+        # unset, the client reads OPENAI_BASE_URL and OPENAI_API_KEY
+        if self.base_url is not None:
+            kwargs["base_url"] = self.base_url
+        if self.api_key is not None:
+            kwargs["api_key"] = self.api_key
+        return kwargs
+
+    def _http_client(self) -> Optional[Any]:
+        """HTTP client with the tuned pool, None keeps the OpenAI default pool.
+
+        The timeout and retries are also set on the OpenAI client itself, so
+        they apply even when the pool cannot be tuned.
+        """
+        client_class = getattr(openai, "DefaultHttpxClient", None)
+        # missing on old OpenAI versions
+        if client_class is None:
+            return None
+        library = _http_library(client_class)
+        if library is None:
+            logger.warning(
+                f"Unknown HTTP client {client_class.__mro__}, "
+                "keeping the default OpenAI connection pool"
+            )
+            return None
+        return client_class(
+            limits=library.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=library.Timeout(self.timeout, connect=self.connect_timeout),
+        )
+
+
+def _http_library(client_class: type) -> Optional[ModuleType]:
+    """The HTTP library the SDK client class is built on, None if unknown"""
+    for name in _HTTP_LIBRARIES:
+        try:
+            library = importlib.import_module(name)
+        except ImportError:
+            continue
+        if issubclass(client_class, library.Client):
+            return library
+    return None
+
+def get_openai_client() -> openai.OpenAI:
+    """Get the process-wide OpenAI client"""
+    return LlmClientProvider.get_instance().client()
+
+
+def stream_chat_completion(
+    model: str,
+    messages: List[Dict[str, Any]],
+    on_delta: Callable[[str], None],
+) -> Optional[str]:
+    """Stream a chat completion, calling on_delta with each piece of content as it arrives.
+
+    Returns the whole content, None if the model sent none.
+    """
+    stream = get_openai_client().chat.completions.create(
+        model=model, messages=messages, stream=True  # type: ignore
+    )
+    parts: List[str] = []
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            on_delta(delta)
+    finally:
+        stream.close()
+    return "".join(parts) if parts else None
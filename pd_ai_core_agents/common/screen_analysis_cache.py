@@ -0,0 +1,120 @@
+from typing import Any, ClassVar, Dict, Optional, Tuple
+import hashlib
+import logging
+import threading
+import time
+from pd_ai_core_agents.common.image import (
+    ImageFingerprint,
+    DEFAULT_MAX_HASH_DISTANCE,
+    DEFAULT_MAX_LUMINANCE_DELTA,
+)
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_BLACK_SCREEN = "black_screen"
+ANALYSIS_OCR = "ocr"
+
+# even an unchanged screen is analysed again after this many seconds
+DEFAULT_MAX_ANALYSIS_AGE = 600.0
+
+
+def frame_digest(image_data: str) -> str:
+    """Get a digest of the encoded frame, identical frames have identical digests"""
+    return hashlib.blake2b(image_data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _Analysis:
+    def __init__(
+        self,
+        digest: str,
+        fingerprint: Optional[ImageFingerprint],
+        result: Any,
+    ):
+        self.digest = digest
+        self.fingerprint = fingerprint
+        self.result = result
+        self.analysed_at = time.monotonic()
+
+
+class ScreenAnalysisCache:
+    """Keeps the last analysis of each kind done on the screen of a VM.
+
+    An analysis is reused when a new frame is byte identical to the analysed one,
+    or, if the caller has its fingerprint, when the two frames are perceptually
+    similar. That lets the black screen check, OCR and the LLM skip frames where
+    nothing changed on screen.
+    """
+
+    _instance: ClassVar[Optional["ScreenAnalysisCache"]] = None
+    _instance_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(
+        self,
+        max_distance: int = DEFAULT_MAX_HASH_DISTANCE,
+        max_luminance_delta: float = DEFAULT_MAX_LUMINANCE_DELTA,
+        max_age: float = DEFAULT_MAX_ANALYSIS_AGE,
+    ):
+        self.max_distance = max_distance
+        self.max_luminance_delta = max_luminance_delta
+        self.max_age = max_age
+        self._analyses: Dict[Tuple[str, str], _Analysis] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "ScreenAnalysisCache":
+        """Get the shared screen analysis cache"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def find(
+        self,
+        vm_id: str,
+        kind: str,
+        digest: str,
+        fingerprint: Optional[ImageFingerprint] = None,
+    ) -> Optional[Any]:
+        """Get the analysis of a previous frame that matches this one, None if there is none"""
+        with self._lock:
+            analysis = self._analyses.get((vm_id, kind))
+            if analysis is None:
+                return None
+            if time.monotonic() - analysis.analysed_at > self.max_age:
+                del self._analyses[(vm_id, kind)]
+                return None
+            if analysis.digest == digest:
+                return analysis.result
+            if (
+                fingerprint is not None
+                and analysis.fingerprint is not None
+                and fingerprint.is_similar(
+                    analysis.fingerprint, self.max_distance, self.max_luminance_delta
+                )
+            ):
+                logger.debug(
+                    f"Reusing the {kind} analysis of VM {vm_id}, screen is unchanged"
+                )
+                return analysis.result
+            return None
+
+    def store(
+        self,
+        vm_id: str,
+        kind: str,
+        digest: str,
+        fingerprint: Optional[ImageFingerprint],
+        result: Any,
+    ) -> None:
+        """Remember the analysis of a frame"""
+        with self._lock:
+            self._analyses[(vm_id, kind)] = _Analysis(digest, fingerprint, result)
+
+    def invalidate(self, vm_id: Optional[str] = None) -> None:
+        """Forget the analyses of a VM, or of every VM if vm_id is None"""
+        with self._lock:
+            if vm_id is None:
+                self._analyses.clear()
+                return
+            for key in [key for key in self._analyses if key[0] == vm_id]:
+                del self._analyses[key]
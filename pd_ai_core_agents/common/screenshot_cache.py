@@ -0,0 +1,94 @@
+from typing import ClassVar, Dict, Optional, Tuple
+import logging
+import threading
+import time
+from pd_ai_agent_core.parallels_desktop.get_vm_screenshot import get_vm_screenshot
+from pd_ai_agent_core.parallels_desktop.models.get_vm_screenshot_result import (
+    GetVmScreenshotResult,
+)
+from pd_ai_core_agents.common.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCREENSHOT_TTL = 5.0
+
+
+class ScreenshotCache:
+    """Process-wide cache of VM screenshots, keyed by vm_id.
+
+    Screenshots are kept for a short TTL and concurrent requests for the same VM
+    share a single capture, so the health check tests and the LLM agents do not
+    capture the same screen several times in a row. Failed captures are not
+    cached. The cache is invalidated on VM state changes.
+    """
+
+    _instance: ClassVar[Optional["ScreenshotCache"]] = None
+    _instance_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, ttl: float = DEFAULT_SCREENSHOT_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, GetVmScreenshotResult]] = {}
+        # bumped on invalidation so an in flight capture does not repopulate the cache
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self._single_flight: SingleFlight[GetVmScreenshotResult] = SingleFlight()
+
+    @classmethod
+    def get_instance(cls) -> "ScreenshotCache":
+        """Get the shared screenshot cache"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def get(self, vm_id: str, max_age: Optional[float] = None) -> GetVmScreenshotResult:
+        """Get a screenshot of the VM, capturing it if there is no fresh one"""
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            entry = self._entries.get(vm_id)
+            if entry is not None and time.monotonic() - entry[0] <= max_age:
+                return entry[1]
+            generation = self._generation(vm_id)
+        # keyed by generation, callers arriving after an invalidation get a new capture
+        return self._single_flight.do(
+            (vm_id, generation), lambda: self._capture(vm_id, generation)
+        )
+
+    def invalidate(self, vm_id: Optional[str] = None) -> None:
+        """Drop the cached screenshot of a VM, or of every VM if vm_id is None"""
+        with self._lock:
+            if vm_id is None:
+                self._epoch += 1
+                self._generations.clear()
+                self._entries.clear()
+            else:
+                self._generations[vm_id] = self._generations.get(vm_id, 0) + 1
+                self._entries.pop(vm_id, None)
+
+    def _generation(self, vm_id: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(vm_id, 0)
+
+    def _capture(
+        self, vm_id: str, generation: Tuple[int, int]
+    ) -> GetVmScreenshotResult:
+        result = get_vm_screenshot(vm_id)
+        if not result.success or result.screenshot is None:
+            return result
+        with self._lock:
+            if self._generation(vm_id) == generation:
+                self._entries[vm_id] = (time.monotonic(), result)
+            else:
+                logger.debug(
+                    f"Screenshot cache for VM {vm_id} invalidated during capture"
+                )
+        return result
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def get_cached_vm_screenshot(vm_id: str) -> GetVmScreenshotResult:
+    """Get a screenshot of the VM through the shared screenshot cache"""
+    return ScreenshotCache.get_instance().get(vm_id)
@@ -0,0 +1,61 @@
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+import threading
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[T]):
+    """Collapses concurrent calls that share a key into a single call.
+
+    The first caller for a key runs the function, callers arriving while it runs
+    wait for it and get the same result (or exception). It is thread based, so it
+    works across the thread pools and event loops the agents run on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call[T]] = {}
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result  # type: ignore
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def single_flight_key(*parts: Any) -> Hashable:
+    """Build a hashable key from the call arguments"""
+    return tuple(parts)
@@ -0,0 +1,247 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, ClassVar, List, Optional, Tuple
+import logging
+import sqlite3
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from pd_ai_core_agents.common.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 20.0
+DEFAULT_POOL_CONNECTIONS = 8
+DEFAULT_POOL_MAXSIZE = 16
+DEFAULT_MAX_RETRIES = 3
+# seconds, doubled on each retry
+DEFAULT_RETRY_BACKOFF = 0.5
+DEFAULT_MAX_ENTRIES = 256
+# pages larger than this are fetched but not cached
+DEFAULT_MAX_CACHED_BYTES = 5 * 1024 * 1024
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+USER_AGENT = "pd-ai-core-agents/webpage-fetcher"
+
+
+@dataclass
+class CachedPage:
+    url: str
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+class _SqlitePageStore:
+    """SQLite persistence of the cached pages, in WAL mode"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS web_pages (
+                url TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            )"""
+        )
+
+    def load(self, limit: int) -> List[CachedPage]:
+        """Load the most recently fetched pages, oldest first"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT url, text, etag, last_modified, fetched_at FROM web_pages ORDER BY fetched_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [CachedPage(*row) for row in reversed(rows)]
+
+    def save(self, page: CachedPage) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO web_pages (url, text, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (page.url, page.text, page.etag, page.last_modified, page.fetched_at),
+            )
+
+    def delete(self, urls: List[str]) -> None:
+        if not urls:
+            return
+        with self._lock:
+            self._connection.executemany(
+                "DELETE FROM web_pages WHERE url = ?", [(url,) for url in urls]
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM web_pages")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class WebpageFetcher:
+    """Fetches webpages over a pooled session, revalidating cached pages.
+
+    Connections are reused across fetches, connection errors and 429/5xx
+    responses are retried with back-off, and every request has a connect and a
+    read timeout. A page served with an ETag or Last-Modified header is cached,
+    and fetched again with If-None-Match / If-Modified-Since, so an unchanged
+    page costs a 304 without a body. With a path the cache is also kept in
+    SQLite, so it survives a restart.
+    """
+
+    _instance: ClassVar[Optional["WebpageFetcher"]] = None
+    _instance_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(
+        self,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_cached_bytes: int = DEFAULT_MAX_CACHED_BYTES,
+        path: Optional[str | Path] = None,
+    ):
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.max_entries = max(1, max_entries)
+        self.max_cached_bytes = max_cached_bytes
+        self._session = requests.Session()
+        self._session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(
+                total=max_retries,
+                backoff_factor=retry_backoff,
+                status_forcelist=RETRY_STATUS_CODES,
+                allowed_methods=frozenset({"GET", "HEAD"}),
+                respect_retry_after_header=True,
+                # the last response is returned, raise_for_status reports it
+                raise_on_status=False,
+            ),
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        # url -> page, oldest use first
+        self._pages: "OrderedDict[str, CachedPage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._single_flight: SingleFlight[str] = SingleFlight()
+        self._store = _SqlitePageStore(path) if path else None
+        self.fetches = 0
+        self.revalidated = 0
+        if self._store is not None:
+            for page in self._store.load(self.max_entries):
+                self._pages[page.url] = page
+
+    @classmethod
+    def get_instance(cls) -> "WebpageFetcher":
+        """Get the shared fetcher, caching in memory unless configured with a path"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def configure(cls, **kwargs: Any) -> "WebpageFetcher":
+        """Replace the shared fetcher with new settings, closing the previous one"""
+        with cls._instance_lock:
+            previous = cls._instance
+            cls._instance = cls(**kwargs)
+        if previous is not None:
+            previous.close()
+        return cls._instance
+
+    def fetch(self, url: str) -> str:
+        """Get the text of a page, raising requests exceptions on failure.
+
+        Concurrent fetches of the same url share one request.
+        """
+        return self._single_flight.do(url, lambda: self._fetch(url))
+
+    def _fetch(self, url: str) -> str:
+        with self._lock:
+            cached = self._pages.get(url)
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        response = self._session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached is not None:
+            response.close()
+            with self._lock:
+                self.revalidated += 1
+                if url in self._pages:
+                    self._pages.move_to_end(url)
+            logger.debug(f"Webpage {url} not modified, using the cached copy")
+            return cached.text
+
+        response.raise_for_status()
+        text = response.text
+        with self._lock:
+            self.fetches += 1
+        self._store_page(url, response, text)
+        return text
+
+    def _store_page(self, url: str, response: requests.Response, text: str) -> None:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        cacheable = (
+            (etag or last_modified)
+            and "no-store" not in cache_control
+            and len(response.content) <= self.max_cached_bytes
+        )
+        if not cacheable:
+            # a stale copy must not be served for a page that can no longer be revalidated
+            self.invalidate(url)
+            return
+        page = CachedPage(url, text, etag, last_modified, time.time())
+        with self._lock:
+            self._pages[url] = page
+            self._pages.move_to_end(url)
+            evicted: List[str] = []
+            while len(self._pages) > self.max_entries:
+                evicted.append(self._pages.popitem(last=False)[0])
+        if self._store is not None:
+            self._store.save(page)
+            self._store.delete(evicted)
+
+    def invalidate(self, url: Optional[str] = None) -> None:
+        """Drop a cached page, or every page when url is None"""
+        with self._lock:
+            if url is None:
+                self._pages.clear()
+            else:
+                self._pages.pop(url, None)
+        if self._store is not None:
+            if url is None:
+                self._store.clear()
+            else:
+                self._store.delete([url])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pages)
+
+    def close(self) -> None:
+        self._session.close()
+        if self._store is not None:
+            self._store.close()
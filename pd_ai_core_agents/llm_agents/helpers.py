@@ -1,3 +1,8 @@
+from typing import List
+import logging
+import threading
+import time
+import uuid
 from pd_ai_agent_core.services.service_registry import ServiceRegistry
 from pd_ai_agent_core.services.notification_service import NotificationService
 from pd_ai_agent_core.services.vm_datasource_service import VmDatasourceService
@@ -7,12 +12,22 @@ from pd_ai_agent_core.common import (
 )
 from pd_ai_agent_core.messages import (
     create_clean_agent_function_call_chat_message,
+    create_stream_chat_message,
 )
 from pd_ai_agent_core.core_types.llm_chat_ai_agent import (
     LlmChatAgentResponse,
 )
 from pd_ai_agent_core.parallels_desktop.models.virtual_machine import VirtualMachine
 
+logger = logging.getLogger(__name__)
+
+# seconds streamed pieces are gathered for before they are sent as one message
+DEFAULT_STREAM_FLUSH_INTERVAL = 0.1
+# returned to the agent instead of a response the user has already seen
+STREAMED_RESPONSE_MESSAGE = (
+    "The response was shown to the user as it was generated, do not repeat it"
+)
+
 
 def get_vm_details(
     session_context: dict, context_variables: dict, vm_id: str
@@ -55,3 +70,83 @@ def get_vm_details(
             message="No vm details provided",
         )
     return vm_details, None
+
+
+class ChatStreamForwarder:
+    """Forwards a streamed LLM response to the chat as partial messages.
+
+    Call it with each piece of the response as it arrives. The first piece is
+    sent at once, later ones are gathered for flush_interval seconds so a fast
+    stream is not sent token by token. finish() sends what is left and marks
+    the stream complete. Every piece is sent under the same message id, so the
+    chat appends them to a single message.
+
+    Once a response was streamed the user has seen it, so the tool returns
+    result_message() to the agent rather than the response, which the agent
+    would otherwise show again.
+    """
+
+    def __init__(
+        self,
+        session_context: dict,
+        sender: str,
+        flush_interval: float = DEFAULT_STREAM_FLUSH_INTERVAL,
+    ):
+        self._session_context = session_context
+        self._sender = sender
+        self.flush_interval = flush_interval
+        self._ns = ServiceRegistry.get(
+            session_context["session_id"],
+            NOTIFICATION_SERVICE_NAME,
+            NotificationService,
+        )
+        self._pending: List[str] = []
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self.message_id = str(uuid.uuid4())
+        self.sent = False
+
+    def __call__(self, delta: str) -> None:
+        with self._lock:
+            self._pending.append(delta)
+            now = time.monotonic()
+            if self.sent and now - self._last_flush < self.flush_interval:
+                return
+            content = "".join(self._pending)
+            self._pending.clear()
+            self._last_flush = now
+            self.sent = True
+        self._send(content, is_complete=False)
+
+    def finish(self) -> None:
+        """Send the rest of the response, nothing if no piece was received"""
+        with self._lock:
+            if not self.sent and not self._pending:
+                return
+            content = "".join(self._pending)
+            self._pending.clear()
+            self.sent = True
+        self._send(content, is_complete=True)
+
+    def result_message(self, response: str) -> str:
+        """Get the message a tool returns for the response, the response itself unless it was streamed"""
+        with self._lock:
+            return STREAMED_RESPONSE_MESSAGE if self.sent else response
+
+    def _send(self, content: str, is_complete: bool) -> None:
+        try:
+            msg = create_stream_chat_message(
+                session_id=self._session_context["session_id"],
+                channel=self._session_context["channel"],
+                sender=self._sender,
+                role="assistant",
+                content=content,
+                is_complete=is_complete,
+                linked_message_id=self._session_context["linked_message_id"],
+                is_partial=self._session_context["is_partial"],
+            )
+            msg.message_id = self.message_id
+            self._ns.send_sync(msg)
+        except Exception as e:
+            # the whole response is still returned to the agent
+            logger.error(f"Failed to forward the streamed response: {e}")
@@ -15,18 +15,25 @@ from pd_ai_agent_core.messages import (
     create_agent_function_call_chat_message,
     create_clean_agent_function_call_chat_message,
 )
+from typing import Callable, Optional
 import logging
 from pd_ai_agent_core.helpers import (
     get_context_variable,
 )
-from pd_ai_agent_core.parallels_desktop.get_vm_screenshot import get_vm_screenshot
+from pd_ai_core_agents.common.screenshot_cache import get_cached_vm_screenshot
+from pd_ai_core_agents.common.screen_analysis_cache import (
+    ANALYSIS_OCR,
+    ScreenAnalysisCache,
+    frame_digest,
+)
 from pd_ai_agent_core.common import (
     NOTIFICATION_SERVICE_NAME,
     LOGGER_SERVICE_NAME,
     VM_DATASOURCE_SERVICE_NAME,
     OCR_SERVICE_NAME,
 )
-import openai
+from pd_ai_core_agents.common.llm_cache import cached_chat_completion
+from pd_ai_core_agents.llm_agents.helpers import ChatStreamForwarder
 
 
 logger = logging.getLogger(__name__)
@@ -85,10 +92,14 @@ class ScreenshotOcrAgent(LlmChatAgent):
             transfer_instructions=SCREENSHOT_OCR_TRANSFER_INSTRUCTIONS,
         )
 
-    def analyse_screenshot_with_llm(self, os: str, ocr_text: str):
+    def analyse_screenshot_with_llm(
+        self,
+        os: str,
+        ocr_text: str,
+        on_delta: Optional[Callable[[str], None]] = None,
+    ):
         try:
-            client = openai.OpenAI()
-            response = client.chat.completions.create(
+            return cached_chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -100,8 +111,8 @@ class ScreenshotOcrAgent(LlmChatAgent):
                         "content": f"OS Version: {os}",
                     },
                 ],
+                on_delta=on_delta,
             )
-            return response.choices[0].message.content
         except Exception as e:
             print(f"Error using OpenAI API: {e}")
             return None
@@ -161,7 +172,7 @@ class ScreenshotOcrAgent(LlmChatAgent):
                     status="error",
                     message="No OS provided",
                 )
-            screenshot = get_vm_screenshot(vm_id)
+            screenshot = get_cached_vm_screenshot(vm_id)
             if not screenshot.success:
                 ns.send_sync(
                     create_clean_agent_function_call_chat_message(
@@ -188,6 +199,32 @@ class ScreenshotOcrAgent(LlmChatAgent):
                     status="error",
                     message="No screenshot provided",
                 )
+            attachment = AttachmentContextVariable(
+                name="Screenshot.png",
+                id="screenshot",
+                type=AttachmentType.IMAGE,
+                value=screenshot.screenshot,
+            )
+            analysis_cache = ScreenAnalysisCache.get_instance()
+            digest = frame_digest(screenshot.screenshot)
+            # exact frames only, a few changed pixels can be new text on screen
+            analysis = analysis_cache.find(vm_id, ANALYSIS_OCR, digest)
+            if analysis:
+                # the screen did not change since the last analysis, skip OCR and the LLM
+                ns.send_sync(
+                    create_clean_agent_function_call_chat_message(
+                        session_id=session_context["session_id"],
+                        channel=session_context["channel"],
+                        linked_message_id=session_context["linked_message_id"],
+                        is_partial=session_context["is_partial"],
+                    )
+                )
+                return LlmChatAgentResponse(
+                    status="success",
+                    message=analysis,
+                    actions=[],
+                    attachments=[attachment],
+                )
             ns.send_sync(
                 create_agent_function_call_chat_message(
                     session_id=session_context["session_id"],
@@ -249,24 +286,22 @@ class ScreenshotOcrAgent(LlmChatAgent):
                     is_partial=session_context["is_partial"],
                 )
             )
+            stream = ChatStreamForwarder(session_context, self.name)
             analysis = self.analyse_screenshot_with_llm(
-                os, "\n".join(ocr_result.strings)
+                os, "\n".join(ocr_result.strings), on_delta=stream
             )
+            stream.finish()
             if not analysis:
                 return LlmChatAgentResponse(
                     status="error",
                     message="No screenshot analysis provided",
                 )
 
-            attachment = AttachmentContextVariable(
-                name="Screenshot.png",
-                id="screenshot",
-                type=AttachmentType.IMAGE,
-                value=screenshot.screenshot,
-            )
+            analysis_cache.store(vm_id, ANALYSIS_OCR, digest, None, analysis)
             return LlmChatAgentResponse(
                 status="success",
-                message=analysis,
+                message=stream.result_message(analysis),
+                data={"analysis": analysis},
                 actions=[],
                 attachments=[attachment],
             )
@@ -14,6 +14,7 @@ from pd_ai_agent_core.messages import (
     create_clean_agent_function_call_chat_message,
 )
 import json
+from typing import Callable, Optional
 import logging
 from pd_ai_agent_core.parallels_desktop.get_vms import get_vm
 from pd_ai_agent_core.parallels_desktop.execute_on_vm import execute_on_vm
@@ -25,7 +26,8 @@ from pd_ai_agent_core.common import (
     LOGGER_SERVICE_NAME,
     VM_DATASOURCE_SERVICE_NAME,
 )
-import openai
+from pd_ai_core_agents.common.llm_cache import cached_chat_completion
+from pd_ai_core_agents.llm_agents.helpers import ChatStreamForwarder
 
 logger = logging.getLogger(__name__)
 
@@ -77,10 +79,11 @@ class TechSupportAgent(LlmChatAgent):
             transfer_instructions=TECH_SUPPORT_TRANSFER_INSTRUCTIONS,
         )
 
-    def analyse_support_with_llm(self, os: str):
+    def analyse_support_with_llm(
+        self, os: str, on_delta: Optional[Callable[[str], None]] = None
+    ):
         try:
-            client = openai.OpenAI()
-            response = client.chat.completions.create(
+            return cached_chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -92,8 +95,8 @@ class TechSupportAgent(LlmChatAgent):
                         "content": f"OS Version: {os}",
                     },
                 ],
+                on_delta=on_delta,
             )
-            return response.choices[0].message.content
         except Exception as e:
             print(f"Error using OpenAI API: {e}")
             return None
@@ -151,7 +154,9 @@ class TechSupportAgent(LlmChatAgent):
                     status="error",
                     message="No OS provided",
                 )
-            analysis = self.analyse_support_with_llm(os)
+            stream = ChatStreamForwarder(session_context, self.name)
+            analysis = self.analyse_support_with_llm(os, on_delta=stream)
+            stream.finish()
             if not analysis:
                 return LlmChatAgentResponse(
                     status="error",
@@ -165,7 +170,11 @@ class TechSupportAgent(LlmChatAgent):
                     is_partial=session_context["is_partial"],
                 )
             )
-            return LlmChatAgentResponse(status="success", message=analysis)
+            return LlmChatAgentResponse(
+                status="success",
+                message=stream.result_message(analysis),
+                data={"analysis": analysis},
+            )
         except Exception as e:
             ns.send_sync(
                 create_clean_agent_function_call_chat_message(
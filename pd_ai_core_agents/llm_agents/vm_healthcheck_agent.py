@@ -8,17 +8,22 @@ from pd_ai_agent_core.services.notification_service import NotificationService
 from pd_ai_agent_core.services.log_service import LogService
 from pd_ai_agent_core.messages import create_agent_function_call_chat_message
 import logging
-from pd_ai_agent_core.parallels_desktop.get_vm_screenshot import get_vm_screenshot
+from pd_ai_core_agents.common.screenshot_cache import get_cached_vm_screenshot
 from pd_ai_agent_core.helpers import (
     get_context_variable,
 )
-from pd_ai_agent_core.helpers.image import detect_black_screen
+from pd_ai_core_agents.common.image import analyse_black_screen, sample_image
+from pd_ai_core_agents.common.screen_analysis_cache import (
+    ANALYSIS_BLACK_SCREEN,
+    ScreenAnalysisCache,
+    frame_digest,
+)
 from pd_ai_agent_core.common import (
     NOTIFICATION_SERVICE_NAME,
     LOGGER_SERVICE_NAME,
 )
 from pd_ai_core_agents.llm_agents.helpers import get_vm_details
-import openai
+from pd_ai_core_agents.common.llm_cache import cached_chat_completion
 
 logger = logging.getLogger(__name__)
 
@@ -86,8 +91,7 @@ class VmHealthCheckAgent(LlmChatAgent):
 
     def analyse_ocr_with_llm(self, os: str, ocr_text: str):
         try:
-            client = openai.OpenAI()
-            response = client.chat.completions.create(
+            return cached_chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -96,7 +100,6 @@ class VmHealthCheckAgent(LlmChatAgent):
                     }
                 ],
             )
-            return response.choices[0].message.content
         except Exception as e:
             print(f"Error using OpenAI API: {e}")
             return None
@@ -146,7 +149,7 @@ class VmHealthCheckAgent(LlmChatAgent):
                     status="error",
                     message="No vm details provided",
                 )
-            screenshotResult = get_vm_screenshot(vm_id)
+            screenshotResult = get_cached_vm_screenshot(vm_id)
             if not screenshotResult.success:
                 return LlmChatAgentResponse(
                     status="error",
@@ -159,7 +162,22 @@ class VmHealthCheckAgent(LlmChatAgent):
                     message="No screenshot provided",
                 )
 
-            if detect_black_screen(screenshot):
+            analysis_cache = ScreenAnalysisCache.get_instance()
+            digest = frame_digest(screenshot)
+            # a byte identical frame needs no decoding
+            is_black = analysis_cache.find(vm_id, ANALYSIS_BLACK_SCREEN, digest)
+            if is_black is None:
+                sample = sample_image(screenshot)
+                fingerprint = sample.fingerprint if sample is not None else None
+                is_black = analysis_cache.find(
+                    vm_id, ANALYSIS_BLACK_SCREEN, digest, fingerprint
+                )
+                if is_black is None:
+                    is_black, _ = analyse_black_screen(screenshot, sample=sample)
+                    analysis_cache.store(
+                        vm_id, ANALYSIS_BLACK_SCREEN, digest, fingerprint, is_black
+                    )
+            if is_black:
                 logger.error(f"VM {vm_id} has a black screen")
                 return LlmChatAgentResponse(
                     status="error",
@@ -14,6 +14,7 @@ from pd_ai_agent_core.messages import (
     create_clean_agent_function_call_chat_message,
 )
 import json
+from typing import Callable, Optional
 import logging
 from pd_ai_agent_core.parallels_desktop.get_vms import get_vm
 from pd_ai_agent_core.parallels_desktop.execute_on_vm import execute_on_vm
@@ -25,7 +26,10 @@ from pd_ai_agent_core.common import (
     LOGGER_SERVICE_NAME,
     VM_DATASOURCE_SERVICE_NAME,
 )
-import openai
+from pd_ai_core_agents.common.html_content import extract_main_content
+from pd_ai_core_agents.common.llm_cache import cached_chat_completion
+from pd_ai_core_agents.common.web_fetcher import WebpageFetcher
+from pd_ai_core_agents.llm_agents.helpers import ChatStreamForwarder
 import requests
 
 logger = logging.getLogger(__name__)
@@ -100,17 +104,27 @@ class WebpageAnalyzerAgent(LlmChatAgent):
 
     def fetch_webpage(self, url: str):
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.text
+            return WebpageFetcher.get_instance().fetch(url)
         except requests.exceptions.RequestException as e:
             print(f"Error fetching the webpage: {e}")
             return None
 
-    def analyse_page_with_llm(self, context_variables: dict, html_content: str):
+    def analyse_page_with_llm(
+        self,
+        context_variables: dict,
+        html_content: str,
+        on_delta: Optional[Callable[[str], None]] = None,
+    ):
+        page = extract_main_content(html_content)
+        logger.info(
+            f"Reduced the webpage from {page.tokens_before} to {page.tokens_after} tokens"
+            + (", truncated to the token budget" if page.truncated else "")
+        )
+        if not page.text:
+            logger.warning("No readable content found in the webpage")
+            return None
         try:
-            client = openai.OpenAI()
-            response = client.chat.completions.create(
+            return cached_chat_completion(
                 model="gpt-4o",
                 messages=[
                     {
@@ -119,11 +133,11 @@ class WebpageAnalyzerAgent(LlmChatAgent):
                     },
                     {
                         "role": "user",
-                        "content": f"This is the webpage content: {html_content}",
+                        "content": f"This is the webpage content: {page.text}",
                     },
                 ],
+                on_delta=on_delta,
             )
-            return response.choices[0].message.content
         except Exception as e:
             print(f"Error using OpenAI API: {e}")
             return None
@@ -178,7 +192,11 @@ class WebpageAnalyzerAgent(LlmChatAgent):
                     message=f"Webpage {url} not found",
                 )
 
-            result = self.analyse_page_with_llm(context_variables, html_content)
+            stream = ChatStreamForwarder(session_context, self.name)
+            result = self.analyse_page_with_llm(
+                context_variables, html_content, on_delta=stream
+            )
+            stream.finish()
             if not result:
                 return LlmChatAgentResponse(
                     status="error",
@@ -194,7 +212,8 @@ class WebpageAnalyzerAgent(LlmChatAgent):
             )
             return LlmChatAgentResponse(
                 status="success",
-                message=result,
+                message=stream.result_message(result),
+                data={"analysis": result},
             )
         except Exception as e:
             ns.send_sync(
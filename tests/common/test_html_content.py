@@ -0,0 +1,61 @@
+from pd_ai_core_agents.common.html_content import (
+    TRUNCATED_MARKER,
+    extract_main_content,
+)
+
+
+def test_scripts_styles_and_page_chrome_are_left_out():
+    html = (
+        "<html><head><title>Docs</title><style>p {}</style></head><body>"
+        "<header>Site name</header><nav><a href='/'>Home</a></nav>"
+        "<p>Install the guest tools.</p><script>track()</script>"
+        "<div hidden>Hidden</div><footer>Copyright</footer></body></html>"
+    )
+    assert extract_main_content(html).text == "Install the guest tools."
+
+
+def test_only_the_main_content_is_kept_when_the_page_marks_it():
+    html = (
+        "<p>Sidebar teaser</p>"
+        "<main><h2>Setup</h2><ul><li>Download</li><li>Run</li></ul></main>"
+    )
+    assert extract_main_content(html).text == "## Setup\n\n- Download\n\n- Run"
+
+
+def test_header_and_footer_of_an_article_are_kept():
+    html = (
+        "<header>Site name</header>"
+        "<article><header><h1>Title</h1></header><p>Body</p>"
+        "<footer>Written by the team</footer></article>"
+        "<footer>Copyright</footer>"
+    )
+    assert extract_main_content(html).text == "# Title\n\nBody\n\nWritten by the team"
+
+
+def test_form_content_is_kept_without_its_controls():
+    html = (
+        "<form><h1>Install</h1><p>Run this</p>"
+        "<pre><code class='language-sh'>apt install x</code></pre>"
+        "<input name='q'><select><option>Linux</option></select>"
+        "<textarea>notes</textarea><button>Copy</button></form>"
+    )
+    assert (
+        extract_main_content(html).text
+        == "# Install\n\nRun this\n\n```sh\napt install x\n```"
+    )
+
+
+def test_repeated_blocks_are_kept_once():
+    html = "<p>Back to top</p><p>Intro</p><p>back to top</p>"
+    assert extract_main_content(html).text == "Back to top\n\nIntro"
+
+
+def test_content_is_truncated_to_the_token_budget():
+    html = "".join(
+        f"<p>Paragraph number {index} of the page.</p>" for index in range(200)
+    )
+    content = extract_main_content(html, max_tokens=50)
+    assert content.truncated
+    assert content.text.endswith(TRUNCATED_MARKER)
+    assert content.tokens_after <= 50
+    assert content.tokens_saved > 0
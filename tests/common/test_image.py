@@ -0,0 +1,47 @@
+import base64
+import io
+import pytest
+from PIL import Image
+from pd_ai_core_agents.common.image import (
+    DEFAULT_MAX_SAMPLE_SIZE,
+    analyse_black_screen,
+    load_grayscale_sample,
+)
+
+
+def _png(image: Image.Image) -> str:
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return base64.b64encode(output.getvalue()).decode("utf-8")
+
+
+def _palette_screenshot(color) -> Image.Image:
+    return Image.new("RGB", (1280, 800), color).convert("P", palette=Image.ADAPTIVE)
+
+
+@pytest.mark.parametrize(
+    "image",
+    [
+        _palette_screenshot((0, 0, 0)),
+        Image.new("1", (1280, 800), 0),
+        Image.new("I;16", (1280, 800), 0),
+    ],
+    ids=["palette", "1-bit", "16-bit"],
+)
+def test_black_screenshot_in_a_mode_reduce_does_not_support(image):
+    image_data = _png(image)
+    sample = load_grayscale_sample(image_data)
+    assert max(sample.shape) <= DEFAULT_MAX_SAMPLE_SIZE * 2
+    is_black, fingerprint = analyse_black_screen(image_data)
+    assert is_black
+    assert fingerprint is not None
+
+
+@pytest.mark.parametrize(
+    "image",
+    [_palette_screenshot((240, 240, 240)), Image.new("1", (1280, 800), 1)],
+    ids=["palette", "1-bit"],
+)
+def test_bright_screenshot_in_a_mode_reduce_does_not_support(image):
+    is_black, _ = analyse_black_screen(_png(image))
+    assert not is_black
@@ -0,0 +1,88 @@
+import threading
+import time
+from pd_ai_core_agents.common import llm_cache
+from pd_ai_core_agents.common.llm_cache import LlmResponseCache, llm_cache_key
+
+
+def test_cosmetic_whitespace_shares_a_key():
+    messages = [{"role": "user", "content": "Hello\nworld"}]
+    key = llm_cache_key("gpt-4o", messages)
+    assert key == llm_cache_key(
+        "gpt-4o", [{"role": "user", "content": "Hello  \r\nworld\n"}]
+    )
+    assert key != llm_cache_key("gpt-4o-mini", messages)
+
+
+def test_response_expires_after_its_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = LlmResponseCache(ttl=60)
+    cache.put("default", "a")
+    cache.put("short", "b", ttl=5)
+
+    now[0] += 10
+    assert cache.get("default") == "a"
+    assert cache.get("short") is None
+    now[0] += 60
+    assert cache.get("default") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_response_is_evicted():
+    cache = LlmResponseCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+
+
+def test_concurrent_identical_requests_share_one_call():
+    cache = LlmResponseCache()
+    calls = []
+    results = []
+
+    def create():
+        calls.append(1)
+        # long enough for every caller to arrive while it runs
+        time.sleep(0.3)
+        return "response"
+
+    def request():
+        results.append(cache.get_or_create("key", create))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["response"] * 8
+    assert len(calls) == 1
+    assert cache.get_or_create("key", create) == "response"
+    assert len(calls) == 1
+    assert cache.misses == 1
+
+
+def test_failed_call_is_not_cached():
+    cache = LlmResponseCache()
+    assert cache.get_or_create("key", lambda: None) is None
+    assert cache.get_or_create("key", lambda: "response") == "response"
+
+
+def test_responses_survive_a_restart_with_a_path(tmp_path):
+    path = tmp_path / "llm_cache.db"
+    cache = LlmResponseCache(path=path)
+    cache.put("kept", "a")
+    cache.put("expired", "b", ttl=-1)
+    cache.close()
+
+    cache = LlmResponseCache(path=path)
+    try:
+        assert cache.get("kept") == "a"
+        assert cache.get("expired") is None
+    finally:
+        cache.close()
@@ -0,0 +1,15 @@
+from pd_ai_core_agents.common.llm_client import LlmClientProvider
+
+
+def test_client_uses_the_tuned_pool_and_timeouts():
+    provider = LlmClientProvider(
+        api_key="test", max_connections=7, timeout=12.0, max_retries=1
+    )
+    try:
+        client = provider.client()
+        assert client.max_retries == 1
+        assert client.timeout.read == 12.0
+        # the pool settings reach the HTTP client the SDK sends requests with
+        assert client._client._transport._pool._max_connections == 7
+    finally:
+        provider.close()
@@ -0,0 +1,92 @@
+import threading
+import time
+from pd_ai_agent_core.parallels_desktop.models.get_vm_screenshot_result import (
+    GetVmScreenshotResult,
+)
+from pd_ai_core_agents.common import screenshot_cache
+from pd_ai_core_agents.common.screenshot_cache import ScreenshotCache
+
+
+def _result(success: bool = True) -> GetVmScreenshotResult:
+    return GetVmScreenshotResult(
+        success=success,
+        message="" if success else "capture failed",
+        raw_screenshot=None,
+        screenshot="frame" if success else None,
+        border_color=None,
+    )
+
+
+def test_screenshot_is_reused_within_its_ttl(monkeypatch):
+    now = [100.0]
+    captures = []
+    monkeypatch.setattr(screenshot_cache.time, "monotonic", lambda: now[0])
+
+    def get_vm_screenshot(vm_id):
+        captures.append(vm_id)
+        return _result()
+
+    monkeypatch.setattr(screenshot_cache, "get_vm_screenshot", get_vm_screenshot)
+    cache = ScreenshotCache(ttl=5.0)
+
+    cache.get("vm-1")
+    now[0] += 4
+    cache.get("vm-1")
+    assert captures == ["vm-1"]
+    now[0] += 2
+    cache.get("vm-1")
+    assert captures == ["vm-1", "vm-1"]
+    cache.invalidate("vm-1")
+    cache.get("vm-1")
+    assert len(captures) == 3
+
+
+def test_failed_capture_is_not_cached(monkeypatch):
+    results = [_result(success=False), _result()]
+    monkeypatch.setattr(
+        screenshot_cache, "get_vm_screenshot", lambda vm_id: results.pop(0)
+    )
+    cache = ScreenshotCache()
+
+    assert not cache.get("vm-1").success
+    assert cache.get("vm-1").success
+    assert len(cache) == 1
+
+
+def test_concurrent_requests_share_one_capture(monkeypatch):
+    captures = []
+
+    def get_vm_screenshot(vm_id):
+        captures.append(vm_id)
+        # long enough for every caller to arrive while it runs
+        time.sleep(0.3)
+        return _result()
+
+    monkeypatch.setattr(screenshot_cache, "get_vm_screenshot", get_vm_screenshot)
+    cache = ScreenshotCache()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("vm-1")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 8
+    assert captures == ["vm-1"]
+
+
+def test_capture_invalidated_while_in_flight_is_not_cached(monkeypatch):
+    cache = ScreenshotCache()
+
+    def get_vm_screenshot(vm_id):
+        # e.g. the VM stopped while its screen was being captured
+        cache.invalidate(vm_id)
+        return _result()
+
+    monkeypatch.setattr(screenshot_cache, "get_vm_screenshot", get_vm_screenshot)
+
+    assert cache.get("vm-1").success
+    assert len(cache) == 0
@@ -0,0 +1,102 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional
+import pytest
+from pd_ai_core_agents.common.web_fetcher import WebpageFetcher
+
+
+class _Site:
+    """Pages served by the local test server, and the requests it received"""
+
+    def __init__(self):
+        self.base_url = ""
+        self.pages: Dict[str, Dict[str, Optional[str]]] = {}
+        self.requests: List[Dict[str, Optional[str]]] = []
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def if_none_match(self) -> List[Optional[str]]:
+        return [request["if_none_match"] for request in self.requests]
+
+
+@pytest.fixture
+def site() -> Iterator[_Site]:
+    served = _Site()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = served.pages[self.path]
+            if_none_match = self.headers.get("If-None-Match")
+            served.requests.append(
+                {"path": self.path, "if_none_match": if_none_match}
+            )
+            if page["etag"] and if_none_match == page["etag"]:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = page["text"].encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if page["etag"]:
+                self.send_header("ETag", page["etag"])
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    served.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        yield served
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_unchanged_page_is_revalidated_with_a_304(site):
+    site.pages["/docs"] = {"text": "<p>v1</p>", "etag": '"v1"'}
+    fetcher = WebpageFetcher(max_retries=0)
+    try:
+        assert fetcher.fetch(site.url("/docs")) == "<p>v1</p>"
+        assert fetcher.fetch(site.url("/docs")) == "<p>v1</p>"
+        assert site.if_none_match() == [None, '"v1"']
+        assert fetcher.fetches == 1
+        assert fetcher.revalidated == 1
+
+        site.pages["/docs"] = {"text": "<p>v2</p>", "etag": '"v2"'}
+        assert fetcher.fetch(site.url("/docs")) == "<p>v2</p>"
+        assert fetcher.fetches == 2
+    finally:
+        fetcher.close()
+
+
+def test_page_without_validators_is_not_cached(site):
+    site.pages["/news"] = {"text": "<p>today</p>", "etag": None}
+    fetcher = WebpageFetcher(max_retries=0)
+    try:
+        fetcher.fetch(site.url("/news"))
+        fetcher.fetch(site.url("/news"))
+        assert site.if_none_match() == [None, None]
+        assert len(fetcher) == 0
+    finally:
+        fetcher.close()
+
+
+def test_cached_page_survives_a_restart_with_a_path(site, tmp_path):
+    site.pages["/docs"] = {"text": "<p>v1</p>", "etag": '"v1"'}
+    path = tmp_path / "site.db"
+    fetcher = WebpageFetcher(max_retries=0, path=path)
+    fetcher.fetch(site.url("/docs"))
+    fetcher.close()
+
+    fetcher = WebpageFetcher(max_retries=0, path=path)
+    try:
+        assert fetcher.fetch(site.url("/docs")) == "<p>v1</p>"
+        assert fetcher.revalidated == 1
+    finally:
+        fetcher.close()
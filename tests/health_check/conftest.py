@@ -0,0 +1,48 @@
+from typing import Iterator
+import random
+import pytest
+from benchmarks.health_check_fleet import (
+    SESSION_ID,
+    CountingNotificationService,
+    FakeFleet,
+    FakeHostConnectivityProbe,
+    installed,
+    Latency,
+)
+from pd_ai_core_agents.background_agents.health_check.health_check_agent import (
+    VmHealthCheckAgent,
+)
+
+
+@pytest.fixture
+def fleet() -> FakeFleet:
+    rng = random.Random(1)
+    return FakeFleet(
+        vms=2,
+        os_mix=["ubuntu"],
+        exec_latency=Latency(0, 0, rng),
+        screenshot_latency=Latency(0, 0, rng),
+        exec_failure_rate=0.0,
+        screenshot_failure_rate=0.0,
+        black_screen_rate=0.0,
+        screen_size=(64, 48),
+        seed=1,
+    )
+
+
+@pytest.fixture
+def notifications(fleet: FakeFleet) -> Iterator[CountingNotificationService]:
+    with installed(fleet) as notifications:
+        yield notifications
+
+
+@pytest.fixture
+def agent(notifications: CountingNotificationService) -> Iterator[VmHealthCheckAgent]:
+    agent = VmHealthCheckAgent(
+        SESSION_ID, cpu_workers=0, check_interval=0.001, cycle_timeout=30
+    )
+    agent._host_connectivity = FakeHostConnectivityProbe()
+    try:
+        yield agent
+    finally:
+        agent.shutdown()
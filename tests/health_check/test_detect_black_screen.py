@@ -0,0 +1,48 @@
+import asyncio
+import base64
+import io
+from PIL import Image
+from pd_ai_core_agents.background_agents.health_check.executors import (
+    HealthCheckExecutors,
+)
+from pd_ai_core_agents.background_agents.health_check.health_checks import (
+    detect_black_screen,
+)
+from pd_ai_core_agents.background_agents.health_check.health_checks.detect_black_screen import (
+    DetectBlackScreenHealthCheckTest,
+)
+from benchmarks.health_check_fleet import SESSION_ID
+from pd_ai_core_agents.common.screen_analysis_cache import ScreenAnalysisCache
+
+
+def _png(image: Image.Image) -> str:
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return base64.b64encode(output.getvalue()).decode("utf-8")
+
+
+def test_similar_frame_reuses_the_black_screen_analysis(
+    fleet, notifications, monkeypatch
+):
+    HealthCheckExecutors.configure(cpu_workers=0)
+    ScreenAnalysisCache.get_instance().invalidate()
+    analyses = []
+    analyse_black_screen = detect_black_screen.analyse_black_screen
+
+    def counting_analyse_black_screen(*args, **kwargs):
+        analyses.append(args)
+        return analyse_black_screen(*args, **kwargs)
+
+    monkeypatch.setattr(
+        detect_black_screen, "analyse_black_screen", counting_analyse_black_screen
+    )
+    test = DetectBlackScreenHealthCheckTest(
+        SESSION_ID, fleet.vms[0], notifications_service=notifications
+    )
+    frame = Image.new("RGB", (640, 400), (200, 200, 200))
+    changed = frame.copy()
+    changed.putpixel((10, 10), (0, 0, 0))
+
+    assert not asyncio.run(test._is_black_screen(_png(frame)))
+    assert not asyncio.run(test._is_black_screen(_png(changed)))
+    assert len(analyses) == 1
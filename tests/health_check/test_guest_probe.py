@@ -0,0 +1,39 @@
+from pd_ai_core_agents.background_agents.health_check.guest_probe import (
+    GUEST_PROBE_GUEST_TOOLS,
+    GUEST_PROBE_INTERNET,
+    GUEST_PROBE_MARKER,
+    build_guest_probe_command,
+    order_guest_probes,
+    parse_guest_probe_output,
+)
+
+PREREQUISITES = {GUEST_PROBE_INTERNET: [GUEST_PROBE_GUEST_TOOLS]}
+
+
+def test_prerequisite_probes_come_first():
+    probe_ids = order_guest_probes(
+        [GUEST_PROBE_INTERNET, GUEST_PROBE_GUEST_TOOLS], PREREQUISITES
+    )
+    assert probe_ids == [GUEST_PROBE_GUEST_TOOLS, GUEST_PROBE_INTERNET]
+    _, args = build_guest_probe_command("linux", probe_ids)
+    script = args[-1]
+    assert script.index(f"{GUEST_PROBE_GUEST_TOOLS}=") < script.index(
+        f"{GUEST_PROBE_INTERNET}="
+    )
+
+
+def test_probe_is_skipped_when_its_prerequisite_fails():
+    output = "\n".join(
+        [
+            f"{GUEST_PROBE_MARKER}{GUEST_PROBE_GUEST_TOOLS}=1",
+            f"{GUEST_PROBE_MARKER}{GUEST_PROBE_INTERNET}=0",
+        ]
+    )
+    results = parse_guest_probe_output(
+        output, [GUEST_PROBE_GUEST_TOOLS, GUEST_PROBE_INTERNET], "", PREREQUISITES
+    )
+    assert not results[GUEST_PROBE_GUEST_TOOLS].ok
+    assert results[GUEST_PROBE_GUEST_TOOLS].skip_reason is None
+    internet = results[GUEST_PROBE_INTERNET]
+    assert not internet.ok
+    assert internet.skip_reason == f"skipped: prerequisite {GUEST_PROBE_GUEST_TOOLS} failed"
@@ -0,0 +1,98 @@
+import asyncio
+from pd_ai_agent_core.parallels_desktop.datasource import VirtualMachineDataSource
+from benchmarks.health_check_fleet import (
+    SESSION_ID,
+    FakeHostConnectivityProbe,
+)
+from pd_ai_core_agents.background_agents.health_check.datasource.health_check_store import (
+    SqliteHealthCheckStore,
+)
+from pd_ai_core_agents.background_agents.health_check.health_check_agent import (
+    VmHealthCheckAgent,
+)
+from pd_ai_core_agents.background_agents.health_check.metrics import (
+    HealthCheckMetrics,
+)
+
+
+async def _cycles(agent, count=2):
+    # new tests are spread over the 1 ms check interval, the second cycle runs them all
+    for _ in range(count):
+        await agent.process()
+        await asyncio.sleep(0.005)
+
+
+def test_history_of_a_stopped_vm_is_kept_until_it_is_deleted(agent, fleet):
+    stopped, running = fleet.vms
+    asyncio.run(_cycles(agent))
+    history = agent.get_history()
+    assert history.get_test_names(stopped.id)
+    assert history.get_test_names(running.id)
+
+    stopped.state = "stopped"
+    agent._running_vms.remove(stopped.id)
+    asyncio.run(_cycles(agent))
+    assert history.get_test_names(stopped.id)
+    assert history.get_test_names(running.id)
+
+    VirtualMachineDataSource.get_instance().remove_vm(stopped.id)
+    agent._pruned_at = None
+    asyncio.run(_cycles(agent, count=1))
+    assert history.get_test_names(stopped.id) == []
+    assert history.get_test_names(running.id)
+
+
+def test_health_check_of_a_deleted_vm_is_removed_from_the_store(
+    notifications, fleet, tmp_path
+):
+    path = tmp_path / "health_checks.db"
+    deleted, kept = fleet.vms
+    agent = VmHealthCheckAgent(
+        SESSION_ID,
+        cpu_workers=0,
+        check_interval=0.001,
+        cycle_timeout=30,
+        persistence_path=str(path),
+    )
+    agent._host_connectivity = FakeHostConnectivityProbe()
+    try:
+        asyncio.run(_cycles(agent))
+        store = SqliteHealthCheckStore(path)
+        assert store.vm_ids() == {deleted.id, kept.id}
+
+        VirtualMachineDataSource.get_instance().remove_vm(deleted.id)
+        agent._running_vms.remove(deleted.id)
+        agent._pruned_at = None
+        asyncio.run(_cycles(agent, count=1))
+        assert store.vm_ids() == {kept.id}
+        assert agent._health_check_datasource.get_health_check(deleted.id) is None
+    finally:
+        agent.shutdown()
+
+
+def test_saved_health_check_of_a_vm_deleted_while_stopped_is_removed(
+    notifications, fleet, tmp_path
+):
+    path = tmp_path / "health_checks.db"
+    store = SqliteHealthCheckStore(path)
+    store.save_many({"vm-gone": {"vm_id": "vm-gone"}})
+    agent = VmHealthCheckAgent(
+        SESSION_ID, cpu_workers=0, check_interval=0.001, persistence_path=str(path)
+    )
+    agent._host_connectivity = FakeHostConnectivityProbe()
+    try:
+        asyncio.run(_cycles(agent, count=1))
+        assert "vm-gone" not in store.vm_ids()
+    finally:
+        agent.shutdown()
+
+
+def test_icon_manifest_is_not_counted_as_a_health_check_notification(notifications):
+    metrics = HealthCheckMetrics.get_instance()
+    counted = metrics.notifications.get()
+    agent = VmHealthCheckAgent(SESSION_ID, cpu_workers=0)
+    try:
+        assert notifications.sent == 1
+        assert metrics.notifications.get() == counted
+    finally:
+        agent.shutdown()
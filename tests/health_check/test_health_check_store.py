@@ -0,0 +1,79 @@
+import sqlite3
+from datetime import datetime
+from pd_ai_core_agents.background_agents.health_check.datasource.health_check_datasource import (
+    HealthCheckDataSource,
+)
+from pd_ai_core_agents.background_agents.health_check.datasource.health_check_store import (
+    SqliteHealthCheckStore,
+)
+from pd_ai_core_agents.background_agents.health_check.vm_health_check import (
+    VmHealthCheck,
+)
+from benchmarks.health_check_fleet import SESSION_ID
+from pd_ai_core_agents.common.messages import HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS
+
+
+def test_states_survive_reopening_the_store(tmp_path):
+    path = tmp_path / "state" / "health_checks.db"
+    store = SqliteHealthCheckStore(path)
+    store.save_many({"vm-1": {"tests": {}}, "vm-2": {"tests": {"a": {"count": 2}}}})
+    store.save_many({}, deleted=["vm-1"])
+    store.close()
+
+    store = SqliteHealthCheckStore(path)
+    try:
+        assert store.vm_ids() == {"vm-2"}
+        assert store.load("vm-2") == {"tests": {"a": {"count": 2}}}
+        assert store.load("vm-1") is None
+        store.clear()
+        assert store.vm_ids() == set()
+    finally:
+        store.close()
+
+
+def test_corrupted_state_is_ignored(tmp_path):
+    path = tmp_path / "health_checks.db"
+    store = SqliteHealthCheckStore(path)
+    with sqlite3.connect(str(path)) as connection:
+        connection.execute(
+            "INSERT INTO health_checks (vm_id, state, updated_at) VALUES (?, ?, ?)",
+            ("vm-1", "{not json", 0.0),
+        )
+    try:
+        assert store.load("vm-1") is None
+    finally:
+        store.close()
+
+
+def test_datasource_writes_changes_on_flush_and_restores_them(
+    tmp_path, fleet, notifications
+):
+    vm = fleet.vms[0]
+    path = tmp_path / "health_checks.db"
+    store = SqliteHealthCheckStore(path)
+    datasource = HealthCheckDataSource(store)
+    health_check = VmHealthCheck(vm.id, datetime.now())
+    health_check.register_default_tests(SESSION_ID, vm, notifications)
+    datasource.update_health_check(vm.id, health_check)
+    datasource.disable_health_check_test(vm.id, HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS)
+
+    assert store.vm_ids() == set()
+    assert datasource.flush() == 1
+    assert datasource.flush() == 0
+    store.close()
+
+    store = SqliteHealthCheckStore(path)
+    try:
+        datasource = HealthCheckDataSource(store)
+        restored = VmHealthCheck(vm.id, datetime.now())
+        restored.register_default_tests(SESSION_ID, vm, notifications)
+        assert datasource.restore_health_check(restored)
+        disabled = [test.name for test in restored.get_tests() if test.is_disabled()]
+        assert disabled == [HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS]
+
+        datasource.remove_health_check(vm.id)
+        assert datasource.get_vm_ids() == set()
+        datasource.flush()
+        assert store.vm_ids() == set()
+    finally:
+        store.close()
@@ -0,0 +1,88 @@
+import pytest
+from pd_ai_core_agents.background_agents.health_check.history import (
+    OUTCOME_FAILURE,
+    OUTCOME_SKIPPED,
+    OUTCOME_SUCCESS,
+    HealthCheckHistory,
+    HealthCheckSeries,
+)
+
+
+def test_probes_out_of_the_raw_ring_are_rolled_up():
+    series = HealthCheckSeries(raw_capacity=4, rollup_capacity=2, rollup_period=10.0)
+    # 4 failures in the first period, then 4 successes in the second
+    for timestamp in range(8):
+        outcome = OUTCOME_FAILURE if timestamp < 4 else OUTCOME_SUCCESS
+        series.append(float(timestamp), outcome, 0.1)
+    for timestamp in range(10, 14):
+        series.append(float(timestamp), OUTCOME_SUCCESS, 0.1)
+
+    assert series.size() == 4
+    assert [sample[0] for sample in series.samples()] == [10.0, 11.0, 12.0, 13.0]
+    # the evicted probes still count, through their rollup bucket
+    assert series.failure_rate() == 4 / 12
+    assert series.failure_rate(since=10.0) == 0.0
+
+
+def test_oldest_rollup_bucket_is_overwritten():
+    series = HealthCheckSeries(raw_capacity=1, rollup_capacity=2, rollup_period=10.0)
+    for timestamp in (0.0, 10.0, 20.0, 30.0):
+        series.append(timestamp, OUTCOME_FAILURE, 0.1)
+    series.append(40.0, OUTCOME_SUCCESS, 0.1)
+
+    # the buckets of 20 and 30 remain, 0 and 10 were overwritten, 40 is still raw
+    assert series.failure_rate() == 2 / 3
+
+
+def test_skipped_probes_are_not_counted():
+    series = HealthCheckSeries(raw_capacity=8)
+    series.append(1.0, OUTCOME_SUCCESS, 0.2)
+    series.append(2.0, OUTCOME_SKIPPED, 9.0)
+    series.append(3.0, OUTCOME_FAILURE, 0.4)
+
+    assert series.failure_rate() == 0.5
+    assert series.latency_percentiles([100]) == {100: pytest.approx(0.4)}
+
+
+def test_latency_percentiles_use_the_nearest_rank():
+    history = HealthCheckHistory(raw_capacity=128)
+    for index in range(1, 101):
+        history.record("vm-1", "test", True, index / 100, timestamp=float(index))
+
+    # latencies are kept as 32 bit floats
+    percentiles = history.latency_percentiles("vm-1", "test")
+    assert percentiles == pytest.approx({50: 0.5, 95: 0.95, 99: 0.99})
+    percentiles = history.latency_percentiles("vm-1", "test", [0, 100])
+    assert percentiles == pytest.approx({0: 0.01, 100: 1.0})
+    assert history.latency_percentiles("vm-1", "missing") == {}
+    assert history.failure_rate("vm-1", "missing") is None
+
+
+def test_series_per_vm_are_capped():
+    history = HealthCheckHistory(max_series_per_vm=2)
+    for test_name in ("a", "b", "c"):
+        history.record("vm-1", test_name, True, 0.1)
+
+    assert history.get_test_names("vm-1") == ["a", "b"]
+    assert history.memory_usage("vm-1") == 2 * history.get_series(
+        "vm-1", "a"
+    ).memory_usage()
+
+
+def test_history_of_stopped_vms_is_bounded_by_count_and_age():
+    history = HealthCheckHistory(max_stopped_vms=2, stopped_retention=100.0)
+    for vm_id in ("vm-1", "vm-2", "vm-3", "vm-4"):
+        history.record(vm_id, "test", True, 0.1)
+
+    history.retain_running({"vm-4"}, now=0.0)
+    # the first VMs to stop are dropped first
+    assert history.get_test_names("vm-1") == []
+    assert history.get_test_names("vm-2")
+    assert history.get_test_names("vm-3")
+
+    # running again, vm-2 is no longer subject to the retention
+    history.retain_running({"vm-2", "vm-4"}, now=50.0)
+    history.retain_running({"vm-4"}, now=120.0)
+    assert history.get_test_names("vm-3") == []
+    assert history.get_test_names("vm-2")
+    assert history.get_test_names("vm-4")
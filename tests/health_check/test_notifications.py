@@ -0,0 +1,77 @@
+from pd_ai_agent_core.messages import (
+    VM_DISABLE_HEALTH_CHECK_TEST,
+    VM_REBOOT,
+)
+from pd_ai_core_agents.background_agents.health_check.health_checks.detect_guest_tools import (
+    DetectGuestToolsHealthCheckTest,
+)
+from pd_ai_core_agents.background_agents.health_check.notifications import (
+    HealthCheckDigest,
+    HealthCheckFailureDigest,
+    HealthCheckTransition,
+)
+from pd_ai_core_agents.common.constants import HEALTH_CHECK_DIGEST_CHANNEL
+
+SESSION_ID = "session"
+
+
+def _transition(vm, is_healthy: bool) -> HealthCheckTransition:
+    test = DetectGuestToolsHealthCheckTest(SESSION_ID, vm)
+    return HealthCheckTransition(
+        vm_id=vm.id,
+        vm_name=vm.name,
+        test_name=test.name,
+        is_healthy=is_healthy,
+        reason="" if is_healthy else "Error getting guest tools",
+        message=test._recovery_message() if is_healthy else test._failure_message(),
+    )
+
+
+def _cycle(failure_digest: HealthCheckFailureDigest, *transitions):
+    digest = HealthCheckDigest()
+    for transition in transitions:
+        digest.add(transition)
+    return failure_digest.update(SESSION_ID, digest)
+
+
+def test_digest_keeps_the_failures_of_earlier_cycles_until_they_recover(fleet):
+    vm_1, vm_2 = fleet.vms
+    vm_3 = type(vm_1)("vm-3", "Fleet VM 3", "ubuntu")
+    failure_digest = HealthCheckFailureDigest()
+
+    (first,) = _cycle(
+        failure_digest, _transition(vm_1, False), _transition(vm_2, False)
+    )
+    assert first.channel == HEALTH_CHECK_DIGEST_CHANNEL
+    assert first.body.get("vm_ids") == [vm_1.id, vm_2.id]
+
+    # a failure of the next cycle is sent on its own, the digest is unchanged
+    (second,) = _cycle(failure_digest, _transition(vm_3, False))
+    assert second.channel == vm_3.id
+    assert len(failure_digest.failing()) == 2
+
+    # a single recovery of a digest test updates the digest
+    (third,) = _cycle(failure_digest, _transition(vm_1, True))
+    assert third.channel == HEALTH_CHECK_DIGEST_CHANNEL
+    assert third.body.get("vm_ids") == [vm_2.id]
+    content = third.body.to_dict()
+    assert content["type"] == "error" and content["replace"]
+    # the actions of the failure message of the test still failing
+    values = {action["value"] for action in content["actions"]}
+    assert {VM_REBOOT, VM_DISABLE_HEALTH_CHECK_TEST} <= values
+    assert all(vm_2.name in action["label"] for action in content["actions"])
+
+    (last,) = _cycle(failure_digest, _transition(vm_2, True))
+    assert last.channel == HEALTH_CHECK_DIGEST_CHANNEL
+    assert last.body.to_dict()["type"] == "success"
+    assert failure_digest.failing() == []
+
+
+def test_removed_tests_leave_the_digest(fleet):
+    vm_1, vm_2 = fleet.vms
+    failure_digest = HealthCheckFailureDigest()
+    _cycle(failure_digest, _transition(vm_1, False), _transition(vm_2, False))
+
+    (message,) = failure_digest.remove(SESSION_ID, vm_1.id)
+    assert message.body.get("vm_ids") == [vm_2.id]
+    assert failure_digest.remove(SESSION_ID, vm_1.id) == []
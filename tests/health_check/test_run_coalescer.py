@@ -0,0 +1,53 @@
+import asyncio
+from pd_ai_core_agents.background_agents.health_check.run_coalescer import (
+    HealthCheckRunCoalescer,
+)
+
+
+def test_due_tests_of_a_coalesced_trigger_are_queued():
+    coalescer = HealthCheckRunCoalescer()
+    assert coalescer.begin("vm", test_names=["a"])
+    assert not coalescer.begin("vm", test_names=["b"])
+    assert not coalescer.begin("vm", test_names=["c", "b"])
+    assert coalescer.finish("vm") == (True, ["b", "c"])
+    assert coalescer.finish("vm") == (False, None)
+    assert not coalescer.is_running("vm")
+
+
+def test_follow_up_covers_every_test():
+    coalescer = HealthCheckRunCoalescer()
+    assert coalescer.begin("vm", test_names=["a"])
+    assert not coalescer.begin("vm", test_names=["b"])
+    assert not coalescer.begin("vm", follow_up=True)
+    assert not coalescer.begin("vm", test_names=["c"])
+    assert coalescer.finish("vm") == (True, None)
+
+
+def test_trigger_without_tests_joins_the_run():
+    coalescer = HealthCheckRunCoalescer()
+    assert coalescer.begin("vm")
+    assert not coalescer.begin("vm")
+    assert coalescer.finish("vm") == (False, None)
+
+
+def test_periodic_trigger_during_a_run_is_not_dropped(agent):
+    runs = []
+    release = asyncio.Event()
+
+    async def run_health_check(vm_id, test_names=None, digest=None):
+        runs.append((vm_id, None if test_names is None else list(test_names)))
+        if len(runs) == 1:
+            await release.wait()
+
+    agent._run_health_check = run_health_check
+
+    async def scenario():
+        first = asyncio.create_task(agent._process_health_check("vm", ["Guest Tools"]))
+        await asyncio.sleep(0)
+        # the periodic cycle finds the run in flight and returns straight away
+        await agent._process_health_check("vm", ["Internet"])
+        release.set()
+        await first
+
+    asyncio.run(scenario())
+    assert runs == [("vm", ["Guest Tools"]), ("vm", ["Internet"])]
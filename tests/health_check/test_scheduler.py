@@ -0,0 +1,70 @@
+from pd_ai_core_agents.background_agents.health_check.scheduler import (
+    HealthCheckScheduler,
+)
+
+
+def _scheduler() -> HealthCheckScheduler:
+    return HealthCheckScheduler(
+        base_interval=10.0,
+        max_interval=40.0,
+        failure_interval=2.0,
+        backoff_factor=2.0,
+        jitter=0.0,
+    )
+
+
+def test_new_pairs_are_spread_over_the_base_interval():
+    scheduler = _scheduler()
+    scheduler.register("vm-1", [f"test-{index}" for index in range(50)], now=0.0)
+
+    due = [scheduler.next_due("vm-1", f"test-{index}") for index in range(50)]
+    assert all(0.0 <= time < 10.0 for time in due)
+    assert len(set(due)) > 25
+    assert scheduler.pop_due(now=10.0) == {
+        "vm-1": [f"test-{index}" for index in sorted(range(50), key=lambda i: due[i])]
+    }
+
+
+def test_healthy_runs_back_off_and_a_failure_rechecks_quickly():
+    scheduler = _scheduler()
+    scheduler.register("vm-1", ["test"], now=0.0)
+
+    intervals = [scheduler.record("vm-1", "test", True, now=0.0) for _ in range(4)]
+    assert intervals == [10.0, 20.0, 40.0, 40.0]
+    assert scheduler.record("vm-1", "test", False, now=0.0) == 2.0
+    assert scheduler.next_due("vm-1", "test") == 2.0
+    # the streak starts over after a failure
+    assert scheduler.record("vm-1", "test", True, now=0.0) == 10.0
+
+
+def test_skipped_run_keeps_the_streak():
+    scheduler = _scheduler()
+    scheduler.register("vm-1", ["test"], now=0.0)
+    scheduler.record("vm-1", "test", True, now=0.0)
+
+    assert scheduler.record("vm-1", "test", False, now=0.0, skipped=True) == 10.0
+    assert scheduler.record("vm-1", "test", True, now=0.0) == 20.0
+
+
+def test_popped_pair_is_retried_when_its_run_never_reports_back():
+    scheduler = _scheduler()
+    scheduler.register("vm-1", ["test"], now=0.0)
+    due = scheduler.next_due("vm-1", "test")
+
+    assert scheduler.pop_due(now=due) == {"vm-1": ["test"]}
+    assert scheduler.pop_due(now=due) == {}
+    assert scheduler.pop_due(now=due + 10.0) == {"vm-1": ["test"]}
+
+
+def test_stale_items_of_a_removed_pair_do_not_match_its_new_entry():
+    scheduler = _scheduler()
+    scheduler.register("vm-1", ["test"], now=0.0)
+    first_due = scheduler.next_due("vm-1", "test")
+    scheduler.unregister("vm-1")
+    # registered again later, its new run is due a full interval after the old one
+    scheduler.register("vm-1", ["test"], now=100.0)
+
+    assert scheduler.pop_due(now=first_due) == {}
+    assert scheduler.pop_due(now=110.0) == {"vm-1": ["test"]}
+    assert scheduler.pop_due(now=110.0) == {}
+    assert scheduler.length() == 1
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import stat
+import pytest
+from pd_ai_core_agents.background_agents.health_check.sharding import (
+    ShardedHealthCheckEngine,
+    ShardVm,
+    _PendingJob,
+    _ProbeJob,
+)
+from benchmarks.health_check_fleet import SESSION_ID
+from pd_ai_core_agents.common.messages import (
+    HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS,
+    HEALTH_CHECK_TEST_DETECT_INTERNET_CONNECTION,
+)
+
+GUEST_TESTS = [
+    HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS,
+    HEALTH_CHECK_TEST_DETECT_INTERNET_CONNECTION,
+]
+
+
+def _script(path, body: str) -> None:
+    path.write_text("#!/bin/sh\n" + body)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+
+
+@pytest.fixture
+def prlctl(tmp_path, monkeypatch):
+    """A prlctl that runs the guest commands on the host, and a ping that always answers"""
+    calls = tmp_path / "calls.log"
+    _script(tmp_path / "prlctl", f'echo "$@" >> {calls}\nshift 2\nexec "$@"\n')
+    _script(tmp_path / "ping", "exit 0\n")
+    # the spawned workers inherit the environment
+    monkeypatch.setenv("PRLCTL_PATH", str(tmp_path))
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    return calls
+
+
+def test_worker_runs_the_guest_probes_of_the_vm_of_the_job(prlctl):
+    engine = ShardedHealthCheckEngine(1, job_timeout=60)
+
+    async def probe(vm: ShardVm):
+        return await engine.probe(SESSION_ID, vm, GUEST_TESTS)
+
+    try:
+        results = asyncio.run(probe(ShardVm("vm-1", "Ubuntu", "ubuntu")))
+        assert all(results[name].is_healthy for name in GUEST_TESTS)
+        assert "exec vm-1" in prlctl.read_text()
+
+        # the worker sees the state of the VM sent with the job, not its first one
+        results = asyncio.run(
+            probe(ShardVm("vm-1", "Ubuntu", "ubuntu", state="stopped"))
+        )
+        assert not results[HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS].is_healthy
+    finally:
+        engine.stop()
+
+
+def test_worker_skips_the_dependents_of_the_failed_tests_of_the_job(prlctl):
+    engine = ShardedHealthCheckEngine(1, job_timeout=60)
+
+    async def probe():
+        return await engine.probe(
+            SESSION_ID,
+            ShardVm("vm-1", "Ubuntu", "ubuntu"),
+            [HEALTH_CHECK_TEST_DETECT_INTERNET_CONNECTION],
+            failed_tests=[HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS],
+        )
+
+    try:
+        results = asyncio.run(probe())
+        assert results[HEALTH_CHECK_TEST_DETECT_INTERNET_CONNECTION].skipped
+        assert not prlctl.exists()
+    finally:
+        engine.stop()
+
+
+def test_result_of_a_timed_out_job_is_dropped():
+    engine = ShardedHealthCheckEngine(1)
+    job = _ProbeJob(1, SESSION_ID, ShardVm("vm-1", "Ubuntu", "ubuntu"), None, True, [])
+    pending = _PendingJob(job, 0)
+    engine._pending[job.job_id] = pending
+    # what the probe() timeout does to the future the collector is about to set
+    pending.future.cancel()
+
+    engine._deliver(job.job_id, 0, {}, "")
+    engine._deliver(job.job_id, 0, None, "worker error")
+
+    assert pending.future.cancelled()
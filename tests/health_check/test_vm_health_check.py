@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+from pd_ai_agent_core.parallels_desktop.execute_on_vm import ExecuteVmCommandResult
+from pd_ai_core_agents.background_agents.health_check.guest_probe import (
+    GUEST_PROBE_GUEST_TOOLS,
+    GUEST_PROBE_INTERNET,
+    GUEST_PROBE_MARKER,
+)
+from pd_ai_core_agents.background_agents.health_check.vm_health_check import (
+    VmHealthCheck,
+)
+from benchmarks.health_check_fleet import (
+    SESSION_ID,
+    EXECUTE_ON_VM_MODULES,
+)
+from pd_ai_core_agents.common.messages import (
+    HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS,
+    HEALTH_CHECK_TEST_DETECT_INTERNET_CONNECTION,
+)
+
+GUEST_TESTS = [
+    HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS,
+    HEALTH_CHECK_TEST_DETECT_INTERNET_CONNECTION,
+]
+
+
+def _probe(fleet, notifications, monkeypatch, guest_tools_exit_code: int):
+    scripts: List[str] = []
+
+    def execute_on_vm(vm_id: str, command: str, args: Optional[List[str]] = None):
+        scripts.append(" ".join(args or []))
+        output = "\n".join(
+            [
+                f"{GUEST_PROBE_MARKER}{GUEST_PROBE_GUEST_TOOLS}={guest_tools_exit_code}",
+                f"{GUEST_PROBE_MARKER}{GUEST_PROBE_INTERNET}=0",
+            ]
+        )
+        return ExecuteVmCommandResult(output=output, exit_code=0)
+
+    for module in EXECUTE_ON_VM_MODULES:
+        monkeypatch.setattr(module, "execute_on_vm", execute_on_vm)
+    vm = fleet.vms[0]
+    health_check = VmHealthCheck(vm.id, datetime.now())
+    health_check.register_default_tests(SESSION_ID, vm, notifications)
+    results = asyncio.run(health_check.probe_tests(GUEST_TESTS))
+    return results, scripts
+
+
+def test_dependent_guest_tests_share_one_exec(fleet, notifications, monkeypatch):
+    results, scripts = _probe(fleet, notifications, monkeypatch, 0)
+
+    assert all(results[name].is_healthy for name in GUEST_TESTS)
+    assert not results[HEALTH_CHECK_TEST_DETECT_INTERNET_CONNECTION].skipped
+    assert len(scripts) == 1
+    # the prerequisite runs first
+    assert scripts[0].index("echo hello") < scripts[0].index("ping")
+
+
+def test_dependent_is_skipped_when_its_prerequisite_probe_fails(
+    fleet, notifications, monkeypatch
+):
+    results, scripts = _probe(fleet, notifications, monkeypatch, 1)
+
+    assert not results[HEALTH_CHECK_TEST_DETECT_GUEST_TOOLS].is_healthy
+    internet = results[HEALTH_CHECK_TEST_DETECT_INTERNET_CONNECTION]
+    assert internet.skipped
+    assert len(scripts) == 1
@@ -0,0 +1,51 @@
+import asyncio
+from typing import Tuple
+import pytest
+from pd_ai_core_agents.background_agents.health_check.guest_probe import (
+    CompositeGuestProbe,
+    GuestProbeResult,
+    GUEST_PROBE_GUEST_TOOLS,
+)
+from pd_ai_core_agents.background_agents.health_check.run_context import (
+    HealthCheckRunContext,
+)
+from pd_ai_core_agents.background_agents.health_check.vm_health_check_test import (
+    VMGuestProbeHealthCheckTest,
+)
+from pd_ai_core_agents.background_agents.health_check.health_checks.detect_guest_tools import (
+    DetectGuestToolsHealthCheckTest,
+)
+
+
+class _ProbeTestWithoutProbeCheck(VMGuestProbeHealthCheckTest):
+    guest_probe = GUEST_PROBE_GUEST_TOOLS
+
+    async def _check_function(self) -> Tuple[bool, str]:
+        return True, ""
+
+    def _failure_message(self):
+        return None
+
+    def _recovery_message(self):
+        return None
+
+
+def test_guest_probe_test_must_implement_the_probe_check(fleet):
+    with pytest.raises(TypeError):
+        _ProbeTestWithoutProbeCheck("session", fleet.vms[0], "test", 1)
+
+
+def test_guest_probe_test_takes_its_result_from_the_composite_probe(
+    fleet, notifications
+):
+    vm = fleet.vms[0]
+    test = DetectGuestToolsHealthCheckTest("session", vm)
+    probe = CompositeGuestProbe(vm, [GUEST_PROBE_GUEST_TOOLS])
+
+    async def failed_probe(probe_id: str) -> GuestProbeResult:
+        return GuestProbeResult(probe_id, 1, "no guest tools")
+
+    probe.get = failed_probe
+    is_healthy, _ = asyncio.run(test.probe(HealthCheckRunContext(guest_probe=probe)))
+    assert not is_healthy
+    assert fleet.exec_calls == 0
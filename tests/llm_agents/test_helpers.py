@@ -0,0 +1,61 @@
+from typing import Iterator, List
+import pytest
+from pd_ai_agent_core.common import NOTIFICATION_SERVICE_NAME
+from pd_ai_agent_core.messages import Message
+from pd_ai_agent_core.services.notification_service import NotificationService
+from pd_ai_agent_core.services.service_registry import ServiceRegistry
+from pd_ai_core_agents.llm_agents.helpers import (
+    STREAMED_RESPONSE_MESSAGE,
+    ChatStreamForwarder,
+)
+
+SESSION_ID = "stream-session"
+SESSION_CONTEXT = {
+    "session_id": SESSION_ID,
+    "channel": "chat",
+    "linked_message_id": None,
+    "is_partial": False,
+}
+
+
+class _RecordingNotificationService(NotificationService):
+    def __init__(self):
+        self.messages: List[Message] = []
+
+    def send_sync(self, message: Message) -> None:
+        self.messages.append(message)
+
+    def unregister(self) -> None:
+        pass
+
+
+@pytest.fixture
+def notifications() -> Iterator[_RecordingNotificationService]:
+    service = _RecordingNotificationService()
+    ServiceRegistry.register(SESSION_ID, NOTIFICATION_SERVICE_NAME, service)
+    try:
+        yield service
+    finally:
+        ServiceRegistry.unregister_service(SESSION_ID, NOTIFICATION_SERVICE_NAME)
+
+
+def test_streamed_pieces_share_one_message(notifications):
+    stream = ChatStreamForwarder(SESSION_CONTEXT, "agent", flush_interval=0)
+    for piece in ["The VM ", "is ", "fine"]:
+        stream(piece)
+    stream.finish()
+
+    messages = notifications.messages
+    assert len(messages) == 4
+    assert {msg.message_id for msg in messages} == {stream.message_id}
+    assert [msg.is_complete for msg in messages] == [False, False, False, True]
+    # the user has seen the response, the agent is not given it to show again
+    assert stream.result_message("The VM is fine") == STREAMED_RESPONSE_MESSAGE
+
+
+def test_response_that_was_not_streamed_is_returned(notifications):
+    stream = ChatStreamForwarder(SESSION_CONTEXT, "agent")
+    stream.finish()
+
+    assert notifications.messages == []
+    assert stream.result_message("The VM is fine") == "The VM is fine"